@@ -0,0 +1,243 @@
+# encoding: utf-8
+"""
+Benchmarks for the physics core of MadGUI on synthetic lattices.
+
+Usage:
+    bench.py [options]
+    bench.py (--help)
+
+Options:
+    --sizes=<sizes>         Comma separated element counts
+                            [default: 1000,10000,100000]
+    --repeat=<num>          Number of repetitions (best is taken) [default: 3]
+    --output=<file>         Where to write the results [default: results.json]
+    --baseline=<file>       Baseline to compare against [default: baseline.json]
+    --save-baseline         Store the results as new baseline
+    --tolerance=<frac>      Relative slowdown that counts as regression
+                            [default: 0.25]
+    -h, --help              Show this help
+
+Relative file names are interpreted relative to the benchmark folder. The
+exit code is non-zero if any timing regressed by more than the tolerance
+compared to the baseline.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+from __future__ import print_function
+
+# standard library
+from collections import OrderedDict
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+# internal
+from madgui import __version__
+from madgui.component.session import Session
+from madgui.resource.file import FileResource
+from madgui.util.config import load_config
+from madgui.util.unit import UnitConverter, from_config_dict
+
+import lattice
+
+
+_folder = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(func, repeat, cleanup=None):
+    """Return the best wall time of ``repeat`` calls of ``func()``."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = default_timer()
+        result = func()
+        best = min(best, default_timer() - start)
+        if cleanup is not None:
+            cleanup(result)
+    return best
+
+
+def run_size(size, repeat, conf):
+    """Run all benchmarks on a lattice with ``size`` elements."""
+    utool = UnitConverter(from_config_dict(conf['madx_units']))
+    folder = tempfile.mkdtemp()
+    timings = OrderedDict()
+    try:
+        model = lattice.write_model(folder, size)
+        repo = FileResource(folder)
+
+        timings['load_model'] = measure(
+            lambda: Session.load_model(utool, repo, model),
+            repeat, cleanup=lambda session: session.close())
+
+        session = Session.load_model(utool, repo, model)
+        try:
+            timings['segment_init'] = measure(
+                lambda: session.init_segment(session.data),
+                repeat, cleanup=lambda _: session.segment.destroy())
+            session.init_segment(session.data)
+            timings.update(_bench_segment(session, repeat))
+        finally:
+            session.close()
+    finally:
+        shutil.rmtree(folder)
+    return timings
+
+
+def _bench_segment(session, repeat):
+    segment = session.segment
+    utool = session.utool
+    num_cells = len(segment.elements) // lattice.CELL_SIZE
+    timings = OrderedDict()
+    values = iter(0.3 + 1e-4 * i for i in range(1, 1000000))
+
+    def change(knob):
+        session.set_value(knob, next(values))
+        segment.invalidate(knob)
+
+    def twiss(knob):
+        change(knob)
+        segment.twiss()
+
+    timings['twiss'] = measure(lambda: twiss('kqf_0'), repeat)
+    timings['twiss_incremental'] = measure(
+        lambda: twiss('kqf_{}'.format(num_cells - 1)), repeat)
+
+    def transfer_map():
+        change('kqd_0')
+        return segment.get_transfer_map('#s', '#e')
+    timings['get_transfer_map'] = measure(transfer_map, repeat)
+
+    timings['match'] = _bench_match(segment, repeat)
+
+    rand = random.Random(0)
+    length = num_cells * lattice.CELL_LENGTH
+    positions = [utool.add_unit('s', rand.uniform(0, length))
+                 for _ in range(1000)]
+    timings['element_by_position'] = measure(
+        lambda: [segment.element_by_position(s) for s in positions], repeat)
+
+    # fetch the element data beforehand, in order to time only the unit
+    # conversion and not the MAD-X round trips:
+    elements = list(segment.elements.iter_raw())
+    columns = [segment.tw[name] for name in ('betx', 'bety', 'x', 'y')]
+
+    def unit_conversion():
+        views = [utool.dict_add_unit(elem) for elem in elements]
+        for name, column in zip(('betx', 'bety', 'x', 'y'), columns):
+            utool.strip_unit(name, column)
+        return views
+    timings['unit_conversion'] = measure(unit_conversion, repeat)
+    return timings
+
+
+def _bench_match(segment, repeat):
+    """
+    Time the matching of the envelope at the end of the line using the
+    quadrupoles of the last cell. This calls MAD-X directly in the same way
+    as the matching tool (see :func:`madgui.batch._run_match`), so that it
+    does not require wxPython.
+    """
+    session = segment.session
+    num_cells = len(segment.elements) // lattice.CELL_SIZE
+    vary = ['kqf_{}'.format(num_cells - 1), 'kqd_{}'.format(num_cells - 1)]
+    betx = segment.tw.get_float('betx')[-1] * 1.21
+    twiss_init = session.utool.dict_strip_unit(segment.twiss_args)
+    initial = dict(zip(vary, session.evaluate_many(vary)))
+
+    def match():
+        result = session.madx.match(sequence=segment.sequence.name,
+                                    vary=vary,
+                                    constraints=[{'range': '#e',
+                                                  'betx': betx}],
+                                    twiss_init=twiss_init)
+        session.knobs.update(result)
+        segment.invalidate(*vary)
+        segment.twiss()
+
+    def reset(_):
+        session.set_values(initial)
+        segment.invalidate(*vary)
+        segment.twiss()
+
+    return measure(match, repeat, cleanup=reset)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print a comparison table and return the list of regressions as
+    ``(size, name, ratio)``.
+    """
+    regressions = []
+    print("{:>8} {:<20} {:>10} {:>10} {:>8}".format(
+        'size', 'benchmark', 'time [s]', 'base [s]', 'ratio'))
+    for size, timings in results.items():
+        base_timings = baseline.get(size, {})
+        for name, value in timings.items():
+            base = base_timings.get(name)
+            if value is None or not base:
+                ratio = None
+            else:
+                ratio = value / base
+                if ratio > 1 + tolerance:
+                    regressions.append((size, name, ratio))
+            print("{:>8} {:<20} {:>10} {:>10} {:>8}".format(
+                size, name, _fmt(value, '.4f'), _fmt(base, '.4f'),
+                _fmt(ratio, '.2f')))
+    return regressions
+
+
+def _fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def main(argv=None):
+    from docopt import docopt
+    args = docopt(__doc__, argv)
+    sizes = [int(size) for size in args['--sizes'].split(',')]
+    repeat = int(args['--repeat'])
+    tolerance = float(args['--tolerance'])
+    output = os.path.join(_folder, args['--output'])
+    baseline_file = os.path.join(_folder, args['--baseline'])
+    conf = load_config()
+
+    results = OrderedDict()
+    for size in sizes:
+        print("running benchmarks for {} elements...".format(size))
+        results[str(size)] = run_size(size, repeat, conf)
+
+    data = {
+        'meta': {
+            'madgui': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    with open(output, 'wt') as f:
+        json.dump(data, f, indent=2)
+    if args['--save-baseline']:
+        shutil.copyfile(output, baseline_file)
+        return 0
+    if not os.path.exists(baseline_file):
+        print("no baseline found at {!r}".format(baseline_file))
+        return 0
+    with open(baseline_file) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, tolerance)
+    for size, name, ratio in regressions:
+        print("REGRESSION: {} ({} elements) is {:.0%} slower".format(
+            name, size, ratio - 1), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# encoding: utf-8
+"""
+Generator for synthetic MAD-X lattices of arbitrary size.
+
+The lattice is a sequence of FODO cells with a mix of element types
+(quadrupoles, bends, kickers, monitors, solenoids, multipoles, markers).
+Every quadrupole strength is defined via its own knob, so that the knob
+dependency tracking is exercised as well.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import os
+
+import yaml
+
+# exported symbols
+__all__ = [
+    'CELL_LENGTH',
+    'CELL_SIZE',
+    'generate_lattice',
+    'write_model',
+]
+
+
+# elements per cell and length of a cell [m]:
+CELL_SIZE = 10
+CELL_LENGTH = 10.0
+
+_CELL = [
+    # (position in cell, definition template)
+    (0.0, "qf{i}: quadrupole, l=0.5, k1:=kqf_{i};"),
+    (0.7, "bpm{i}: monitor;"),
+    (1.0, "hk{i}: hkicker, kick=0;"),
+    (2.0, "bf{i}: sbend, l=2.0, angle=0.001, e1=0.0005, e2=0.0005;"),
+    (4.5, "mk{i}: marker;"),
+    (5.0, "qd{i}: quadrupole, l=0.5, k1:=kqd_{i};"),
+    (5.7, "vk{i}: vkicker, kick=0;"),
+    (6.5, "sol{i}: solenoid, l=0.5, ks=0.001;"),
+    (7.5, "mp{i}: multipole, knl={{0, 0.001}};"),
+    (8.0, "bd{i}: sbend, l=1.5, angle=-0.001;"),
+]
+
+
+def generate_lattice(num_elements, name='lattice'):
+    """
+    Return MAD-X source code for a sequence with (about) ``num_elements``
+    elements (rounded up to full cells).
+    """
+    num_cells = max(1, -(-num_elements // CELL_SIZE))
+    lines = []
+    for i in range(num_cells):
+        lines.append("kqf_{0} = 0.3; kqd_{0} = -0.3;".format(i))
+    length = num_cells * CELL_LENGTH
+    lines.append("{}: sequence, l={}, refer=entry;".format(name, length))
+    for i in range(num_cells):
+        offset = i * CELL_LENGTH
+        for at, template in _CELL:
+            lines.append("  {}, at={};".format(
+                template.format(i=i).rstrip(';'), offset + at))
+    lines.append("endsequence;")
+    lines.append("beam, particle=proton, energy=1.0, sequence={};"
+                 .format(name))
+    return '\n'.join(lines) + '\n'
+
+
+def write_model(folder, num_elements, name='lattice'):
+    """
+    Write a MAD-X file and a ``.cpymad.yml`` model to ``folder``.
+
+    :returns: file name of the model (relative to ``folder``)
+    """
+    madx_file = name + '.madx'
+    model_file = name + '.cpymad.yml'
+    with open(os.path.join(folder, madx_file), 'wt') as f:
+        f.write(generate_lattice(num_elements, name))
+    model = {
+        'api_version': 1,
+        'init-files': [madx_file],
+        'sequence': name,
+        'range': ['#s', '#e'],
+        'beam': {'particle': 'proton', 'energy': 1.0},
+        'twiss': {'betx': 10.0, 'bety': 10.0},
+    }
+    with open(os.path.join(folder, model_file), 'wt') as f:
+        yaml.safe_dump(model, f, default_flow_style=False)
+    return model_file
@@ -10,12 +10,30 @@ For more information on the command line parameters, see :attr:`App.usage`.
 # force new style imports
 from __future__ import absolute_import
 
-# internal
-from madgui.core.app import App
+# standard library
+import sys
 
 # exported symbols
-__all__ = []
+__all__ = [
+    'main',
+]
+
+
+def main(argv=None):
+    """
+    Run the application.
+
+    With ``--profile-startup`` the import hook of the startup profiler is
+    installed before any GUI module is imported.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if '--profile-startup' in argv:
+        from madgui.util import startup
+        startup.start()
+    from madgui.core.app import App
+    App.main(argv)
 
 
 if __name__ == '__main__':
-    App.main()
+    main()
@@ -0,0 +1,315 @@
+# encoding: utf-8
+"""
+madgui-batch - compute optics from model files without GUI.
+
+Usage:
+    madgui-batch [options] <jobfile>...
+    madgui-batch (--help | --version)
+
+Options:
+    --config=<config>       Set config file
+    -j <num>, --jobs=<num>  Number of parallel processes [default: 0]
+                            (0 means: one per CPU)
+    -h, --help              Show this help
+    -v, --version           Show version information
+
+A job file is a YAML list of jobs (or a dict with a ``jobs`` list). Every
+job loads a model, optionally sets some knobs and performs exactly one of
+the tasks ``twiss``, ``match``, ``transfer_map`` or ``plot``:
+
+.. code-block:: yaml
+
+    - model: hht3.cpymad.yml
+      knobs: {kl_q1: 0.3}
+      twiss: {columns: [s, betx, bety]}
+      output: hht3.tfs
+
+    - model: hht3.cpymad.yml
+      match:
+        vary: [kl_q1, kl_q2]
+        constraints: [{range: 'q3', betx: 5.0}]
+      output: matched.npz
+
+    - model: hht3.cpymad.yml
+      transfer_map: {from: '#s', to: '#e'}
+      output: map.npz
+
+    - model: hht3.cpymad.yml
+      plot:
+        view: env
+        size: [8, 6]
+        dpi: 100
+        snapshots: [{kl_q1: 0.3}, {kl_q1: 0.4}]
+      output: plots/env-{index}.png
+
+All values are in MAD-X units. Relative paths are interpreted relative to
+the job file. The output format (``.npz`` or ``.tfs``, for plots ``.png``,
+``.svg``, ``.pdf``) is determined by the file extension. Results are written
+as soon as the corresponding job has finished. A ``plot`` job writes one
+file per snapshot (the ``{index}`` placeholder is replaced by the position
+in the list) or a single file if no snapshots are given.
+
+This module does not depend on wxPython. matplotlib is only imported by the
+worker processes that perform ``plot`` jobs (see :mod:`madgui.render`).
+"""
+
+# force new style imports
+from __future__ import absolute_import
+from __future__ import print_function
+
+# standard library
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# 3rd party
+import numpy as np
+import yaml
+
+# internal
+from madgui import __version__
+from madgui.component.session import Session
+from madgui.resource.file import FileResource
+from madgui.util.config import load_config
+from madgui.util.unit import UnitConverter, from_config_dict
+
+# exported symbols
+__all__ = [
+    'load_jobs',
+    'run_job',
+    'run_jobs',
+    'write_npz',
+    'write_tfs',
+    'main',
+]
+
+
+_usage = __doc__
+
+# default columns for the ``twiss`` task:
+TWISS_COLUMNS = ['name', 's', 'betx', 'bety', 'alfx', 'alfy', 'mux', 'muy',
+                 'x', 'px', 'y', 'py', 'dx', 'dpx', 'dy', 'dpy']
+
+TASKS = ('twiss', 'match', 'transfer_map', 'plot')
+
+
+def load_jobs(filename):
+    """
+    Load a job file and resolve all paths relative to its folder.
+
+    :raises ValueError: if a job is invalid
+    """
+    with open(filename) as f:
+        data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get('jobs', [])
+    folder = os.path.dirname(os.path.abspath(filename))
+    jobs = []
+    for index, job in enumerate(data):
+        tasks = [task for task in TASKS if task in job]
+        if len(tasks) != 1 or 'model' not in job or 'output' not in job:
+            raise ValueError(
+                "Job {} in {!r} must specify 'model', 'output' and exactly "
+                "one of {}.".format(index, filename, ', '.join(TASKS)))
+        job = dict(job, task=tasks[0])
+        job['model'] = os.path.join(folder, job['model'])
+        job['output'] = os.path.join(folder, job['output'])
+        jobs.append(job)
+    return jobs
+
+
+def run_job(job, units, line_view=None):
+    """
+    Execute a single job and write its results.
+
+    :param dict job: job as returned by :func:`load_jobs`
+    :param dict units: unit definitions (``madx_units`` config section)
+    :param dict line_view: plot settings (``line_view`` config section),
+                           defaults to the builtin config
+    :returns: ``(output, seconds)``
+    """
+    start = time.time()
+    utool = UnitConverter(from_config_dict(units))
+    folder, name = os.path.split(job['model'])
+    session = Session.load_model(utool, FileResource(folder), name)
+    try:
+        # set the knobs first, so the initial TWISS can be reused:
+        knobs = job.get('knobs') or {}
+        if knobs:
+            session.set_values(knobs)
+        session.init_segment(session.data)
+        segment = session.segment
+        task = job['task']
+        options = job[task] or {}
+        if task == 'plot':
+            _run_plot(segment, options, job['output'], line_view)
+            return job['output'], time.time() - start
+        if task == 'twiss':
+            columns, summary = _run_twiss(segment, options)
+        elif task == 'match':
+            columns, summary = _run_match(segment, options)
+        else:
+            columns, summary = _run_transfer_map(segment, options)
+    finally:
+        session.close()
+    _write(job['output'], columns, summary)
+    return job['output'], time.time() - start
+
+
+def _run_plot(segment, options, output, line_view):
+    # NOTE: imported here to keep matplotlib out of the other jobs:
+    from madgui.render import get_renderer
+    if line_view is None:
+        line_view = load_config()['line_view']
+    renderer = get_renderer(options.get('size', (8, 6)),
+                            options.get('dpi', 100))
+    renderer.render(segment, options.get('view', 'env'), line_view, output,
+                    options.get('snapshots'))
+
+
+def _run_twiss(segment, options):
+    columns = list(options.get('columns', TWISS_COLUMNS))
+    # the TWISS table of the segment initialization is still valid unless
+    # the lattice was changed or the TWISS was not computed by MAD-X:
+    table = segment.madx_table
+    if table is None:
+        segment.raw_twiss(columns=columns)
+        table = segment.madx.get_table('twiss')
+    return {col: table[col] for col in columns}, table.summary
+
+
+def _run_match(segment, options):
+    session = segment.session
+    vary = options['vary']
+    twiss_init = session.utool.dict_strip_unit(segment.twiss_args)
+    knobs = session.madx.match(sequence=segment.sequence.name,
+                               vary=vary,
+                               constraints=options['constraints'],
+                               twiss_init=twiss_init)
+    session.knobs.update(knobs)
+    segment.invalidate(*vary)
+    columns, summary = _run_twiss(segment, options)
+    summary = dict(summary, **knobs)
+    return columns, summary
+
+
+def _run_transfer_map(segment, options):
+    beg = options.get('from', '#s')
+    end = options.get('to', '#e')
+    tmap = segment.get_transfer_map(beg, end)
+    columns = {'r{}'.format(i+1): tmap[:, i] for i in range(tmap.shape[1])}
+    return columns, {'from': beg, 'to': end}
+
+
+def _write(filename, columns, summary):
+    ext = os.path.splitext(filename)[1].lower()
+    folder = os.path.dirname(filename)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    if ext == '.tfs':
+        write_tfs(filename, columns, summary)
+    else:
+        write_npz(filename, columns, summary)
+
+
+def write_npz(filename, columns, summary):
+    """
+    Write columns to a numpy ``.npz`` archive. Summary values are stored
+    with an ``@`` prefix.
+    """
+    data = {name: np.asarray(col) for name, col in columns.items()}
+    data.update({'@' + name: np.asarray(value)
+                 for name, value in summary.items()})
+    np.savez(filename, **data)
+
+
+def write_tfs(filename, columns, summary):
+    """Write columns and summary to a TFS file."""
+    names = list(columns)
+    data = [np.asarray(columns[name]) for name in names]
+    numeric = [np.issubdtype(col.dtype, np.number) for col in data]
+    with open(filename, 'wt') as f:
+        for key, value in sorted(summary.items()):
+            if isinstance(value, (int, float, np.number)):
+                f.write('@ {:<16} %le {!r}\n'.format(key.upper(),
+                                                      float(value)))
+            else:
+                f.write('@ {:<16} %s "{}"\n'.format(key.upper(), value))
+        f.write('* ' + ' '.join('{:>18}'.format(name.upper())
+                                for name in names) + '\n')
+        f.write('$ ' + ' '.join('{:>18}'.format('%le' if num else '%s')
+                                for num in numeric) + '\n')
+        for row in zip(*data):
+            f.write('  ' + ' '.join(
+                '{:>18.10g}'.format(val) if num else
+                '{:>18}'.format('"{}"'.format(_str(val)))
+                for val, num in zip(row, numeric)) + '\n')
+
+
+def _str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+def _run_job_safe(args):
+    """Run job in a worker process, return the error message on failure."""
+    job, units, line_view = args
+    try:
+        output, seconds = run_job(job, units, line_view)
+        return job, output, seconds, None
+    except Exception:
+        return job, None, None, traceback.format_exc()
+
+
+def run_jobs(jobs, units, processes=None, line_view=None):
+    """
+    Execute jobs in parallel and yield ``(job, output, seconds, error)``
+    tuples in the order of completion.
+
+    Every worker process keeps its plot figures for subsequent ``plot``
+    jobs, see :func:`madgui.render.get_renderer`.
+
+    :param int processes: number of processes (default: number of CPUs)
+    :param dict line_view: plot settings (``line_view`` config section)
+    """
+    tasks = [(job, units, line_view) for job in jobs]
+    processes = min(processes or multiprocessing.cpu_count(), len(tasks))
+    if processes <= 1:
+        for task in tasks:
+            yield _run_job_safe(task)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_run_job_safe, tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    """Run the batch command line utility."""
+    from docopt import docopt
+    args = docopt(_usage, argv, version=__version__)
+    conf = load_config(args['--config'])
+    jobs = [job
+            for filename in args['<jobfile>']
+            for job in load_jobs(filename)]
+    failed = 0
+    results = run_jobs(jobs, conf['madx_units'], int(args['--jobs']),
+                       conf['line_view'])
+    for job, output, seconds, error in results:
+        if error is None:
+            print("{}: {} ({:.2f}s)".format(job['task'], output, seconds))
+        else:
+            failed += 1
+            print("{}: {} failed:\n{}".format(job['task'], job['model'],
+                                               error), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
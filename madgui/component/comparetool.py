@@ -12,6 +12,7 @@ import numpy as np
 # internal
 from madgui.core import wx
 from madgui.util import unit
+from madgui.util.instrument import traced
 
 # exported symbols
 __all__ = [
@@ -62,7 +63,7 @@ class CompareTool(object):
                 bitmap=bmp,
                 shortHelp='Show MIRKO envelope',
                 longHelp='Show MIRKO envelope for comparison. The envelope is computed for the default parameters.')
-        panel.Bind(wx.EVT_TOOL, self.on_click, tool)
+        panel.Bind(wx.EVT_TOOL, traced(self.on_click, 'tool:compare'), tool)
         # subscribe to plotting
         view.hook.plot_ax.connect(self.plot_ax)
 
@@ -88,12 +89,15 @@ class CompareTool(object):
         xname = view.xname
         yname = view.yname
         if visible:
+            # the curves are compared against the TWISS of the segment:
+            view.segment.require_columns(self, [xname, yname])
             self.plot_ax(view.axes[xname], xname)
             self.plot_ax(view.axes[yname], yname)
         else:
+            view.segment.release_columns(self)
             self._remove_ax(xname)
             self._remove_ax(yname)
-        self._view.figure.canvas.draw()
+        self._view.figure.request_redraw()
 
     def load_data(self, name):
         """Load envelope from file."""
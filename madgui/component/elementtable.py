@@ -0,0 +1,147 @@
+# encoding: utf-8
+"""
+Compact, array based storage for the elements of a sequence.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+import numpy as np
+
+# internal
+from madgui.util import optics
+from madgui.util.cache import LRUCache
+
+# exported symbols
+__all__ = [
+    'ElementTable',
+]
+
+
+def _plain_value(value):
+    """Convert an element attribute (possibly an expression) to float(s)."""
+    if isinstance(value, (list, tuple)):
+        return [_plain_value(v) for v in value]
+    return float(getattr(value, 'value', value))
+
+
+class ElementTable(object):
+
+    """
+    Read-only sequence of element dicts backed by numpy arrays.
+
+    The numeric attributes listed in :data:`madgui.util.optics.PARAMETERS`
+    are stored in the structured array :attr:`data` (in MAD-X units), the
+    element types in the integer column :attr:`type_codes`. Indexing the
+    table returns a new dict with units (as returned by
+    ``utool.dict_add_unit``), i.e. these views are only materialized when
+    needed. The raw element dicts are not kept: they are fetched from the
+    source again on demand and only a limited number of them is cached.
+
+    :ivar data: structured array with the numeric attributes
+    :ivar type_codes: array of indices into :attr:`type_names`
+    :ivar list type_names: lower-case element type names
+    :ivar list names: element names
+    :ivar int version: incremented whenever an element is refreshed
+    """
+
+    columns = optics.PARAMETERS
+
+    def __init__(self, elements, utool, cache_size=256):
+        """
+        :param elements: indexable sequence of raw element dicts (e.g.
+                         ``sequence.elements``), must stay valid
+        :param UnitConverter utool: used to add units to the views
+        :param int cache_size: maximum number of cached raw element dicts
+                               (``None`` = unlimited)
+        """
+        self._utool = utool
+        self._source = elements
+        self._cache = LRUCache(max_entries=cache_size)
+        self._count = count = len(elements)
+        self.data = np.zeros(count, dtype=[(col, float)
+                                           for col in self.columns])
+        self.type_codes = np.zeros(count, dtype=np.int16)
+        self.type_names = []
+        self._type_index = {}
+        self.names = []
+        self.version = 0
+        for index, raw in enumerate(self.iter_raw()):
+            self.names.append(raw['name'])
+            self._store(index, raw)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """Get element dict with units (or a list of dicts for slices)."""
+        if isinstance(index, slice):
+            return [self._view(i) for i in range(*index.indices(len(self)))]
+        return self._view(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._view(index)
+
+    @property
+    def types(self):
+        """Array of lower-case element type names."""
+        return np.array(self.type_names, dtype=object)[self.type_codes]
+
+    def raw(self, index):
+        """Get the element dict without units (do not modify)."""
+        if index < 0:
+            index += self._count
+        raw = self._cache.get(index)
+        if raw is None:
+            raw = self._source[index]
+            self._cache.put(index, raw)
+        return raw
+
+    def iter_raw(self):
+        """Iterate over the element dicts without caching them."""
+        for index in range(self._count):
+            raw = self._cache.get(index)
+            yield self._source[index] if raw is None else raw
+
+    def get(self, index, key):
+        """Get a single attribute with units."""
+        if key in self.columns:
+            value = self.data[key][index]
+        else:
+            value = self.raw(index)[key]
+        return self._utool.add_unit(key, value)
+
+    def refresh(self, index, raw):
+        """Replace the data of an element by updated values from MAD-X."""
+        if index < 0:
+            index += self._count
+        self._cache.put(index, raw)
+        self.names[index] = raw['name']
+        self._store(index, raw)
+        self.version += 1
+
+    def _view(self, index):
+        return self._utool.dict_add_unit(self.raw(index))
+
+    def parse(self, raw):
+        """
+        Convert an element dict from MAD-X to ``(params, type_name)``, where
+        ``params`` contains a float for every column. Does not modify the
+        table.
+        """
+        params = optics.get_element_params({
+            key: _plain_value(val)
+            for key, val in raw.items()
+            if key in ('knl', 'ksl') or key in self.columns
+        })
+        return params, raw['type'].lower()
+
+    def _store(self, index, raw):
+        params, type_name = self.parse(raw)
+        self.data[index] = tuple(params[col] for col in self.columns)
+        code = self._type_index.get(type_name)
+        if code is None:
+            code = self._type_index[type_name] = len(self.type_names)
+            self.type_names.append(type_name)
+        self.type_codes[index] = code
@@ -8,7 +8,7 @@ from __future__ import absolute_import
 
 # internal
 from madgui.core import wx
-from madgui.core.plugin import HookCollection
+from madgui.util.plugin import HookCollection
 from madgui.util.unit import strip_unit
 
 # exported symbols
@@ -37,7 +37,7 @@ class ElementMarker(object):
         line_view = self._line_view
         self.plot_ax(line_view.axes[line_view.xname], line_view.xname)
         self.plot_ax(line_view.axes[line_view.yname], line_view.yname)
-        line_view.figure.draw()
+        line_view.figure.request_redraw()
 
     def _clear(self):
         for line in self._lines:
@@ -47,7 +47,7 @@ class ElementMarker(object):
     def remove(self):
         self._clear()
         self.destroy()
-        self._line_view.figure.draw()
+        self._line_view.figure.request_redraw()
 
     def destroy(self):
         self._line_view.hook.destroy.disconnect(self.destroy)
@@ -6,11 +6,16 @@ View component for the MadGUI application.
 # force new style imports
 from __future__ import absolute_import
 
+from timeit import default_timer
+
 # scipy
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
 from matplotlib.ticker import AutoMinorLocator
 
 # internal
-from madgui.core.plugin import HookCollection
+from madgui.util.lod import decimate
+from madgui.util.plugin import HookCollection
 from madgui.util.unit import units, strip_unit, get_unit_label, get_raw_label
 
 import matplotlib
@@ -31,9 +36,11 @@ def _clear_ax(ax):
 
 
 def _autoscale_axes(axes):
-    """Autoscale a :class:`matplotlib.axes.Axes` to its contents."""
+    """Autoscale a :class:`matplotlib.axes.Axes` to its contents (y only)."""
+    # NOTE: the x-range is set explicitly when plotting. Autoscaling it would
+    # be wrong for decimated curves, see DecimatedCurve.
     axes.relim()
-    axes.autoscale()
+    axes.autoscale(axis='y')
 
 
 class FigurePair(object):
@@ -41,28 +48,141 @@ class FigurePair(object):
     """
     A figure composed of two subplots with shared s-axis.
 
+    Frequently changing artists (the TWISS curves) can be registered with
+    :meth:`add_animated`. They are excluded from the regular draw and
+    painted on top of a cached background instead, so that :meth:`update`
+    can redraw them without rendering the static parts (axes, grid, element
+    indicators) again.
+
+    Subscribers should use :meth:`request_redraw` rather than drawing
+    directly, so that several changes in response to one user action are
+    rendered only once.
+
     :ivar matplotlib.figure.Figure figure: composed figure
     :ivar matplotlib.axes.Axes axx: upper subplot
     :ivar matplotlib.axes.Axes axy: lower subplot
+    :ivar dispatch: function used to schedule the pending redraw, e.g.
+                    ``wx.CallAfter`` (default: redraw immediately)
+    :ivar bool blit: whether to use animated artists, can be disabled for
+                     offscreen figures that are only saved to files
+    :ivar int rendered_draws: number of redraws performed on request
+    :ivar int coalesced_draws: number of requests merged into pending ones
     """
 
+    blit = True
+
     def __init__(self):
         """Create an empty matplotlib figure with two subplots."""
         self.figure = figure = matplotlib.figure.Figure()
         self.axx = axx = figure.add_subplot(211)
         self.axy       = figure.add_subplot(212, sharex=axx)
+        self._animated = []
+        self._background = None
+        self._limits = None
+        self._connected = None
+        self._pending = None
+        self.dispatch = lambda func, *args: func(*args)
+        self.rendered_draws = 0
+        self.coalesced_draws = 0
 
     @property
     def canvas(self):
         """Get the canvas."""
         return self.figure.canvas
 
-    def draw(self):
-        """Draw the figure on its canvas."""
+    def autoscale(self):
+        """Autoscale the y-axes of both subplots to their contents."""
         _autoscale_axes(self.axx)
         _autoscale_axes(self.axy)
+
+    def draw(self):
+        """Draw the figure on its canvas."""
+        self._connect()
+        self.autoscale()
         self.figure.canvas.draw()
 
+    def update(self):
+        """
+        Redraw the animated artists. Falls back to a full :meth:`draw` if the
+        axes limits have changed or no background is available.
+        """
+        self._connect()
+        self.autoscale()
+        canvas = self.figure.canvas
+        if (not self.blit or self._background is None or
+                self._limits != self._get_limits() or
+                not getattr(canvas, 'supports_blit', True)):
+            canvas.draw()
+            return
+        canvas.restore_region(self._background)
+        for artist in self._animated:
+            artist.axes.draw_artist(artist)
+        canvas.blit(self.figure.bbox)
+
+    def request_redraw(self, full=True):
+        """
+        Mark the figure as dirty. It is redrawn only once via
+        :attr:`dispatch`, no matter how often this is called in the meantime.
+
+        :param bool full: if false, only the animated artists need to be
+                          redrawn (see :meth:`update`)
+        """
+        pending = self._pending
+        if pending is not None:
+            self._pending = pending or full
+            self.coalesced_draws += 1
+            return
+        self._pending = full
+        self.dispatch(self._redraw)
+
+    def cancel_redraw(self):
+        """Discard a pending redraw (e.g. when the canvas is destroyed)."""
+        self._pending = None
+
+    def _redraw(self):
+        full, self._pending = self._pending, None
+        if full is None:
+            return
+        self.rendered_draws += 1
+        if full:
+            self.draw()
+        else:
+            self.update()
+
+    def add_animated(self, artist):
+        """Register an artist that is redrawn by :meth:`update`."""
+        if self.blit:
+            artist.set_animated(True)
+            self._animated.append(artist)
+
+    def remove_animated(self, artist):
+        """Unregister an artist previously passed to :meth:`add_animated`."""
+        artist.set_animated(False)
+        if artist in self._animated:
+            self._animated.remove(artist)
+
+    def _get_limits(self):
+        return (self.axx.get_xlim(), self.axx.get_ylim(),
+                self.axy.get_xlim(), self.axy.get_ylim())
+
+    def _connect(self):
+        """Listen for full draws on the current canvas."""
+        canvas = self.figure.canvas
+        if canvas is not None and canvas is not self._connected:
+            canvas.mpl_connect('draw_event', self._on_draw)
+            self._connected = canvas
+            self._background = None
+
+    def _on_draw(self, event):
+        """Store the background and paint the animated artists on top."""
+        canvas = self.figure.canvas
+        # only cache renderings for the screen (not e.g. savefig):
+        if event.renderer is getattr(canvas, 'renderer', None):
+            self._background = canvas.copy_from_bbox(self.figure.bbox)
+            self._limits = self._get_limits()
+        for artist in self._animated:
+            artist.draw(event.renderer)
+
     def set_slabel(self, label):
         """Set label on the s axis."""
         self.axy.set_xlabel(label)
@@ -71,6 +191,59 @@ class FigurePair(object):
         """Start a fresh plot."""
         _clear_ax(self.axx)
         _clear_ax(self.axy)
+        del self._animated[:]
+        self._background = None
+
+
+class DecimatedCurve(object):
+
+    """
+    Level of detail layer for a line plot with many points.
+
+    The line shows only the points needed for the visible x-range: at most
+    a min/max pair per pixel, see :func:`madgui.util.lod.decimate`. The
+    decimation is redone whenever the x-limits change (zoom, pan). The exact
+    data is kept in :attr:`x` and :attr:`y`.
+
+    :ivar matplotlib.lines.Line2D line: the displayed line
+    """
+
+    def __init__(self, axes, line, x, y):
+        self.axes = axes
+        self.line = line
+        self.x = x
+        self.y = y
+        # markers are only shown for the exact data:
+        self._marker = line.get_marker()
+        # NOTE: shared axes don't emit 'xlim_changed' when changed by their
+        # sibling, therefore we need to listen on all of them:
+        self._connections = [
+            (ax, ax.callbacks.connect('xlim_changed', self._on_xlim_changed))
+            for ax in axes.get_shared_x_axes().get_siblings(axes)]
+        self.refresh()
+
+    def set_ydata(self, y):
+        """Update the ordinate."""
+        self.y = y
+        self.refresh()
+
+    def refresh(self):
+        """Decimate the data for the current view."""
+        xmin, xmax = self.axes.get_xlim()
+        num_bins = max(int(self.axes.bbox.width), 1)
+        x, y, exact = decimate(self.x, self.y, xmin, xmax, num_bins)
+        self.line.set_data(x, y)
+        self.line.set_marker(self._marker if exact else 'None')
+
+    def _on_xlim_changed(self, axes):
+        self.refresh()
+
+    def remove(self):
+        """Disconnect and remove the line."""
+        for ax, cid in self._connections:
+            ax.callbacks.disconnect(cid)
+        del self._connections[:]
+        self.line.remove()
 
 
 class TwissCurveSegment(object):
@@ -84,8 +257,10 @@ class TwissCurveSegment(object):
         self._style = view.config['curve_style']
         self._clines = {}
         self._view = view
+        segment.require_columns(self, [view.xname, view.yname])
         # Register for update events
         view.hook.plot_ax.connect(self.plot_ax)
+        view.hook.destroy.connect(self.destroy)
         self._segment.hook.update.connect(self.update)
         self._segment.hook.remove.connect(self.destroy)
 
@@ -95,7 +270,9 @@ class TwissCurveSegment(object):
         abscissa = self.get_float_data('s')
         ordinate = self.get_float_data(name)
         axes.set_xlim(abscissa[0], abscissa[-1])
-        self._clines[name] = axes.plot(abscissa, ordinate, **style)[0]
+        line = axes.plot([], [], **style)[0]
+        self._view.figure.add_animated(line)
+        self._clines[name] = DecimatedCurve(axes, line, abscissa, ordinate)
 
     def update(self):
         """Update the (previously plotted!) lines in the graph."""
@@ -108,15 +285,18 @@ class TwissCurveSegment(object):
 
     def get_float_data(self, name):
         """Get a float data vector."""
-        return strip_unit(self._segment.tw[name], self._unit[name])
+        return self._segment.tw.get_float(name, self._unit[name])
 
     def destroy(self):
         """Disconnect update events."""
+        self._segment.release_columns(self)
         self._view.hook.plot_ax.disconnect(self.plot_ax)
+        self._view.hook.destroy.disconnect(self.destroy)
         self._segment.hook.update.disconnect(self.update)
         self._segment.hook.remove.disconnect(self.destroy)
-        for line in self._clines.values():
-            line.remove()
+        for curve in self._clines.values():
+            self._view.figure.remove_animated(curve.line)
+            curve.remove()
         self._clines.clear()
 
 
@@ -133,7 +313,7 @@ class TwissView(object):
         panel = frame.AddView(view, view.title)
         return view
 
-    def __init__(self, segment, basename, line_view_config):
+    def __init__(self, segment, basename, line_view_config, figure=None):
 
         self.hook = HookCollection(
             plot=None,
@@ -141,8 +321,8 @@ class TwissView(object):
             destroy=None,
         )
 
-        # create figure
-        self.figure = figure = FigurePair()
+        # create figure (or reuse a template, see madgui.render)
+        self.figure = figure = figure or FigurePair()
         self.segment = segment
         self.config = line_view_config
 
@@ -172,7 +352,7 @@ class TwissView(object):
         self.hook.destroy()
 
     def update(self):
-        self.figure.draw()
+        self.figure.request_redraw(full=False)
 
     def get_label(self, name):
         return self._label[name] + ' ' + get_unit_label(self.unit[name])
@@ -192,7 +372,7 @@ class TwissView(object):
         self.hook.plot_ax(axy, yname)
         self.hook.plot()
         # finish and draw:
-        fig.draw()
+        fig.request_redraw()
 
     def get_axes_name(self, axes):
         return axes.twiss_name
@@ -242,15 +422,24 @@ class DrawConstraints(object):
             for elem,envelope in constr:
                 lines = self.draw_constraint(name, elem, envelope)
                 self.lines.append(lines)
-        self.view.figure.draw()
+        self.view.figure.request_redraw()
 
 
 class UpdateStatusBar(object):
 
     """
     Update utility for status bars.
+
+    Shows the cursor coordinates, the element under the cursor and the
+    (interpolated) TWISS value at the cursor position. Updates are limited
+    to :attr:`min_interval` and skipped if the displayed values did not
+    change.
+
+    :ivar float min_interval: minimum time between two updates [s]
     """
 
+    min_interval = 1 / 60.0
+
     @classmethod
     def create(cls, panel):
         frame = panel.GetTopLevelParent()
@@ -263,45 +452,142 @@ class UpdateStatusBar(object):
         """Connect mouse event handler."""
         self._view = view
         self._set_status_text = set_status_text
+        self._event = None
+        self._last_time = 0
+        self._last_key = None
+        self._timer = None
+        self._timer_active = False
+        self._curves = {}
+        unit = view.unit
+        self._labels = {name: get_raw_label(unit[name]) for name in unit}
+        # scale factor from MAD-X units to the displayed s unit:
+        self._s_scale = strip_unit(view.segment.utool.add_unit('s', 1.0),
+                                   unit[view.sname])
         # Just passing self.on_mouse_move to mpl_connect does not keep the
         # self object alive. The closure does the job, though:
         def on_mouse_move(event):
             self.on_mouse_move(event)
         view.figure.canvas.mpl_connect('motion_notify_event', on_mouse_move)
+        view.segment.hook.update.connect(self.invalidate)
+        view.hook.plot.connect(self.invalidate)
+        view.hook.destroy.connect(self.destroy)
+
+    def destroy(self):
+        self._view.segment.hook.update.disconnect(self.invalidate)
+        self._view.hook.plot.disconnect(self.invalidate)
+        self._view.hook.destroy.disconnect(self.destroy)
+        if self._timer is not None:
+            self._timer.stop()
+
+    def invalidate(self):
+        """Discard the cached curves when the TWISS or the plot changes."""
+        self._curves.clear()
+        self._last_key = None
 
     def on_mouse_move(self, event):
-        """Update statusbar text."""
-        xdata, ydata = event.xdata, event.ydata
+        """Update statusbar text (rate limited)."""
+        self._event = (event.inaxes, event.xdata, event.ydata)
+        if self._timer_active:
+            return
+        wait = self._last_time + self.min_interval - default_timer()
+        if wait <= 0:
+            self.update()
+            return
+        # update with the latest event when the interval is over:
+        if self._timer is None:
+            self._timer = self._view.figure.canvas.new_timer()
+            self._timer.single_shot = True
+            self._timer.add_callback(self._on_timer)
+        self._timer.interval = max(int(wait * 1000), 1)
+        self._timer_active = True
+        self._timer.start()
+
+    def _on_timer(self):
+        self._timer_active = False
+        self.update()
+
+    def update(self):
+        """Show the data for the most recent mouse position."""
+        self._last_time = default_timer()
+        axes, xdata, ydata = self._event
         if xdata is None or ydata is None:
             # outside of axes:
-            self._set_status_text("")
+            key = None
+        else:
+            name = self._view.get_axes_name(axes)
+            index = self._view.segment.element_index_at(xdata / self._s_scale)
+            # show as many digits as can be resolved on screen:
+            key = (name, index,
+                   self._round(axes, 0, xdata), self._round(axes, 1, ydata))
+        if key == self._last_key:
             return
-        name = self._view.get_axes_name(event.inaxes)
-        unit = self._view.unit
-        elem = self._view.segment.element_by_position(xdata * unit['s'])
-        # TODO: in some cases, it might be necessary to adjust the
-        # precision to the displayed xlim/ylim.
-        coord_fmt = "{0}={1:.6f}{2}".format
-        parts = [coord_fmt('s', xdata, get_raw_label(unit['s'])),
-                 coord_fmt(name, ydata, get_raw_label(unit[name]))]
-        if elem and 'name' in elem:
-            parts.append('elem={0}'.format(elem['name']))
-        self._set_status_text(', '.join(parts))
+        self._last_key = key
+        self._set_status_text(self.format_status(key) if key else "")
+
+    def _round(self, axes, axis, value):
+        """Round to the precision of one pixel, return ``(value, digits)``."""
+        lim = axes.get_xlim() if axis == 0 else axes.get_ylim()
+        size = axes.bbox.width if axis == 0 else axes.bbox.height
+        step = abs(lim[1] - lim[0]) / max(size, 1)
+        digits = int(np.clip(np.ceil(-np.log10(step)), 0, 9)) if step else 6
+        return round(value, digits), digits
+
+    def format_status(self, key):
+        """Get the text for ``(name, index, (s, digits), (y, digits))``."""
+        name, index, (xdata, xdigits), (ydata, ydigits) = key
+        view = self._view
+        labels = self._labels
+        coord_fmt = "{0}={1:.{2}f}{3}".format
+        parts = [coord_fmt('s', xdata, xdigits, labels['s']),
+                 coord_fmt(name, ydata, ydigits, labels[name])]
+        if index is not None:
+            parts.append('elem={0}'.format(
+                view.segment.elements.names[index]))
+        s, values = self._get_curve(name)
+        if len(s):
+            parts.append(coord_fmt(name + '(s)', np.interp(xdata, s, values),
+                                   max(ydigits, 3), labels[name]))
+        return ', '.join(parts)
+
+    def _get_curve(self, name):
+        """Get the float arrays ``(s, name)`` of the current TWISS."""
+        try:
+            return self._curves[name]
+        except KeyError:
+            view = self._view
+            tw = view.segment.tw
+            curve = self._curves[name] = (
+                tw.get_float('s', view.unit[view.sname]),
+                tw.get_float(name, view.unit[name]))
+            return curve
 
 
 class DrawLineElements(object):
 
+    """
+    Draw indicators for the beam line elements.
+
+    The indicators are drawn as one collection per element style (polygons
+    for thick and lines for thin elements), i.e. the number of artists does
+    not depend on the length of the line. The vertices are cached until the
+    elements change.
+    """
+
     def __init__(self, view, style):
         self._view = view
         self._style = style
+        self._cache_key = None
+        self._cache = None
         segment = view.segment
         view.hook.plot_ax.connect(self.plot_ax)
+        view.hook.destroy.connect(self.destroy)
         segment.hook.show_element_indicators.connect(view.plot)
 
     def destroy(self):
         view = self._view
         segment = view.segment
         view.hook.plot_ax.disconnect(self.plot_ax)
+        view.hook.destroy.disconnect(self.destroy)
         segment.hook.show_element_indicators.disconnect(view.plot)
 
     def plot_ax(self, axes, name):
@@ -310,31 +596,79 @@ class DrawLineElements(object):
         segment = view.segment
         if not segment.show_element_indicators:
             return
-        unit_s = view.unit[view.sname]
-        for elem in segment.elements:
-            elem_type = self.get_element_type(elem)
-            if elem_type is None:
+        # x in data coordinates, y in axes coordinates (like axvspan):
+        transform = axes.get_xaxis_transform()
+        for style, spans, lines in self.get_indicators():
+            if len(spans):
+                axes.add_collection(PolyCollection(
+                    spans, transform=transform, **style), autolim=False)
+            if len(lines):
+                axes.add_collection(LineCollection(
+                    lines, transform=transform, **style), autolim=False)
+
+    def get_indicators(self):
+        """
+        Return a list of ``(style, spans, lines)``, where ``spans`` is an
+        array of rectangles for the thick and ``lines`` an array of line
+        segments for the thin elements with that style.
+        """
+        view = self._view
+        segment = view.segment
+        elements = segment.elements
+        # scale factor from MAD-X units to the displayed unit:
+        scale = strip_unit(segment.utool.add_unit('at', 1.0),
+                           view.unit[view.sname])
+        key = (elements, elements.version, scale)
+        if key != self._cache_key:
+            self._cache = self._compute_indicators(elements, scale)
+            self._cache_key = key
+        return self._cache
+
+    def _compute_indicators(self, elements, scale):
+        data = elements.data
+        entries = data['at'] * scale
+        exits = entries + data['l'] * scale
+        thick = data['l'] != 0
+        indicators = []
+        for type_name, mask in self.get_element_types(elements):
+            style = self._style.get(type_name)
+            if style is None or not mask.any():
                 continue
-            patch_x = strip_unit(elem['at'], unit_s)
-            if strip_unit(elem['l']) != 0:
-                patch_w = strip_unit(elem['l'], unit_s)
-                axes.axvspan(patch_x, patch_x + patch_w, **elem_type)
+            style = dict(style)
+            ymin = style.pop('ymin', 0)
+            ymax = style.pop('ymax', 1)
+            x0 = entries[mask & thick]
+            x1 = exits[mask & thick]
+            spans = np.empty((len(x0), 4, 2))
+            spans[:, 0, 0] = spans[:, 1, 0] = x0
+            spans[:, 2, 0] = spans[:, 3, 0] = x1
+            spans[:, (0, 3), 1] = ymin
+            spans[:, (1, 2), 1] = ymax
+            x = entries[mask & ~thick]
+            lines = np.empty((len(x), 2, 2))
+            lines[:, :, 0] = x[:, None]
+            lines[:, 0, 1] = ymin
+            lines[:, 1, 1] = ymax
+            indicators.append((style, spans, lines))
+        return indicators
+
+    def get_element_types(self, elements):
+        """
+        Iterate over ``(type_name, mask)`` where ``mask`` selects the elements
+        that are drawn with the style ``type_name``. Quadrupoles and bends
+        are split into focussing (``f-``) and defocussing (``d-``) types.
+
+        :param ElementTable elements:
+        """
+        data = elements.data
+        for code, type_name in enumerate(elements.type_names):
+            mask = elements.type_codes == code
+            if type_name == 'quadrupole':
+                focussing = data['k1'] > 0
+            elif type_name == 'sbend':
+                focussing = data['angle'] > 0
             else:
-                axes.vlines(patch_x, **elem_type)
-
-    def get_element_type(self, elem):
-        """Return the element type name used for properties like coloring."""
-        if 'type' not in elem or 'at' not in elem:
-            return None
-        type_name = elem['type'].lower()
-        focussing = None
-        if type_name == 'quadrupole':
-            focussing = strip_unit(elem['k1']) > 0
-        elif type_name == 'sbend':
-            focussing = strip_unit(elem['angle']) > 0
-        if focussing is not None:
-            if focussing:
-                type_name = 'f-' + type_name
-            else:
-                type_name = 'd-' + type_name
-        return self._style.get(type_name)
+                yield type_name, mask
+                continue
+            yield 'f-' + type_name, mask & focussing
+            yield 'd-' + type_name, mask & ~focussing
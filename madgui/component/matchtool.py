@@ -8,7 +8,8 @@ from __future__ import absolute_import
 
 # internal
 from madgui.core import wx
-from madgui.core.plugin import HookCollection
+from madgui.util.instrument import traced
+from madgui.util.plugin import HookCollection
 from madgui.resource.package import PackageResource
 from madgui.util.unit import strip_unit
 
@@ -44,7 +45,8 @@ class MatchTool(object):
                 bitmap=bmp,
                 shortHelp='Beam matching',
                 longHelp='Match by specifying constraints for envelope x(s), y(s).')
-        panel.Bind(wx.EVT_TOOL, self.OnMatchClick, self.tool)
+        panel.Bind(wx.EVT_TOOL, traced(self.OnMatchClick, 'tool:match'),
+                   self.tool)
         # setup mouse capture
         panel.hook.capture_mouse.connect(self.stop_match)
 
@@ -60,7 +62,7 @@ class MatchTool(object):
         self.panel.hook.capture_mouse()
         self.cid = self.view.figure.canvas.mpl_connect(
                 'button_press_event',
-                self.on_match)
+                traced(self.on_match, 'click:match'))
         app = self.panel.GetTopLevelParent().app
         self.matcher = Matching(self.segment, app.conf['matching'])
         self.hook.start(self.matcher, self.view)
@@ -118,8 +120,9 @@ class MatchTool(object):
         orth_env = self.segment.get_twiss(elem, conj)
         self.matcher.add_constraint(conj, elem, orth_env)
 
-        self.matcher.match()
-        self.panel.SetCursor(orig_cursor)
+        future = self.matcher.match()
+        future.add_done_callback(
+            lambda f: wx.CallAfter(self.panel.SetCursor, orig_cursor))
 
 
 class MatchTransform(object):
@@ -174,6 +177,7 @@ class Matching(object):
 
     def stop(self):
         self.clear_constraints()
+        self.segment.release_columns(self)
         self.hook.stop()
 
     def _allvars(self, axis):
@@ -182,15 +186,22 @@ class Matching(object):
         except KeyError:
             # filter element list for usable types:
             param_spec = self._rules.get(axis, {})
-            allvars = [(elem, param_spec[elem['type']])
-                       for elem in self._elements
-                       if elem['type'] in param_spec]
+            elements = self._elements
+            allvars = [(elements[index], param_spec[type_name])
+                       for index, type_name in enumerate(elements.types)
+                       if type_name in param_spec]
             self._variable_parameters[axis] = allvars
         return allvars
 
     def match(self):
 
-        """Perform matching according to current constraints."""
+        """
+        Perform matching according to current constraints.
+
+        The matching is executed in the background MAD-X thread.
+
+        :rtype: madgui.util.executor.Future
+        """
 
         segment = self.segment
         simul = self.segment.session
@@ -239,11 +250,28 @@ class Matching(object):
                     name: simul.utool.strip_unit(name, val)})
 
         twiss_args = simul.utool.dict_strip_unit(segment.twiss_args)
-        simul.madx.match(sequence=segment.sequence.name,
-                         vary=vary,
-                         constraints=constraints,
-                         twiss_init=twiss_args)
-        segment.twiss()
+        madx = simul.madx
+
+        def match():
+            return madx.match(sequence=segment.sequence.name,
+                              vary=vary,
+                              constraints=constraints,
+                              twiss_init=twiss_args)
+
+        def finish(knobs):
+            simul.knobs.update(knobs)
+            segment.invalidate(*vary)
+            segment.twiss_async()
+
+        def failed(exc):
+            # the variables may have been changed before the error:
+            segment.invalidate(*vary)
+            segment.twiss_async()
+            wx.MessageBox('Matching failed: {}'.format(exc), 'Matching',
+                          wx.OK | wx.ICON_ERROR)
+
+        # run in background to keep the GUI responsive:
+        return simul.submit(match, callback=finish, errback=failed)
 
     def _gconstr(self, axis):
         return self.constraints.get(axis, [])
@@ -259,6 +287,7 @@ class Matching(object):
         """Add constraint and perform matching."""
         self.remove_constraint(axis, elem)
         self._sconstr(axis).append( (elem, envelope) )
+        self._require_columns()
         self.hook.add_constraint()
 
     def remove_constraint(self, axis, elem):
@@ -273,9 +302,15 @@ class Matching(object):
         else:
             del self.constraints[axis]
         if len(filtered) < len(orig):
+            self._require_columns()
             self.hook.remove_constraint()
 
     def clear_constraints(self):
         """Remove all constraints."""
         self.constraints = {}
+        self._require_columns()
         self.hook.clear_constraints()
+
+    def _require_columns(self):
+        """Let the segment fetch the TWISS columns of the constraints."""
+        self.segment.require_columns(self, list(self.constraints))
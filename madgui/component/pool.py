@@ -0,0 +1,199 @@
+# encoding: utf-8
+"""
+Pool of MAD-X worker processes for parallel computations.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import threading
+
+try:                    # python2
+    import Queue as queue
+except ImportError:     # python3
+    import queue
+
+# exported symbols
+__all__ = [
+    'Worker',
+    'MadxPool',
+]
+
+
+class Worker(object):
+
+    """
+    A MAD-X process along with the state that was applied to it.
+
+    :ivar Madx madx: the MAD-X interpreter
+    :ivar list init_files: files that were loaded on this worker
+    :ivar dict knobs: values of the lvalues that were set on this worker
+    :ivar dict defaults: values of these lvalues before they were first set
+    :ivar dict beam: last beam that was applied
+    """
+
+    def __init__(self, madx):
+        self.madx = madx
+        self.init_files = []
+        self.knobs = {}
+        self.defaults = {}
+        self.beam = None
+
+    def call_files(self, repo, names):
+        """
+        Load the files from ``names`` that were not yet loaded.
+
+        ``names`` must extend the list of previously loaded files (e.g. the
+        session's ``init_files``). Files may change arbitrary lvalues, so the
+        knobs and beam are applied again on next use.
+        """
+        new = names[len(self.init_files):]
+        if new:
+            # the files must see the same state as in the session:
+            self.set_knobs({})
+        for name in new:
+            with repo.filename(name) as f:
+                self.madx.call(f, True)
+            self.init_files.append(name)
+        if new:
+            self.knobs.clear()
+            self.defaults.clear()
+            self.beam = None
+
+    def set_knobs(self, knobs):
+        """
+        Set all lvalues that differ from the previously applied ones.
+
+        Lvalues that were set by a previous call but are missing from
+        ``knobs`` are restored to the value they had before they were first
+        set on this worker.
+        """
+        libmadx = self.madx._libmadx
+        for name in knobs:
+            if name not in self.defaults:
+                self.defaults[name] = libmadx.evaluate(name)
+        values = {name: self.defaults[name] for name in self.knobs}
+        values.update(knobs)
+        changed = [(name, value) for name, value in values.items()
+                   if self.knobs.get(name) != value]
+        if changed:
+            # submit all assignments as a single input block:
+            self.madx.input('\n'.join(name + ' = ' + str(value) + ';'
+                                      for name, value in changed))
+            self.knobs.update(changed)
+
+    def set_beam(self, beam):
+        """Apply the BEAM command if it differs from the previous one."""
+        if beam != self.beam:
+            self.madx.command.beam(**beam)
+            self.beam = beam
+
+    def close(self):
+        self.madx._service.close()
+
+
+class MadxPool(object):
+
+    """
+    Distributes tasks to a fixed number of MAD-X worker processes.
+
+    Every worker process is served by a thread in the current process. The
+    threads spend most of their time waiting for the MAD-X process, so the
+    tasks are effectively executed in parallel.
+    """
+
+    def __init__(self, spawn, size):
+        """
+        The worker processes are started concurrently.
+
+        :param spawn: callable that returns a fully initialized ``Madx``
+        :param int size: number of worker processes
+        """
+        self._tasks = queue.Queue()
+        self._workers = [Worker(madx) for madx in _spawn_all(spawn, size)]
+        self._threads = [threading.Thread(target=self._work, args=(worker,))
+                         for worker in self._workers]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def close(self):
+        """Stop all worker threads and processes."""
+        for thread in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        for worker in self._workers:
+            worker.close()
+        self._threads = []
+        self._workers = []
+
+    def imap_unordered(self, func, args_list):
+        """
+        Execute ``func(worker, *args)`` for every ``args`` in ``args_list``.
+
+        Returns an iterator over ``(index, result)`` tuples in the order of
+        completion. Exceptions raised in the workers are re-raised here.
+        Tasks that have not been started when the iteration stops (due to an
+        exception or because the iterator is closed early) are cancelled.
+        """
+        results = queue.Queue()
+        cancelled = threading.Event()
+        count = 0
+        for index, args in enumerate(args_list):
+            self._tasks.put((index, func, args, results, cancelled))
+            count += 1
+        try:
+            for _ in range(count):
+                index, result, exc = results.get()
+                if exc is not None:
+                    raise exc
+                yield index, result
+        finally:
+            cancelled.set()
+
+    def _work(self, worker):
+        """Thread main function: process tasks until receiving ``None``."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            index, func, args, results, cancelled = task
+            if cancelled.is_set():
+                continue
+            try:
+                results.put((index, func(worker, *args), None))
+            except Exception as exc:
+                results.put((index, None, exc))
+
+
+def _spawn_all(spawn, size):
+    """
+    Call ``spawn`` ``size`` times concurrently and return the results. If
+    any call fails, the successfully spawned processes are closed and the
+    first exception is re-raised.
+    """
+    results = [None] * size
+    def target(i):
+        try:
+            results[i] = (spawn(), None)
+        except Exception as exc:
+            results[i] = (None, exc)
+    threads = [threading.Thread(target=target, args=(i,))
+               for i in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    errors = [exc for _, exc in results if exc is not None]
+    if errors:
+        for madx, exc in results:
+            if exc is None:
+                madx._service.close()
+        raise errors[0]
+    return [madx for madx, _ in results]
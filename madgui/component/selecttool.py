@@ -10,6 +10,7 @@ from __future__ import absolute_import
 from madgui.core import wx
 from madgui.component.elementview import ElementView, ElementMarker
 from madgui.widget.table import TableDialog
+from madgui.util.instrument import traced
 
 # exported symbols
 __all__ = [
@@ -37,7 +38,8 @@ class SelectTool(object):
             bitmap=bmp,
             shortHelp='Show info for individual elements',
             longHelp='Show info for individual elements')
-        panel.Bind(wx.EVT_TOOL, self.OnSelectClick, self.tool)
+        panel.Bind(wx.EVT_TOOL, traced(self.OnSelectClick, 'tool:select'),
+                   self.tool)
         # setup mouse capture
         panel.hook.capture_mouse.connect(self.stop_select)
         # element marker
@@ -55,7 +57,7 @@ class SelectTool(object):
         self.panel.hook.capture_mouse()
         self.cid = self.view.figure.canvas.mpl_connect(
             'button_press_event',
-            self.on_select)
+            traced(self.on_select, 'click:select'))
         self._cid_key = self.view.figure.canvas.mpl_connect(
             'key_press_event',
             self.on_key)
@@ -7,25 +7,50 @@ Session component for the MadGUI application.
 from __future__ import absolute_import
 
 # standard library
-from collections import namedtuple
-from functools import reduce
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from functools import partial, reduce
+import itertools
+import logging
+import multiprocessing
 import os
+import re
 import subprocess
+import threading
+import weakref
 
 # 3rd party
+from cpymad._rpc import LibMadxClient
 from cpymad.madx import Madx
-from cpymad.util import normalize_range_name
+from cpymad.util import name_to_internal, normalize_range_name
 
 import numpy as np
 import yaml
 
 # internal
-from madgui.core.plugin import HookCollection
+from madgui.util.plugin import HookCollection
+from madgui.component.elementtable import ElementTable
+from madgui.component.pool import MadxPool
+from madgui.component.twisstable import TwissTable
+from madgui.util.cache import LRUCache, freeze
 from madgui.util.common import temp_filename
+from madgui.util.executor import Executor, Future, Synchronized
+from madgui.util.instrument import CountingStream, Instrumented, bind_action
+from madgui.util import madxeval
+from madgui.util import madxtable
+from madgui.util import optics
+
+# compatibility
+try:                    # python2
+    basestring
+except NameError:       # python3
+    basestring = str
 
 # exported symbols
 __all__ = [
+    'CommandBatch',
     'ElementInfo',
+    'MadxProcess',
     'Session',
     'Segment',
 ]
@@ -35,6 +60,238 @@ def kronecker(i, j):
     return 1 if i == j else 0
 
 
+_re_identifier = re.compile(r'[a-z_][a-z0-9_.]*', re.IGNORECASE)
+
+
+def _internal_name(name):
+    """
+    Convert an element name to MAD-X internal notation, e.g. ``q1[2]`` to
+    ``q1:2``. Names that are already in internal notation (as returned by
+    MAD-X) are kept unchanged.
+    """
+    if ':' in name:
+        return name
+    return name_to_internal(name)
+
+
+def _iter_expressions(value):
+    """Iterate over the expression strings contained in an element value."""
+    if isinstance(value, (list, tuple)):
+        for v in value:
+            for expr in _iter_expressions(v):
+                yield expr
+    elif hasattr(value, '_expression'):     # SymbolicValue
+        yield str(value._expression)
+    elif hasattr(value, 'expr'):            # cpymad.types.Expression
+        yield str(value.expr)
+
+
+def _spawn_process():
+    """Start a MAD-X interpreter process, return ``(service, process)``."""
+    # stdin=None leads to an error on windows when STDIN is broken.
+    # therefore, we need set stdin=os.devnull by passing stdin=False:
+    return LibMadxClient.spawn_subprocess(
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        stdin=False,
+        bufsize=0)
+
+
+def _spawn_madx(lock=None, process=None):
+    """
+    Start a new MAD-X interpreter process (or adopt a :class:`MadxProcess`).
+
+    If a lock is given, all calls to the remote process are serialized with
+    this lock, which makes it safe to use the interpreter from several
+    threads.
+    """
+    if process is None:
+        service, process = _spawn_process()
+    else:
+        service, process = process.result()
+    libmadx = service.libmadx
+    if lock is not None:
+        libmadx = Synchronized(libmadx, lock)
+    madx = Madx(libmadx=libmadx)
+    madx._service = service
+    madx._process = process
+    return madx
+
+
+def _scan_twiss(worker, repo, init_files, knobs, beam, twiss_args):
+    """Pool task: compute TWISS on a worker with the given knob values."""
+    worker.call_files(repo, init_files)
+    worker.set_beam(beam)
+    worker.set_knobs(knobs)
+    return dict(worker.madx.twiss(**twiss_args))
+
+
+def _sizeof_twiss(results):
+    """Number of bytes used by the columns of raw TWISS results."""
+    return sum(getattr(col, 'nbytes', 0) for col in results.values())
+
+
+class TwissResults(dict):
+
+    """Raw TWISS columns (dict of arrays) with a ``summary`` attribute."""
+
+    summary = {}
+
+
+class _TwissRequest(object):
+
+    """
+    Parameters and results of a TWISS computation, see
+    :meth:`Segment._begin_twiss`.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _InputCounter(object):
+
+    """
+    Proxy for ``libmadx`` that counts the calls which may modify the state
+    of the interpreter, see :attr:`Session.input_count`.
+    """
+
+    _modifying = ('input', 'set_var')
+
+    def __init__(self, libmadx):
+        self._obj = libmadx
+        self.count = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if name not in self._modifying:
+            return attr
+        def counted(*args, **kwargs):
+            self.count += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CommandBatch(object):
+
+    """
+    Collects MAD-X assignments and evaluations and submits them with as few
+    round trips as possible.
+
+    The operations are executed in order on :meth:`flush`, where each run of
+    consecutive assignments is sent as one input block and each run of
+    consecutive evaluations as one bulk request. The results of evaluations
+    are delivered through the returned futures.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self._ops = []
+
+    def set_value(self, name, value):
+        """Queue an assignment ``name = value``."""
+        self._ops.append(('set', (name, value)))
+
+    def evaluate(self, expr):
+        """
+        Queue the evaluation of an expression.
+
+        :rtype: madgui.util.executor.Future
+        """
+        future = Future()
+        self._ops.append(('eval', (expr, future)))
+        return future
+
+    def flush(self):
+        """
+        Execute all queued operations.
+
+        A failing group does not prevent the execution of the following
+        groups, the first error is re-raised after all groups were run.
+        """
+        ops, self._ops = self._ops, []
+        session = self._session
+        error = None
+        with session.lock:
+            for kind, group in itertools.groupby(ops, lambda op: op[0]):
+                args = [arg for _, arg in group]
+                try:
+                    if kind == 'set':
+                        session._input_values(args)
+                        continue
+                    values = session._evaluate_remote(
+                        [expr for expr, _ in args])
+                except Exception as exc:
+                    if kind == 'eval':
+                        for _, future in args:
+                            future.set_exception(exc)
+                    error = error or exc
+                    continue
+                for (_, future), value in zip(args, values):
+                    future.set_result(value)
+        if error is not None:
+            raise error
+
+
+class MadxProcess(object):
+
+    """
+    MAD-X interpreter process that is started in a background thread.
+
+    The process is adopted by a :class:`Session` when the interpreter is
+    first needed, so that the startup does not have to wait for it.
+    """
+
+    def __init__(self):
+        self._future = Future()
+        thread = threading.Thread(target=self._spawn)
+        thread.daemon = True
+        thread.start()
+
+    def _spawn(self):
+        try:
+            service, process = _spawn_process()
+            service.libmadx.start()
+        except Exception as e:
+            self._future.set_exception(e)
+        else:
+            self._future.set_result((service, process))
+
+    def done(self):
+        """Check whether the process has been started."""
+        return self._future.done()
+
+    def result(self):
+        """Wait for the process and return ``(service, process)``."""
+        return self._future.result()
+
+    def close(self):
+        """Stop the process (as soon as it is started) without waiting."""
+        def close(future):
+            if future.exception() is None:
+                future.result()[0].close()
+        self._future.add_done_callback(close)
+
+
+class _Adopted(object):
+
+    """
+    Session attribute that adopts the MAD-X process on first access.
+
+    This is a non-data descriptor, i.e. the attribute values that are set by
+    :meth:`Session._adopt` shadow it and further accesses cost nothing.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        instance._adopt()
+        return instance.__dict__[self.name]
+
+
 class Session(object):
 
     """
@@ -49,48 +306,309 @@ class Session(object):
     :ivar repo: resource provider
 
     :ivar segment: Currently active segment
+    :ivar knobs: lvalues that were set via :meth:`set_value`
+    :ivar lock: must be held for compound operations on :attr:`madx`
+    :ivar executor: background thread for MAD-X operations, see
+                    :meth:`submit`
 
     :ivar rpc_client: Low level MAD-X RPC client
     :ivar remote_process: MAD-X process
+    :ivar stats: call statistics if enabled, see :meth:`instrument`
+
+    The MAD-X process is started in the background and waited for only when
+    one of :attr:`madx`, :attr:`libmadx`, :attr:`rpc_client` or
+    :attr:`remote_process` is accessed first, see :attr:`ready`.
     """
 
     # TODO: more logging
     # TODO: saveable state
 
-    def __init__(self, utool, repo=None):
-        """Initialize with (Madx, Model)."""
+    # number of worker processes in the pool (default: number of CPUs)
+    pool_size = None
+
+    # limits for the TWISS result cache of the segment (see LRUCache):
+    twiss_cache_limits = {'max_entries': 64, 'max_bytes': 64 * 2**20}
+
+    madx = _Adopted('madx')
+    libmadx = _Adopted('libmadx')
+    rpc_client = _Adopted('rpc_client')
+    remote_process = _Adopted('remote_process')
+
+    def __init__(self, utool, repo=None, process=None):
+        """
+        Initialize with (Madx, Model).
+
+        :param MadxProcess process: interpreter to adopt (default: new one)
+        """
         self.utool = utool
         self.data = {}
         self.repo = repo
         self.segment = None
         self.init_files = []
-        # stdin=None leads to an error on windows when STDIN is broken.
-        # therefore, we need set stdin=os.devnull by passing stdin=False:
-        self.madx = madx = Madx(
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=False,
-            bufsize=0)
-        self.libmadx = madx._libmadx
-        self.rpc_client = madx._service
-        self.remote_process = madx._process
+        self.knobs = OrderedDict()
+        self._pool = None
+        self._seq_models = {}
+        self._local = threading.local()
+        self.stats = None
+        self._nbytes = None
+        self._inputs = None
+        self.lock = threading.RLock()
+        self.executor = Executor(self.lock)
+        self._process = process or MadxProcess()
+        self._adopted = False
+
+    @property
+    def ready(self):
+        """Check if the MAD-X process has been adopted (without waiting)."""
+        return self._adopted
+
+    def _adopt(self):
+        """Wait for the MAD-X process and make it the session interpreter."""
+        with self.lock:
+            if self._adopted:
+                return
+            madx = _spawn_madx(self.lock, self._process)
+            self._inputs = _InputCounter(madx._libmadx)
+            self.madx = madx
+            self.libmadx = madx._libmadx = self._inputs
+            self.rpc_client = madx._service
+            self.remote_process = madx._process
+            self._adopted = True
 
     def close(self):
         """Close current session. Stop MAD-X interpreter."""
-        if self.rpc_client:
-            self.rpc_client.close()
-        self.rpc_client = None
-        self.remote_process = None
-        self.libmadx = None
-        self.madx = None
+        self.executor.shutdown()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        with self.lock:
+            if not self._adopted:
+                # don't wait for a process that was never used:
+                self._process.close()
+                self._adopted = True
+            elif self.rpc_client:
+                self.rpc_client.close()
+            self.rpc_client = None
+            self.remote_process = None
+            self.libmadx = None
+            self.madx = None
         if self.segment is not None:
             self.segment.destroy()
 
+    @property
+    def input_count(self):
+        """
+        Number of calls that may have modified the MAD-X state (commands
+        and variable assignments), used to detect untracked changes.
+        """
+        return 0 if self._inputs is None else self._inputs.count
+
     def call(self, name):
         """Load a MAD-X file into the current session."""
         with self.repo.filename(name) as f:
             self.madx.call(f, True)
         self.init_files.append(name)
+        self._seq_models.clear()
+
+    def submit(self, func, args=(), key=None, callback=None, errback=None):
+        """
+        Execute ``func(*args)`` in the background MAD-X thread.
+
+        The task holds :attr:`lock` while running. Pending tasks with the
+        same ``key`` are coalesced. The ``callback`` receives the result,
+        the ``errback`` receives the exception if the task fails. Both are
+        invoked via ``executor.dispatch`` (i.e. in the GUI thread if
+        configured accordingly).
+
+        :rtype: madgui.util.executor.Future
+        """
+        # attribute the work to the action that requested it:
+        func = bind_action(func)
+        if callback is not None:
+            callback = bind_action(callback)
+        if errback is not None:
+            errback = bind_action(errback)
+        return self.executor.submit(func, args, key=key, callback=callback,
+                                    errback=errback)
+
+    def instrument(self, stats):
+        """
+        Record statistics about all calls on :attr:`madx` and
+        :attr:`libmadx` (latency, bytes transferred over the pipe).
+
+        :param madgui.util.instrument.Statistics stats:
+        """
+        conn = self.rpc_client._conn
+        recv = conn._recv = CountingStream(conn._recv)
+        send = conn._send = CountingStream(conn._send)
+        self._nbytes = lambda: recv.nbytes + send.nbytes
+        self.stats = stats
+        libmadx = Instrumented(self.rpc_client.libmadx, stats, 'libmadx',
+                               self._nbytes)
+        self._inputs._obj = Synchronized(libmadx, self.lock)
+        self.madx = Instrumented(self.madx, stats, 'madx')
+
+    def set_value(self, name, value):
+        """
+        Set a MAD-X lvalue (global variable or "elem->attr").
+
+        The value is recorded in :attr:`knobs` in order to replicate the
+        state to the worker processes, see :meth:`scan`. Within a
+        :meth:`commands` block the assignment is deferred until the end of
+        the block.
+        """
+        self.knobs[name] = value
+        batch = getattr(self._local, 'commands', None)
+        if batch is not None:
+            batch.set_value(name, value)
+        else:
+            self._input_values([(name, value)])
+
+    def set_values(self, values):
+        """Set multiple lvalues (dict or list of pairs) in one go."""
+        items = list(values.items() if hasattr(values, 'items') else values)
+        with self.commands():
+            for name, value in items:
+                self.set_value(name, value)
+
+    def evaluate_many(self, exprs):
+        """
+        Evaluate a list of MAD-X expressions in a single round trip.
+
+        Pending assignments of an active :meth:`commands` block are
+        submitted beforehand.
+
+        :returns: list of floats
+        """
+        exprs = list(exprs)
+        if not exprs:
+            return []
+        batch = getattr(self._local, 'commands', None)
+        with self.lock:
+            if batch is not None:
+                batch.flush()
+            return self._evaluate_remote(exprs)
+
+    def _remote_module(self, name):
+        """Access a module in the MAD-X process (instrumented if enabled)."""
+        remote = self.rpc_client.modules[name]
+        if self.stats is None:
+            return remote
+        return Instrumented(remote, self.stats, name.rsplit('.', 1)[-1],
+                            self._nbytes)
+
+    @contextmanager
+    def commands(self):
+        """
+        Context manager that collects the :meth:`set_value` calls (and the
+        evaluations queued on the returned :class:`CommandBatch`) and
+        submits them when the outermost block exits. The batch is local to
+        the current thread.
+        """
+        batch = getattr(self._local, 'commands', None)
+        if batch is not None:
+            yield batch
+            return
+        batch = self._local.commands = CommandBatch(self)
+        try:
+            yield batch
+        finally:
+            self._local.commands = None
+            batch.flush()
+
+    def _input_values(self, items):
+        text = '\n'.join(name + ' = ' + str(value) + ';'
+                         for name, value in items)
+        self.madx.input(text)
+
+    def _evaluate_remote(self, exprs):
+        remote = self._remote_module(madxeval.__name__)
+        # direct remote calls bypass the synchronized libmadx proxy:
+        with self.lock:
+            return remote.evaluate(exprs)
+
+    def get_table_rows(self, table, start=0, stop=None, columns=None,
+                       numeric_only=False):
+        """
+        Get the rows ``[start:stop]`` of a MAD-X table (without units).
+
+        The slice is taken in the MAD-X process, i.e. only the requested
+        rows are transferred.
+
+        :returns: dict of ``{column: array}``
+        :raises ValueError: if the table or a column does not exist
+        """
+        remote = self._remote_module(madxtable.__name__)
+        # direct remote calls bypass the synchronized libmadx proxy:
+        with self.lock:
+            return remote.get_table_rows(table, start, stop, columns,
+                                         numeric_only)
+
+    def get_table_row(self, table, index, columns=None, numeric_only=False):
+        """
+        Get a single row of a MAD-X table (without units).
+
+        :returns: dict of ``{column: value}``
+        :raises IndexError: if the row does not exist
+        """
+        rows = self.get_table_rows(table, index, index+1 or None,
+                                   columns, numeric_only)
+        try:
+            return {key: data[0] for key, data in rows.items()}
+        except IndexError:
+            raise IndexError("Row {} not in table {!r}.".format(index, table))
+
+    #----------------------------------------
+    # Parallel computations
+    #----------------------------------------
+
+    @property
+    def pool(self):
+        """Pool of MAD-X worker processes (started on first access)."""
+        if self._pool is None:
+            size = self.pool_size or multiprocessing.cpu_count()
+            self._pool = MadxPool(self._spawn_worker, size)
+        return self._pool
+
+    def _spawn_worker(self):
+        """
+        Start a MAD-X process. The init files are loaded by the tasks (see
+        :meth:`~madgui.component.pool.Worker.call_files`), so that files
+        loaded into the session later are also replayed on the workers.
+        """
+        return _spawn_madx()
+
+    def scan(self, knob_grid, columns):
+        """
+        Compute the TWISS of the current segment for many knob values.
+
+        The computations are distributed over the worker :attr:`pool`. Every
+        worker has the same init files, beam and :attr:`knobs` as the
+        session, overridden by the values of the grid point.
+
+        :param knob_grid: list of dicts ``{lvalue: value}`` (MAD-X units),
+                          or a dict ``{lvalue: values}`` that is expanded to
+                          the cartesian product of the values
+        :param list columns: TWISS columns to compute
+        :returns: iterator over ``(point, twiss)`` tuples in the order in
+                  which the computations complete
+        """
+        if isinstance(knob_grid, dict):
+            names = list(knob_grid)
+            knob_grid = [dict(zip(names, values)) for values in
+                         itertools.product(*[knob_grid[n] for n in names])]
+        else:
+            knob_grid = list(knob_grid)
+        segment = self.segment
+        beam = self.utool.dict_strip_unit(segment.beam)
+        beam = dict(beam, sequence=segment.sequence.name)
+        twiss_args = segment._get_twiss_args(columns=list(columns))
+        init_files = list(self.init_files)
+        tasks = [(self.repo, init_files, dict(self.knobs, **point), beam,
+                  twiss_args)
+                 for point in knob_grid]
+        for index, results in self.pool.imap_unordered(_scan_twiss, tasks):
+            yield knob_grid[index], self.utool.dict_add_unit(results)
 
     #----------------------------------------
     # Serialization
@@ -134,32 +652,51 @@ class Session(object):
         return data
 
     @classmethod
-    def load(cls, utool, repo, filename):
+    def load(cls, utool, repo, filename, process=None):
         """Load model or plain MAD-X file."""
         ext = os.path.splitext(filename)[1]
         if ext.lower() in ('.yml', '.yaml'):
-            return cls.load_model(utool, repo, filename)
+            return cls.load_model(utool, repo, filename, process)
         else:
-            return cls.load_madx_file(utool, repo, filename)
+            return cls.load_madx_file(utool, repo, filename, process)
 
     @classmethod
-    def load_madx_file(cls, utool, repo, filename):
-        """Load a plain MAD-X file."""
-        session = cls(utool, repo)
-        session.call(filename)
+    def load_madx_file(cls, utool, repo, filename, process=None):
+        """
+        Load a plain MAD-X file. The session (and the given process) is
+        closed if loading fails.
+        """
+        session = cls(utool, repo, process)
+        try:
+            session.call(filename)
+        except:
+            session.close()
+            raise
         return session
 
     @classmethod
-    def load_model(cls, utool, repo, filename):
-        """Load model data from file."""
-        data = repo.yaml(filename, encoding='utf-8')
-        cls.check_compatibility(data)
-        cls._load_params(data, utool, repo, 'beam')
-        cls._load_params(data, utool, repo, 'twiss')
-        session = cls(utool, repo)
-        session.data = data
-        for f in data.get('init-files', []):
-            session.call(f)
+    def load_model(cls, utool, repo, filename, process=None):
+        """
+        Load model data from file. The session (and the given process) is
+        closed if loading fails.
+        """
+        try:
+            data = repo.yaml(filename, encoding='utf-8')
+            cls.check_compatibility(data)
+            cls._load_params(data, utool, repo, 'beam')
+            cls._load_params(data, utool, repo, 'twiss')
+        except:
+            if process is not None:
+                process.close()
+            raise
+        session = cls(utool, repo, process)
+        try:
+            session.data = data
+            for f in data.get('init-files', []):
+                session.call(f)
+        except:
+            session.close()
+            raise
         return session
 
     def init_segment(self, data):
@@ -171,6 +708,7 @@ class Session(object):
             beam=data['beam'],
             twiss_args=data['twiss'],
             show_element_indicators=data.get('indicators', True),
+            engine=data.get('engine', 'exact'),
         )
 
     @classmethod
@@ -208,8 +746,23 @@ class Session(object):
         The returned model should be seen as a first guess/approximation. Some
         fields may be empty if they cannot reliably be determined.
 
+        The guesses are cached per sequence until the next :meth:`call`.
+
         :raises RuntimeError: if the sequence is undefined
         """
+        try:
+            model = self._seq_models[sequence_name]
+        except KeyError:
+            model = self._seq_models[sequence_name] = \
+                self._guess_seq_model(sequence_name)
+        return {
+            'sequence': model['sequence'],
+            'range': model['range'],
+            'beam': dict(model['beam']),
+            'twiss': dict(model['twiss']),
+        }
+
+    def _guess_seq_model(self, sequence_name):
         try:
             sequence = self.madx.sequences[sequence_name]
         except KeyError:
@@ -236,23 +789,21 @@ class Session(object):
 
         :raises RuntimeError: if unable to make a useful guess
         """
-        table = sequence.twiss_table        # raises RuntimeError
+        table_name = sequence.twiss_table_name      # raises RuntimeError
+        # only transfer the first and last row instead of the name column:
         try:
-            first, last = table.range
-        except ValueError:
+            first = self.get_table_row(table_name, 0, ['name'])['name']
+            last = self.get_table_row(table_name, -1, ['name'])['name']
+        except (IndexError, ValueError):
             raise RuntimeError("TWISS table inaccessible or nonsensical.")
         if first not in sequence.elements or last not in sequence.elements:
             raise RuntimeError("The TWISS table appears to belong to a different sequence.")
-        # TODO: this inefficiently copies over the whole table over the pipe
-        # rather than just the first row.
         mandatory_fields = {'betx', 'bety', 'alfx', 'alfy'}
+        row = self.get_table_row(table_name, 0, numeric_only=True)
         twiss = {
-            key: float(data[0])
-            for key, data in table.items()
-            if issubclass(data.dtype.type, np.number) and (
-                    key in mandatory_fields or
-                    data[0] != 0
-            )
+            key: float(value)
+            for key, value in row.items()
+            if key in mandatory_fields or value != 0
         }
         return (first, last), twiss
 
@@ -266,16 +817,16 @@ class Segment(object):
     Simulate one fixed segment, i.e. sequence + range.
 
     :ivar Madx madx:
-    :ivar list elements:
+    :ivar ElementTable elements:
+    :ivar TwissTable tw: current TWISS results
     :ivar dict twiss_args:
+    :ivar LRUCache twiss_cache: raw TWISS results by parameter fingerprint
     """
 
+    # Columns that are always requested from MAD-X. Further columns are
+    # requested if needed by a consumer, see :meth:`require_columns`:
     _columns = [
-        'name', 'l', 'angle', 'k1l',
-        's',
-        'x', 'y',
-        'betx','bety',
-        'alfx', 'alfy',
+        'name', 's',
     ]
 
     # TODO: extend list of merge-columns
@@ -285,12 +836,25 @@ class Segment(object):
         'alfx', 'alfy',
     ]
 
+    # Columns that are needed to restart the TWISS calculation at an
+    # arbitrary element, see :meth:`invalidate`:
+    _restart_columns = [
+        'betx', 'alfx', 'mux',
+        'bety', 'alfy', 'muy',
+        'x', 'px', 'y', 'py',
+        'dx', 'dpx', 'dy', 'dpy',
+    ]
+
+    # Engines that can be used to compute the TWISS parameters:
+    engines = ('exact', 'fast')
+
     def __init__(self, session, sequence, range, beam, twiss_args,
-                 show_element_indicators):
+                 show_element_indicators, engine='exact'):
         """
         :param Session session:
         :param str sequence:
         :param tuple range:
+        :param str engine: 'exact' (MAD-X) or 'fast' (linear optics in numpy)
         """
         self.hook = HookCollection(
             update=None,
@@ -301,6 +865,10 @@ class Segment(object):
         self.session = session
         self.sequence = session.madx.sequences[sequence]
 
+        self.elements = ElementTable(self.sequence.elements, session.utool)
+        self._name_index = None
+        self._position_index = None
+
         self.start, self.stop = self.parse_range(range)
         self.range = (normalize_range_name(self.start.name),
                       normalize_range_name(self.stop.name))
@@ -308,12 +876,28 @@ class Segment(object):
         self._beam = beam
         self._twiss_args = twiss_args
         self._show_element_indicators = show_element_indicators
+        self._raw_twiss = None
+        self._invalid_from = None
+        self._invalidated = False
+        self._changed_names = set()
+        self._lvalues = {}
+        self._knob_index = None
+        self._sectormap = None
+        self._stale_elements = set()
+        self._invalidations = 0
+        self._pending_twiss = None
+        self._beam_summary = None
+        self._engine = engine
+        self._unsupported_types = []
+        self._batch_depth = 0
+        self._batch_request = None
+        self._required_columns = weakref.WeakKeyDictionary()
+        self._madx_table = None
+        self._input_count = 0
+        self.twiss_cache = LRUCache(sizeof=_sizeof_twiss,
+                                    **session.twiss_cache_limits)
         self._use_beam(beam)
 
-        raw_elements = self.sequence.elements
-        # TODO: provide uncached version of elements with units:
-        self.elements = list(map(
-            session.utool.dict_add_unit, raw_elements))
 
         # TODO: self.hook.create(self)
 
@@ -341,12 +925,11 @@ class Segment(object):
         if isinstance(element, ElementInfo):
             return element
         if isinstance(element, (basestring, dict)):
-            element = self.sequence.elements.index(element)
-        element_data = self.session.utool.dict_add_unit(
-            self.sequence.elements[element])
+            element = self.get_element_index(element)
         if element < 0:
-            element += len(self.sequence.elements)
-        return ElementInfo(element_data['name'], element, element_data['at'])
+            element += len(self.elements)
+        return ElementInfo(self.elements.names[element], element,
+                           self.elements.get(element, 'at'))
 
     def parse_range(self, range):
         """Convert a range str/tuple to a tuple of :class:`ElementInfo`."""
@@ -378,6 +961,8 @@ class Segment(object):
     @twiss_args.setter
     def twiss_args(self, twiss_args):
         self._twiss_args = twiss_args
+        self._raw_twiss = None
+        self._sectormap = None
         self.twiss()
 
     @property
@@ -390,6 +975,25 @@ class Segment(object):
         """Set beam from a parameter dictionary."""
         self._beam = beam
         self._use_beam(beam)
+        self._raw_twiss = None
+        self._sectormap = None
+        self._beam_summary = None
+        self.twiss()
+
+    @property
+    def engine(self):
+        """Name of the engine used to compute the TWISS parameters."""
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        """Switch between the 'exact' (MAD-X) and 'fast' (numpy) engine."""
+        if engine not in self.engines:
+            raise ValueError("Unknown engine: {!r}".format(engine))
+        if engine == self._engine:
+            return
+        self._engine = engine
+        self._raw_twiss = None
         self.twiss()
 
     def _use_beam(self, beam):
@@ -401,15 +1005,66 @@ class Segment(object):
         """Find optics element by longitudinal position."""
         if pos is None:
             return None
-        for elem in self.elements:
-            at, L = elem['at'], elem['l']
-            if pos >= at and pos <= at+L:
-                return elem
-        return None
+        index = self.element_index_at(self.utool.strip_unit('s', pos))
+        if index is None:
+            return None
+        return self.elements[index]
+
+    def element_index_at(self, pos):
+        """
+        Get the index of the element at a longitudinal position (or None).
+
+        :param float pos: position in MAD-X units
+        """
+        if self._position_index is None:
+            self._position_index = self._build_position_index()
+        entries, exits = self._position_index
+        # first element whose exit is not upstream of pos:
+        index = np.searchsorted(exits, pos)
+        if index == len(exits) or entries[index] > pos:
+            return None
+        return int(index)
+
+    def _build_position_index(self):
+        """
+        Return arrays of element entry and (cumulative maximum of) exit
+        positions that are used to search elements by position.
+        """
+        data = self.elements.data
+        return data['at'], np.maximum.accumulate(data['at'] + data['l'])
 
     def get_element_index(self, elem):
-        """Get element index by it name."""
-        return self.sequence.elements.index(elem)
+        """
+        Get element index by its name.
+
+        Repeated elements can be selected by their occurrence count, either
+        as ``name[n]`` or in MAD-X internal notation ``name:n`` (the plain
+        name refers to the first occurrence).
+        """
+        if self._name_index is None:
+            self._name_index = self._build_name_index()
+        name = elem['name'] if isinstance(elem, dict) else elem
+        name = name.lower()
+        if name == '#s':
+            return 0
+        if name == '#e':
+            return len(self.elements) - 1
+        try:
+            return self._name_index[_internal_name(name)]
+        except (KeyError, ValueError):
+            raise ValueError("Element not in list: {!r}".format(name))
+
+    def _build_name_index(self):
+        """Map element names in internal notation to the element index."""
+        name_index = {}
+        for index, name in enumerate(self.elements.names):
+            name_index.setdefault(_internal_name(name.lower()), index)
+        return name_index
+
+    def _clear_indexes(self):
+        """Discard the name and position indexes of the elements."""
+        self._name_index = None
+        self._position_index = None
 
     def get_twiss(self, elem, name):
         """Return beam envelope at element."""
@@ -419,49 +1074,658 @@ class Segment(object):
         return self.tw[name][element.index - self.start.index]
 
     def contains(self, element):
-        return (self.start.index <= element.index and
-                self.stop.index >= element.index)
+        return self.contains_index(element.index)
+
+    def contains_index(self, index):
+        return self.start.index <= index and self.stop.index >= index
+
+    def invalidate(self, *names):
+        """
+        Notify the segment that the given MAD-X lvalues have been changed.
+
+        The next call to :meth:`twiss` will recompute only the part of the
+        range downstream of the first element that depends on any of these
+        names and reuse the stored results upstream of that element. The
+        cached transfer maps are discarded.
+
+        :param names: element attributes ("elem->k1") or global variables
+        """
+        with self.session.lock:
+            self._invalidate(names)
+
+    def _invalidate(self, names):
+        # the lattice was modified using MAD-X commands that may have
+        # overwritten the TWISS table:
+        self._madx_table = None
+        self._invalidated = True
+        self._invalidations += 1
+        self._changed_names.update(name.lower() for name in names)
+        first = self._invalid_from
+        for name in names:
+            indices = self._get_dependent_indices(name)
+            if indices is None:
+                # Unknown dependency, must assume that all elements changed:
+                indices = range(self.start.index, self.stop.index+1)
+            indices = [i for i in indices if self.contains_index(i)]
+            if not indices:
+                continue
+            self._sectormap = None
+            self._stale_elements.update(indices)
+            if first is None or indices[0] < first:
+                first = indices[0]
+        self._invalid_from = first
+
+    def _get_dependent_indices(self, name):
+        """
+        Return the sorted list of indices of the elements that depend on the
+        given lvalue, or ``None`` if the dependencies are unknown.
+        """
+        name = name.lower()
+        if '->' in name:
+            elem_name = name.split('->')[0]
+            try:
+                return [self.get_element_index(elem_name)]
+            except ValueError:
+                return None
+        if self._knob_index is None:
+            self._knob_index = self._build_knob_index()
+        # If no element expression references the variable directly, it
+        # may still be referenced indirectly via other global variables:
+        return self._knob_index.get(name)
+
+    def _build_knob_index(self):
+        """Map each identifier used in element expressions to the list of
+        indices of the elements referencing it."""
+        knob_index = {}
+        for index, elem in enumerate(self.elements.iter_raw()):
+            idents = set(
+                ident.lower()
+                for value in elem.values()
+                for expr in _iter_expressions(value)
+                for ident in _re_identifier.findall(expr))
+            for ident in idents:
+                knob_index.setdefault(ident, []).append(index)
+        return knob_index
+
+    def require_columns(self, owner, columns):
+        """
+        Register the TWISS columns needed by a consumer.
+
+        These columns are requested with every TWISS. Other columns are
+        fetched in a follow-up request when first accessed. The registration
+        is released with :meth:`release_columns` or when the owner is
+        garbage collected.
+
+        :param owner: consumer object (weakly referenced)
+        :param list columns: column names, may include derived columns
+        """
+        self._required_columns[owner] = list(columns)
+
+    def release_columns(self, owner):
+        """Unregister the columns required by a consumer."""
+        self._required_columns.pop(owner, None)
+
+    def _get_columns(self):
+        """Get the list of columns that are requested from MAD-X."""
+        needed = set(self._restart_columns)
+        for columns in list(self._required_columns.values()):
+            for name in columns:
+                needed.update(TwissTable.derived_columns.get(name, [name]))
+        return self._columns + sorted(needed - set(self._columns))
+
+    def _fetch_column(self, name):
+        """
+        Get an additional column for the current TWISS results.
+
+        The column is read from the MAD-X TWISS table if that still belongs
+        to the current results, otherwise the TWISS is recomputed.
+        """
+        with self.session.lock:
+            table = self.madx_table
+            if table is not None:
+                return table[name]
+            return self.raw_twiss(columns=[name])[name]
+
+    @property
+    def madx_table(self):
+        """
+        The MAD-X ``twiss`` table if it still holds the current TWISS
+        results (i.e. they were computed by a full MAD-X TWISS), otherwise
+        ``None``.
+        """
+        if self._madx_table is not None \
+                and self._madx_table is self._raw_twiss:
+            return self.madx.get_table('twiss')
+        return None
 
     def twiss(self):
         """Recalculate TWISS parameters."""
-        results = self.raw_twiss()
-        # Update TWISS results
-        self.tw = self.utool.dict_add_unit(results)
-        self.summary = self.utool.dict_add_unit(results.summary)
-        # data post processing
-        self.tw['s'] += self.start.at
+        if self._batch_depth:
+            self._batch_request = self.twiss
+            return
+        with self.session.lock:
+            request = self._begin_twiss()
+            self._compute_twiss(request)
+        self._finish_twiss(request)
+
+    def twiss_async(self):
+        """
+        Recalculate TWISS parameters in the background MAD-X thread.
+
+        The update hook is invoked when the results are available. Requests
+        that are still pending are coalesced. Results of requests that were
+        superseded in the meantime (e.g. by a synchronous :meth:`twiss`) are
+        discarded.
+
+        :returns: a future, or ``None`` if deferred by :meth:`batch`
+        :rtype: madgui.util.executor.Future
+        """
+        if self._batch_depth:
+            if self._batch_request is None:
+                self._batch_request = self.twiss_async
+            return None
+        request = self._begin_twiss()
+        return self.session.submit(self._compute_twiss, (request,),
+                                   key=(id(self), 'twiss'),
+                                   callback=self._finish_twiss,
+                                   errback=partial(self._fail_twiss, request))
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that suspends TWISS recomputation.
+
+        Requests to :meth:`twiss` or :meth:`twiss_async` (e.g. by setting
+        :attr:`beam` or :attr:`twiss_args`) are deferred until the outermost
+        block exits, where they are replaced by a single recomputation and
+        update notification. A deferred synchronous request takes precedence
+        over asynchronous ones.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_request is not None:
+                request, self._batch_request = self._batch_request, None
+                request()
+
+    def _use_twiss(self, results):
+        """Update the TWISS results and notify subscribers."""
+        start_at = self.utool.strip_unit('at', self.start.at)
+        self.tw = TwissTable(results, results.summary, self.utool, start_at,
+                             fetch=self._fetch_column)
+        self.summary = self.tw.summary
         self.pos = self.tw['s']
-        self.tw['envx'] = (self.tw['betx'] * self.summary['ex'])**0.5
-        self.tw['envy'] = (self.tw['bety'] * self.summary['ey'])**0.5
-        # Create aliases for x,y that have non-empty common prefix. The goal
-        # is to make the config file entries less awkward that hold this
-        # prefix:
-        self.tw['posx'] = self.tw['x']
-        self.tw['posy'] = self.tw['y']
         self.hook.update()
 
+    def _begin_twiss(self):
+        """
+        Prepare a TWISS computation (in the GUI thread).
+
+        Consumes the pending invalidations and captures everything that is
+        needed by :meth:`_compute_twiss`, so that the computation does not
+        depend on the state of the segment. The request supersedes all
+        requests that have not been finished yet, see :meth:`_finish_twiss`.
+
+        Changes of the lattice are tracked by :meth:`invalidate`, untracked
+        changes are detected by :meth:`_check_untracked`. Otherwise, the
+        current results are reused.
+
+        :rtype: _TwissRequest
+        """
+        self._check_untracked()
+        first, self._invalid_from = self._invalid_from, None
+        invalidated, self._invalidated = self._invalidated, False
+        changed, self._changed_names = self._changed_names, set()
+        pending = self._pending_twiss
+        if pending is not None:
+            # the superseded request will be discarded, its changes must be
+            # included here:
+            invalidated = invalidated or pending.invalidated
+            changed.update(pending.changed)
+            if pending.first is not None and (first is None or
+                                              pending.first < first):
+                first = pending.first
+        old = self._raw_twiss
+        knobs = {name.lower(): value
+                 for name, value in self.session.knobs.items()}
+        # assume that the changed lvalues were set via set_value, this is
+        # verified by _check_lvalues:
+        lvalues = {name: value for name, value in self._lvalues.items()
+                   if name not in changed}
+        key = self._get_cache_key(dict(knobs, **lvalues))
+        start, stop = self.start.index, self.stop.index
+        cached = False
+        if old is not None and first is None:
+            # nothing or only elements outside the range were changed:
+            results = old
+        else:
+            results = self.twiss_cache.get(key)
+            cached = results is not None
+        request = _TwissRequest(
+            key=key,
+            knobs=knobs,
+            lvalues=lvalues,
+            changed=changed,
+            cached=cached,
+            invalidated=invalidated,
+            first=first,
+            old=old,
+            results=results,
+            engine=self.engine,
+            start=start,
+            stop=stop,
+            twiss_args=self._get_twiss_args(),
+            first_name=None,
+            invalidations=self._invalidations,
+            refreshed=[],
+            unsupported=None,
+            beam_summary=self._beam_summary,
+        )
+        if first is not None and start < first <= stop:
+            request.first_name = self.get_element_info(first).name
+        # the cached results may be dropped by _check_lvalues:
+        if (results is None or cached) and request.engine == 'fast':
+            elements = self.elements
+            rows = slice(start, stop+1)
+            request.stale = sorted(i for i in self._stale_elements
+                                   if start <= i <= stop)
+            request.types = elements.types[rows]
+            request.params = {key: elements.data[key][rows].copy()
+                              for key in elements.columns}
+            request.names = elements.names[rows]
+        self._pending_twiss = request
+        return request
+
+    def _check_untracked(self):
+        """
+        Detect untracked changes of the lattice.
+
+        If MAD-X received other commands since the last check (see
+        :attr:`Session.input_count`) without a preceding :meth:`invalidate`
+        or parameter change, this indicates an untracked change. In this
+        case, everything derived from the lattice is discarded: all cached
+        TWISS results (of any parameters), the transfer maps
+        (:attr:`sectormap`) and the element data of the range. The current
+        results are recomputed by the next :meth:`twiss`.
+        """
+        pending = self._pending_twiss
+        invalidated = self._invalidated or (
+            pending is not None and pending.invalidated)
+        input_count = self.session.input_count
+        untracked = input_count != self._input_count and not invalidated
+        self._input_count = input_count
+        if not untracked:
+            return
+        self.twiss_cache.clear()
+        self._sectormap = None
+        self._lvalues = {}
+        if self._raw_twiss is not None:
+            start, stop = self.start.index, self.stop.index
+            self._madx_table = None
+            self._invalidated = True
+            self._invalidations += 1
+            self._invalid_from = start
+            self._stale_elements.update(range(start, stop+1))
+
+    def _compute_twiss(self, request):
+        """
+        Compute the TWISS results of a request (if not found in the cache).
+
+        This may run in the background MAD-X thread (holding the session
+        lock). It must not modify the segment, except for the bookkeeping of
+        the MAD-X TWISS table which is guarded by the lock. Everything else
+        is applied by :meth:`_finish_twiss`.
+        """
+        if request.changed:
+            self._check_lvalues(request)
+        if request.results is None:
+            with self._own_inputs():
+                if request.engine == 'fast':
+                    request.results = self._fast_twiss(request)
+                else:
+                    request.results = self._incremental_twiss(request)
+        return request
+
+    def _check_lvalues(self, request):
+        """
+        Include the invalidated lvalues that were changed without
+        :meth:`Session.set_value` in the cache key of the request.
+
+        The current values of these lvalues are obtained from MAD-X. Values
+        that differ from :attr:`Session.knobs` are kept in
+        :attr:`_lvalues`, so that the cache key describes the actual state
+        of the lattice.
+        """
+        names = sorted(request.changed)
+        values = self.session.evaluate_many(names)
+        lvalues = dict(request.lvalues)
+        lvalues.update((name, value) for name, value in zip(names, values)
+                       if request.knobs.get(name) != value)
+        if lvalues != request.lvalues:
+            request.lvalues = lvalues
+            request.key = request.key[:-1] + (
+                freeze(dict(request.knobs, **lvalues)),)
+            if request.cached:
+                request.results = None
+
+    @contextmanager
+    def _own_inputs(self):
+        """
+        Do not count the MAD-X commands issued by the segment itself within
+        this block as untracked changes (unless there were untracked changes
+        before).
+        """
+        session = self.session
+        with session.lock:
+            before = session.input_count
+            try:
+                yield
+            finally:
+                if before == self._input_count:
+                    self._input_count = session.input_count
+
+    def _finish_twiss(self, request):
+        """
+        Apply the results of a request (in the GUI thread) and notify the
+        subscribers. Results of superseded requests are discarded.
+        """
+        if request is not self._pending_twiss:
+            return
+        self._pending_twiss = None
+        self._lvalues = request.lvalues
+        if request.refreshed:
+            for index, raw in request.refreshed:
+                self.elements.refresh(index, raw)
+            self._clear_indexes()
+            # elements that were invalidated again are still stale:
+            if request.invalidations == self._invalidations:
+                self._stale_elements.difference_update(
+                    index for index, _ in request.refreshed)
+        if request.unsupported is not None:
+            self._report_unsupported(request.unsupported)
+        if request.beam_summary is not None:
+            self._beam_summary = request.beam_summary
+        self.twiss_cache.put(request.key, request.results)
+        self._raw_twiss = request.results
+        self._use_twiss(request.results)
+
+    def _fail_twiss(self, request, exception):
+        """
+        Discard a failed request (in the GUI thread). Its changes are kept
+        for the next computation, unless it was superseded anyway.
+        """
+        if request is not self._pending_twiss:
+            return
+        self._pending_twiss = None
+        self._invalidated = self._invalidated or request.invalidated
+        self._changed_names.update(request.changed)
+        first = request.first
+        if first is not None and (self._invalid_from is None or
+                                  first < self._invalid_from):
+            self._invalid_from = first
+
+    def _get_cache_key(self, knobs):
+        """
+        Fingerprint of all parameters that determine the TWISS.
+
+        :param dict knobs: values of all lvalues that were changed (the last
+                           item of the key)
+        """
+        strip_unit = self.utool.dict_strip_unit
+        return freeze((
+            self.engine,
+            self.sequence.name,
+            self.range,
+            strip_unit(self.beam),
+            strip_unit(self.twiss_args),
+            knobs,
+        ))
+
+    def _incremental_twiss(self, request):
+        """
+        Compute raw TWISS results, only recomputing the part of the range
+        downstream of the first element that was marked as changed by
+        :meth:`invalidate` since the last run.
+        """
+        old, first = request.old, request.first
+        twiss_args = request.twiss_args
+        if first is not None and old is not None and first > request.stop:
+            return old
+        self._madx_table = None
+        if (old is None or first is None or first <= request.start or
+                any(col not in old for col in twiss_args['columns'])):
+            self._madx_table = self.madx.twiss(**twiss_args)
+            return self._madx_table
+        # Restart at the entrance of the first changed element using the
+        # stored optics at the exit of its predecessor:
+        row = first - request.start
+        twiss_init = dict(twiss_args['twiss_init'])
+        twiss_init.update({
+            col: float(old[col][row-1])
+            for col in self._restart_columns
+        })
+        new = self.madx.twiss(**dict(
+            twiss_args,
+            range=(normalize_range_name(request.first_name),
+                   twiss_args['range'][1]),
+            twiss_init=twiss_init))
+        new['s'] = new['s'] + old['s'][row-1]
+        results = new.__class__(
+            (col, np.hstack((old[col][:row], new[col])))
+            for col in new)
+        results.summary = new.summary
+        return results
+
+    def _fast_twiss(self, request):
+        """
+        Compute the TWISS results using the linear optics engine. Falls back
+        to MAD-X if the range contains elements that the engine does not
+        model, see :func:`~madgui.util.optics.unsupported_types`.
+        """
+        types, params = request.types, request.params
+        request.refreshed.extend(self._read_elements(
+            types, params, request.start, request.stale))
+        request.unsupported = optics.unsupported_types(types, params)
+        if request.unsupported:
+            self._madx_table = self.madx.twiss(**request.twiss_args)
+            return self._madx_table
+        maps = optics.element_maps(types, params)
+        twiss_init = request.twiss_args['twiss_init']
+        results = TwissResults(optics.propagate(maps, twiss_init))
+        results['name'] = np.array(request.names)
+        results['l'] = params['l']
+        results['angle'] = np.where(types == 'multipole',
+                                    params['knl0'], params['angle'])
+        results['k1l'] = np.where(types == 'multipole',
+                                  params['knl1'], params['k1'] * params['l'])
+        results['s'] = params['at'] + params['l'] - params['at'][0]
+        if request.beam_summary is None:
+            # emittances for the envelopes:
+            beam = self.sequence.beam
+            request.beam_summary = {'ex': beam['ex'], 'ey': beam['ey']}
+        results.summary = request.beam_summary
+        return results
+
+    def _fast_engine_applies(self, types, params):
+        """
+        Check whether the linear optics engine supports all elements in the
+        range.
+        """
+        unknown = optics.unsupported_types(types, params)
+        self._report_unsupported(unknown)
+        return not unknown
+
+    @property
+    def unsupported_types(self):
+        """
+        Element types in the range that the linear optics engine does not
+        support, i.e. the reason why the last computation with
+        ``engine='fast'`` fell back to MAD-X (empty list if it did not).
+        """
+        return list(self._unsupported_types)
+
+    def _report_unsupported(self, unknown):
+        """
+        Log a warning whenever the set of element types that are not
+        supported by the linear optics engine changes.
+        """
+        if unknown and unknown != self._unsupported_types:
+            logging.getLogger(__name__).warning(
+                "Fast optics engine does not support: %s. "
+                "Using MAD-X instead.", optics.describe_unsupported(unknown))
+        self._unsupported_types = unknown
+
+    def _get_optics_table(self):
+        """
+        Return ``(types, params)`` arrays for the elements in the range as
+        needed by :func:`~madgui.util.optics.element_maps`.
+
+        The arrays are copies that include the current data of the changed
+        elements. The element table itself is only updated by
+        :meth:`_finish_twiss`.
+        """
+        with self.session.lock:
+            self._check_untracked()
+            start, stop = self.start.index, self.stop.index
+            elements = self.elements
+            rows = slice(start, stop+1)
+            types = elements.types[rows]
+            params = {key: elements.data[key][rows].copy()
+                      for key in elements.columns}
+            stale = sorted(i for i in self._stale_elements
+                           if start <= i <= stop)
+            self._read_elements(types, params, start, stale)
+        return types, params
+
+    def _read_elements(self, types, params, start, stale):
+        """
+        Update copied ``(types, params)`` arrays (rows relative to the
+        element index ``start``) with the current data of the ``stale``
+        elements from MAD-X.
+
+        :returns: list of ``(index, raw)`` tuples of the fetched elements
+        """
+        refreshed = []
+        for index in stale:
+            raw = self.sequence.elements[index]
+            refreshed.append((index, raw))
+            row = index - start
+            values, types[row] = self.elements.parse(raw)
+            for key in params:
+                params[key][row] = values[key]
+        return refreshed
+
     def _get_twiss_args(self, **kwargs):
         twiss_init = self.utool.dict_strip_unit(self.twiss_args)
         twiss_args = {
             'sequence': self.sequence.name,
             'range': self.range,
-            'columns': self._columns,
+            'columns': self._get_columns(),
             'twiss_init': twiss_init,
         }
         twiss_args.update(kwargs)
         return twiss_args
 
     def raw_twiss(self, **kwargs):
-        return self.madx.twiss(**self._get_twiss_args(**kwargs))
+        # the TWISS table is overwritten:
+        self._madx_table = None
+        with self._own_inputs():
+            return self.madx.twiss(**self._get_twiss_args(**kwargs))
 
     def get_transfer_map(self, beg_elem, end_elem):
         """
         Get the transfer matrix R(i,j) between the two elements.
 
-        This requires a full twiss call, so don't do it too often.
+        This is computed from the cached cumulative maps (see
+        :attr:`sectormap`) and therefore only requires a twiss call when
+        the lattice or beam have changed.
+        """
+        sectormap = self.sectormap
+        beg = sectormap[self._get_map_row(beg_elem)]
+        end = sectormap[self._get_map_row(end_elem)]
+        return np.dot(end, np.linalg.inv(beg))
+
+    def _get_map_row(self, elem):
+        """Row of an element in :attr:`sectormap`."""
+        index = self.get_element_info(elem).index
+        if not self.contains_index(index):
+            raise ValueError("Element {!r} is outside of the range {!r}."
+                             .format(elem, self.range))
+        return index - self.start.index
+
+    @property
+    def sectormap(self):
+        """
+        Cumulative 7D transfer maps from the start of the range to the exit
+        of every element in the range, array of shape (N, 7, 7).
+
+        The maps are computed by a single SECTORMAP enabled twiss call and
+        cached until the lattice or beam are changed.
+        """
+        with self.session.lock:
+            self._check_untracked()
+            if self._sectormap is None:
+                self._sectormap = self._compute_sectormap()
+            return self._sectormap
+
+    def _compute_sectormap(self):
+        """
+        Compute the cumulative 7D transfer maps from MAD-X. Must be called
+        while holding the session lock (the sector table is read after the
+        twiss call).
+        """
+        madx = self.madx
+        # the TWISS table is overwritten:
+        self._madx_table = None
+        with self._own_inputs(), temp_filename() as sectorfile:
+            madx.command.select(flag='sectormap', clear=True)
+            madx.command.select(flag='sectormap', range=self.range)
+            madx.twiss(**self._get_twiss_args(columns=None,
+                                              sectormap=True,
+                                              sectorfile=sectorfile))
+        table = madx.get_table('sectortable')
+        # The sector table contains the maps between subsequent selected
+        # elements, i.e. the individual element maps:
+        rmatrix = np.array([[table['r{}{}'.format(i, j)]
+                             for j in range(1, 7)]
+                            for i in range(1, 7)])
+        kicks = np.array([table['k{}'.format(i)]
+                          for i in range(1, 7)])
+        count = kicks.shape[1]
+        maps = np.zeros((count, 7, 7))
+        maps[:,:6,:6] = rmatrix.transpose((2, 0, 1))
+        maps[:,:6,6] = kicks.T
+        maps[:,6,6] = 1
+        return optics.cumulative_product(maps)
+
+    def twiss_batch(self, twiss_inits):
+        """
+        Compute the TWISS parameters for many initial conditions at once.
+
+        All initial conditions are propagated through the same (cached)
+        transfer maps in a single vectorized computation, i.e. without
+        further MAD-X calls. The maps are taken from the current engine
+        (from MAD-X if the fast engine does not support all elements).
+
+        :param list twiss_inits: dicts (with units) that are used to update
+                                 the segment's current :attr:`twiss_args`
+        :returns: dict of (N, n_elements) arrays (with units) for the
+                  columns betx, alfx, mux, bety, alfy, muy, x, px, y, py,
+                  dx, dpx, dy, dpy
         """
-        info = self.get_element_info
-        twiss_args = self._get_twiss_args()
-        twiss_args['range_'] = (info(beg_elem).name, info(end_elem).name)
-        twiss_args['tw_range'] = twiss_args.pop('range')
-        return self.madx.get_transfer_map_7d(**twiss_args)
+        maps = None
+        if self.engine == 'fast':
+            types, params = self._get_optics_table()
+            if self._fast_engine_applies(types, params):
+                maps = optics.element_maps(types, params)
+                cumulative = None
+        if maps is None:
+            cumulative = self.sectormap
+            maps = optics.differential_maps(cumulative)
+        strip_unit = self.utool.dict_strip_unit
+        twiss_inits = [strip_unit(dict(self.twiss_args, **twiss_init))
+                       for twiss_init in twiss_inits]
+        results = optics.propagate_batch(maps, twiss_inits, cumulative)
+        return self.utool.dict_add_unit(results)
@@ -0,0 +1,137 @@
+# encoding: utf-8
+"""
+Column store for TWISS results.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+import numpy as np
+
+# exported symbols
+__all__ = [
+    'TwissTable',
+]
+
+
+class TwissTable(object):
+
+    """
+    Read-only mapping of TWISS columns.
+
+    The columns are stored as plain float arrays in MAD-X units. Indexing
+    the table returns a (memoized) unit-carrying view of a column, use
+    :meth:`get_float` to access the plain data.
+
+    Besides the columns computed by MAD-X the following derived columns are
+    computed lazily:
+
+    - ``s`` is shifted to be relative to the start of the sequence
+    - ``envx``, ``envy``: beam envelopes
+    - ``posx``, ``posy``: aliases for ``x`` and ``y``
+
+    :ivar dict summary: summary table (with units)
+    """
+
+    # MAD-X columns that are needed to compute the derived columns:
+    derived_columns = {
+        'envx': ['betx'],
+        'envy': ['bety'],
+        'posx': ['x'],
+        'posy': ['y'],
+    }
+
+    # Derived columns and the column that determines their unit:
+    _derived_units = {
+        'envx': 'x',
+        'envy': 'y',
+        'posx': 'x',
+        'posy': 'y',
+    }
+
+    def __init__(self, columns, summary, utool, s_offset=0, fetch=None):
+        """
+        :param dict columns: raw TWISS columns (MAD-X units)
+        :param dict summary: raw summary table (MAD-X units)
+        :param UnitConverter utool: used to add units
+        :param float s_offset: position of the first element (MAD-X units)
+        :param fetch: ``fetch(name)`` is used to retrieve columns that are
+                      missing in ``columns``, the result is stored in the
+                      table (``columns`` itself is not modified, it may be
+                      shared, e.g. by a cache)
+        """
+        self._columns = dict(columns)
+        self._fetch = fetch
+        self._raw_summary = summary
+        self._utool = utool
+        self._s_offset = s_offset
+        self._floats = {}
+        self._views = {}
+        self.summary = utool.dict_add_unit(summary)
+
+    def __getitem__(self, name):
+        """Get a column with units."""
+        try:
+            return self._views[name]
+        except KeyError:
+            unit_name = self._derived_units.get(name, name)
+            view = self._utool.add_unit(unit_name, self.get_float(name))
+            self._views[name] = view
+            return view
+
+    def __contains__(self, name):
+        """Check if the column is available (without fetching)."""
+        return name in self._columns or name in self._derived_units
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return list(self._columns) + [name for name in self._derived_units
+                                      if name not in self._columns]
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def get_float(self, name, unit=None):
+        """
+        Get a column as plain array.
+
+        :param str name: column name
+        :param unit: convert from MAD-X units to this unit if given
+        """
+        try:
+            data = self._floats[name]
+        except KeyError:
+            data = self._floats[name] = self._compute(name)
+        if unit is None:
+            return data
+        unit_name = self._derived_units.get(name, name)
+        one = self._utool.add_unit(unit_name, 1.0)
+        if not hasattr(one, 'magnitude'):
+            return data
+        return data * one.to(unit).magnitude
+
+    def _compute(self, name):
+        if name == 's':
+            return self._columns['s'] + self._s_offset
+        if name == 'envx':
+            return np.sqrt(self.get_float('betx') * self._raw_summary['ex'])
+        if name == 'envy':
+            return np.sqrt(self.get_float('bety') * self._raw_summary['ey'])
+        if name == 'posx':
+            return self.get_float('x')
+        if name == 'posy':
+            return self.get_float('y')
+        try:
+            column = self._columns[name]
+        except KeyError:
+            if self._fetch is None:
+                raise
+            column = self._columns[name] = self._fetch(name)
+        if np.issubdtype(np.asarray(column).dtype, np.number):
+            return np.ascontiguousarray(column, dtype=float)
+        return column
@@ -3,11 +3,12 @@
 MadGUI - interactive GUI application for MAD-X via cpymad.
 
 Usage:
-    madgui [--config <config>]
+    madgui [--config <config>] [--profile-startup]
     madgui (--help | --version)
 
 Options:
     --config=<config>       Set config file
+    --profile-startup       Report import and initialization times
     -h, --help              Show this help
     -v, --version           Show version information
 
@@ -22,6 +23,9 @@ Website:
 
 # force new style imports
 from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
 
 from pkg_resources import (EntryPoint, Requirement, working_set,
                            iter_entry_points)
@@ -31,8 +35,9 @@ import wx
 
 # internal
 from madgui import __version__
-from madgui.core.config import load_config, recursive_merge
-from madgui.core.plugin import HookCollection
+from madgui.util import startup
+from madgui.util.config import load_config, recursive_merge
+from madgui.util.plugin import HookCollection, registry
 
 # exported symbols
 __all__ = [
@@ -85,8 +90,14 @@ class App(wx.App):
         """
         from docopt import docopt
         args = docopt(cls.usage, argv, version=cls.version)
-        conf = load_config(args['--config'])
-        cls(args, conf).MainLoop()
+        if args['--profile-startup']:
+            # NOTE: imports are timed only if started via madgui.__main__:
+            startup.start()
+        with startup.step('load config'):
+            conf = load_config(args['--config'])
+        with startup.step('create application'):
+            app = cls(args, conf)
+        app.MainLoop()
 
     def __init__(self, args=None, conf=None):
         """
@@ -99,27 +110,37 @@ class App(wx.App):
         self.args = args
         self.conf = conf
         self.dist = working_set.find(Requirement.parse('madgui'))
-        self.add_entry_points(self.entry_points)
-        # Add all entry point maps (strings like `App.entry_point` above) that
-        # are registered under 'madgui.entry_points'. This indirection renders
-        # the plugin mechanism more dynamic and allows plugins to be defined
-        # more easily by eliminating the need to execute 'setup.py' each time
-        # an entrypoint is added, changed or removed. Instead, their setup
-        # step only needs to create a single entrypoint which is less likely
-        # to change.
-        for ep in iter_entry_points('madgui.entry_points'):
-            self.add_entry_points(ep.load())
+        with startup.step('load entry points'):
+            self.add_entry_points(self.entry_points)
+            # Add all entry point maps (strings like `App.entry_point` above)
+            # that are registered under 'madgui.entry_points'. This
+            # indirection renders the plugin mechanism more dynamic and
+            # allows plugins to be defined more easily by eliminating the
+            # need to execute 'setup.py' each time an entrypoint is added,
+            # changed or removed. Instead, their setup step only needs to
+            # create a single entrypoint which is less likely to change.
+            for ep in iter_entry_points('madgui.entry_points'):
+                self.add_entry_points(ep.load())
         super(App, self).__init__(redirect=False)
 
     def OnInit(self):
         """Initialize the application and create main window."""
         # allow plugin components to create stuff (frame!)
-        self.hook.init(self)
+        with startup.step('create main window'):
+            self.hook.init(self)
+        if startup.active():
+            # executed as soon as the event loop runs, i.e. window is shown:
+            wx.CallAfter(self._ReportStartup)
         # signal wxwidgets to enter the main loop
         return True
 
+    def _ReportStartup(self):
+        startup.mark('main window shown')
+        print(startup.stop().format_report(), file=sys.stderr)
+
     def add_entry_points(self, entry_map_section):
         """Add entry points."""
         recursive_merge(
             self.dist.get_entry_map(),
             EntryPoint.parse_map(entry_map_section, self.dist))
+        registry.refresh()
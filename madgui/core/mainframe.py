@@ -15,19 +15,16 @@ import threading
 # GUI components
 from madgui.core import wx
 import wx.aui
-from wx.py.shell import Shell
 
 # internal
-from madgui.core.plugin import HookCollection
-from madgui.component.about import show_about_dialog
-from madgui.component.beamdialog import BeamWidget
-from madgui.component.lineview import TwissView
-from madgui.component.modeldialog import ModelWidget
-from madgui.component.session import Session, Segment
-from madgui.component.twissdialog import TwissWidget
+# NOTE: matplotlib (views, figure panel), the python shell and the dialogs
+# are imported on first use in order to keep the startup time low.
+from madgui.util.plugin import HookCollection, HookProfiler
+from madgui.component.session import MadxProcess, Session
 from madgui.resource.file import FileResource
+from madgui.util import startup
 from madgui.util import unit
-from madgui.widget.figure import FigurePanel
+from madgui.util.instrument import Statistics, set_enabled
 from madgui.widget import menu
 from madgui.widget.input import ShowModal, Cancellable, Dialog, CancelAction
 from madgui.widget.filedialog import OpenDialog, SaveDialog
@@ -69,6 +66,12 @@ def CloseMDIChildren(parent):
         window.Destroy()
 
 
+def CreateTwissView(session, frame, basename):
+    """Open a :class:`~madgui.component.lineview.TwissView` in the frame."""
+    from madgui.component.lineview import TwissView
+    return TwissView.create(session, frame, basename=basename)
+
+
 def monospace(pt_size):
     """Return a monospace font."""
     return wx.Font(pt_size,
@@ -110,11 +113,22 @@ class MainFrame(MDIParentFrame):
             'session': None,
         }
 
-        self.madx_units = unit.UnitConverter(
-            unit.from_config_dict(self.app.conf['madx_units']))
-
-        self.CreateControls()
+        # NOTE: the units are parsed on first use and the MAD-X process is
+        # started in the background (and adopted by the next session):
+        self.madx_units = unit.UnitConverter.from_config_dict(
+            self.app.conf['madx_units'])
+        self._madx_process = None
+        self._stats_timer = None
+        # must be known before the event handlers are bound:
+        conf = self.app.conf.get('instrumentation') or {}
+        set_enabled(conf.get('enabled'))
+        self._StartHookProfiler()
+
+        with startup.step('create main window controls'):
+            self.CreateControls()
         self.Show(show)
+        # load the unit definitions while the user picks a model:
+        unit.preload()
 
     def CreateControls(self):
         # create notebook
@@ -131,7 +145,11 @@ class MainFrame(MDIParentFrame):
         """Associate a new Session with this frame."""
         # start new session if necessary
         if session is None:
-            session = Session(self.madx_units)
+            session = Session(self.madx_units, process=self._TakeProcess())
+        session.twiss_cache_limits = self.app.conf['twiss_cache']
+        # deliver the results of background tasks in the GUI thread:
+        session.executor.dispatch = wx.CallAfter
+        self._InstrumentSession(session)
         # remove existing associations
         if self.session:
             self.session.close()
@@ -140,16 +158,68 @@ class MainFrame(MDIParentFrame):
         self._NewLogTab()
         self.session = session
         self.env['session'] = session
-        self.env['madx'] = session.madx
-        self.env['libmadx'] = session.libmadx
+        self.env.pop('madx', None)
+        self.env.pop('libmadx', None)
         self.env.pop('segment', None)
         self.env.pop('sequence', None)
         self.env.pop('elements', None)
         self.env.pop('twiss', None)
-        threading.Thread(target=self._read_stream,
-                         args=(session.remote_process.stdout,)).start()
+        # adopting the MAD-X process may block until it is started:
+        threading.Thread(target=self._read_session_output,
+                         args=(session,)).start()
         self.hook.reset()
 
+    def _TakeProcess(self):
+        """
+        Return the MAD-X process that was started in the background and
+        start another one for the next session.
+        """
+        process = self._madx_process or MadxProcess()
+        self._madx_process = MadxProcess()
+        return process
+
+    def _SessionReady(self, session):
+        """Make the interpreter available in the shell."""
+        if session is self.session and session.madx:
+            self.env['madx'] = session.madx
+            self.env['libmadx'] = session.libmadx
+
+    def _InstrumentSession(self, session):
+        """Enable call statistics for the session if configured."""
+        if self._stats_timer is not None:
+            self._stats_timer.Stop()
+            self._stats_timer = None
+        self.env.pop('instrumentation', None)
+        conf = self.app.conf.get('instrumentation') or {}
+        if not conf.get('enabled'):
+            return
+        stats = Statistics()
+        session.instrument(stats)
+        self.env['instrumentation'] = stats
+        interval = conf.get('log_interval', 0)
+        if interval:
+            timer = self._stats_timer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, lambda event: self._LogStatistics(stats),
+                      timer)
+            timer.Start(int(interval * 1000))
+
+    def _StartHookProfiler(self):
+        """Start profiling all named hooks if configured."""
+        conf = self.app.conf.get('instrumentation') or {}
+        self._hook_profiler = None
+        if conf.get('profile_hooks'):
+            profiler = self._hook_profiler = HookProfiler()
+            profiler.start()
+            self.env['hook_profiler'] = profiler
+
+    def _LogStatistics(self, stats):
+        logger = self.getLogger('madgui.instrument')
+        logger.info("MAD-X call statistics:\n%s", stats.format_summary())
+        figures = [view.figure for view in self.views]
+        logger.info("Figure redraws: %d rendered, %d coalesced",
+                    sum(getattr(f, 'rendered_draws', 0) for f in figures),
+                    sum(getattr(f, 'coalesced_draws', 0) for f in figures))
+
     @Cancellable
     def _LoadFile(self, event=None):
         self._ConfirmResetSession()
@@ -161,10 +231,13 @@ class MainFrame(MDIParentFrame):
             ShowModal(dlg)
             name = dlg.Filename
             repo = FileResource(dlg.Directory)
-        session = Session.load(self.madx_units, repo, name)
+        # the process is closed by Session.load if loading fails:
+        process = self._TakeProcess()
+        session = Session.load(self.madx_units, repo, name, process=process)
         self._ResetSession(session)
         if not session.madx.sequences:
             return
+        from madgui.component.modeldialog import ModelWidget
         with Dialog(self) as dialog:
             widget = ModelWidget(dialog, session)
             data = widget.Query(session.data)
@@ -174,7 +247,7 @@ class MainFrame(MDIParentFrame):
         self.env['sequence'] = segment.sequence
         self.env['elements'] = segment.elements
         self.env['twiss'] = segment.sequence.twiss_table
-        TwissView.create(session, self, basename='env')
+        CreateTwissView(session, self, basename='env')
 
     @Cancellable
     def _SaveModel(self, event=None):
@@ -198,7 +271,7 @@ class MainFrame(MDIParentFrame):
     @Cancellable
     def _EditTwiss(self, event=None):
         segment = self.GetActiveFigurePanel().view.segment
-        utool = self.madx_units
+        from madgui.component.twissdialog import TwissWidget
         with Dialog(self) as dialog:
             widget = TwissWidget(dialog, session=self.session)
             segment.twiss_args = widget.Query(segment.twiss_args)
@@ -206,6 +279,7 @@ class MainFrame(MDIParentFrame):
     @Cancellable
     def _SetBeam(self, event=None):
         segment = self.GetActiveFigurePanel().view.segment
+        from madgui.component.beamdialog import BeamWidget
         with Dialog(self) as dialog:
             widget = BeamWidget(dialog, session=self.session)
             segment.beam = widget.Query(segment.beam)
@@ -270,12 +344,12 @@ class MainFrame(MDIParentFrame):
             Menu('&View', [
                 MenuItem('&Envelope',
                          'Open new tab with beam envelopes.',
-                         lambda _: TwissView.create(self.session,
-                                                    self, basename='env')),
+                         lambda _: CreateTwissView(self.session,
+                                                   self, basename='env')),
                 MenuItem('&Position',
                          'Open new tab with beam position.',
-                         lambda _: TwissView.create(self.session,
-                                                    self, basename='pos')),
+                         lambda _: CreateTwissView(self.session,
+                                                   self, basename='pos')),
             ]),
             Menu('&Manage', [
                 MenuItem('&Initial conditions',
@@ -294,7 +368,7 @@ class MainFrame(MDIParentFrame):
             Menu('&Help', [
                 MenuItem('&About',
                          'Show about dialog.',
-                         lambda _: show_about_dialog(self)),
+                         self._ShowAbout),
             ]),
         ])
 
@@ -313,6 +387,10 @@ class MainFrame(MDIParentFrame):
     def TabMenuIndex(self):
         return 2
 
+    def _ShowAbout(self, event):
+        from madgui.component.about import show_about_dialog
+        show_about_dialog(self)
+
     def OnNewWindow(self, event):
         """Open a new frame."""
         self.__class__(self.app)
@@ -320,6 +398,7 @@ class MainFrame(MDIParentFrame):
     def AddView(self, view, title):
         """Add new notebook tab for the view."""
         # TODO: remove this method in favor of a event based approach?
+        from madgui.widget.figure import FigurePanel
         child = MDIChildFrame(self, -1, title)
         panel = FigurePanel(child, view)
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -342,8 +421,11 @@ class MainFrame(MDIParentFrame):
 
     def GetActiveFigurePanel(self):
         """Return the FigurePanel which is currently active or None."""
+        # NOTE: this is called on every UI update. If the figure module has
+        # not been imported yet, there can't be any figure panel:
+        figure = sys.modules.get('madgui.widget.figure')
         panel = self.GetActivePanel()
-        if isinstance(panel, FigurePanel):
+        if figure and isinstance(panel, figure.FigurePanel):
             return panel
         return None
 
@@ -355,9 +437,21 @@ class MainFrame(MDIParentFrame):
         except IOError:
             # The connection may already be terminated in case MAD-X crashed.
             pass
+        if self._madx_process is not None:
+            self._madx_process.close()
         CloseMDIChildren(self)
+        self._StopHookProfiler()
         event.Skip()
 
+    def _StopHookProfiler(self):
+        profiler = self._hook_profiler
+        if profiler is None:
+            return
+        profiler.stop()
+        trace_file = self.app.conf['instrumentation'].get('hook_trace')
+        if trace_file:
+            profiler.save(os.path.expanduser(trace_file))
+
     def OnLogTabClose(self, event):
         """Prevent the command tab from closing, if other tabs are open."""
         if self.views:
@@ -370,7 +464,8 @@ class MainFrame(MDIParentFrame):
         self.Close()
 
     def OnUpdateMenu(self, event):
-        if not self.session.madx:
+        # don't block the GUI while the MAD-X process is starting:
+        if not self.session.ready or not self.session.madx:
             return
         enable_view = bool(self.session.madx.sequences)
         # we only want to call EnableTop() if the state is actually
@@ -392,6 +487,8 @@ class MainFrame(MDIParentFrame):
 
     def _NewCommandTab(self, event=None):
         """Open a new command tab."""
+        from wx.py.shell import Shell
+        self._SessionReady(self.session)
         child = MDIChildFrame(self, -1, "Command")
         crust = Shell(child, locals=self.env)
         sizer = wx.BoxSizer(wx.VERTICAL)
@@ -431,6 +528,13 @@ class MainFrame(MDIParentFrame):
     def getLogger(self, name='root'):
         return self._log_manager.getLogger(name)
 
+    def _read_session_output(self, session):
+        process = session.remote_process
+        if process is None:     # closed before it was used
+            return
+        wx.CallAfter(self._SessionReady, session)
+        self._read_stream(process.stdout)
+
     def _read_stream(self, stream):
         # The file iterator seems to be buffered:
         for line in iter(stream.readline, b''):
@@ -8,7 +8,7 @@ from __future__ import absolute_import
 from functools import partial
 
 from madgui.core import wx
-from madgui.core.plugin import EntryPoint
+from madgui.util.plugin import EntryPoint
 from madgui.widget import menu
 from madgui.widget.input import Cancellable, Dialog, ShowModal
 
@@ -16,6 +16,7 @@ from . import api
 from . import dialogs
 from . import ovm
 from . import elements
+from . import mad_backend
 
 # TODO: catch exceptions and display error messages
 # TODO: automate loading DVM parameters via model and/or named hook
@@ -123,10 +124,7 @@ class Control(object):
     def read_all(self):
         """Read all parameters from the online database."""
         # TODO: cache and reuse 'active' flag for each parameter
-        elems = [
-            (el, el.dvm_backend.get(), el.mad2dvm(el.mad_backend.get()))
-            for el in self.iter_elements(elements.BaseMagnet)
-        ]
+        elems = self._read_magnets()
         rows = [
             (el.dvm_params[k], dv, mvals[k])
             for el, dvals, mvals in elems
@@ -145,10 +143,7 @@ class Control(object):
     @Cancellable
     def write_all(self):
         """Write all parameters to the online database."""
-        elems = [
-            (el, el.dvm_backend.get(), el.mad2dvm(el.mad_backend.get()))
-            for el in self.iter_elements(elements.BaseMagnet)
-        ]
+        elems = self._read_magnets()
         rows = [
             (el.dvm_params[k], dv, mvals[k])
             for el, dvals, mvals in elems
@@ -183,8 +178,7 @@ class Control(object):
     @Cancellable
     def on_find_initial_position(self):
         segment = self._segment
-        # TODO: sync elements attributes
-        elems = segment.sequence.elements
+        elems = segment.elements
         varyconf = segment.session.data.get('align', {})
         with Dialog(self._frame) as dialog:
             elems = ovm.OpticSelectWidget(dialog).Query(elems, varyconf)
@@ -200,6 +194,15 @@ class Control(object):
         panel = self._frame.GetActiveFigurePanel()
         return panel and panel.view.segment
 
+    def _read_magnets(self):
+        """Get ``(elem, dvm_values, mad_values)`` for all magnets."""
+        magnets = list(self.iter_elements(elements.BaseMagnet))
+        # fetch all MAD-X values in a single round trip:
+        mad_values = mad_backend.get_values(
+            [el.mad_backend for el in magnets])
+        return [(el, el.dvm_backend.get(), el.mad2dvm(mvals))
+                for el, mvals in zip(magnets, mad_values)]
+
     def read_these(self, params):
         """
         Import list of DVM parameters to MAD-X.
@@ -207,9 +210,10 @@ class Control(object):
         :param list params: List of tuples (ParamConverterBase, dvm_value)
         """
         segment = self._segment
-        for elem, dvm_value, mad_value in params:
-            elem.mad_backend.set(elem.dvm2mad(dvm_value))
-        segment.twiss()
+        with segment.batch(), segment.session.commands():
+            for elem, dvm_value, mad_value in params:
+                elem.mad_backend.set(elem.dvm2mad(dvm_value))
+            segment.twiss_async()
 
     def write_these(self, params):
         """
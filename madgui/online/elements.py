@@ -128,13 +128,11 @@ class BaseElement(api._Interface):
     # mixin:
     def _construct(self, conv):
         elem = self.elements[0]
-        madx = self._segment.madx
-        utool = self._segment.session.utool
         lval = {
             key: mad_backend._get_property_lval(elem, key)
             for key in conv.backend_keys
         }
-        back = mad_backend.MagnetBackend(madx, utool, elem, lval)
+        back = mad_backend.MagnetBackend(self._segment, elem, lval)
         return conv, back
 
 
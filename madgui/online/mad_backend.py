@@ -49,39 +49,80 @@ def _value(v):
     except AttributeError:
         return v
 
-def _evaluate(madx, v):
-    if isinstance(v, list):
-        return [madx.evaluate(x) for x in v]
-    return madx.evaluate(v)
+def get_values(backends):
+    """
+    Get the values of multiple :class:`MagnetBackend` with a single MAD-X
+    round trip.
+
+    :returns: list of value dicts (same order as ``backends``)
+    """
+    backends = list(backends)
+    if not backends:
+        return []
+    exprs = [lval
+             for backend in backends
+             for _, lvals in backend._lval_items()
+             for lval in lvals]
+    values = iter(backends[0]._segment.session.evaluate_many(exprs))
+    results = []
+    for backend in backends:
+        plain = {}
+        for key, lvals in backend._lval_items():
+            vals = [next(values) for _ in lvals]
+            plain[key] = vals if isinstance(backend._lval[key], list) \
+                else vals[0]
+        results.append({key: backend._utool.add_unit(key, val)
+                        for key, val in plain.items()})
+    return results
 
 
 class MagnetBackend(api.ElementBackend):
 
     """Mitigates r/w access to the properties of an element."""
 
-    def __init__(self, madx, utool, elem, lval):
-        self._madx = madx
+    def __init__(self, segment, elem, lval):
+        self._segment = segment
         self._lval = lval
         self._elem = elem
-        self._utool = utool
+
+    @property
+    def _madx(self):
+        return self._segment.madx
+
+    @property
+    def _utool(self):
+        return self._segment.utool
 
     def get(self):
         """Get dict of values from MAD-X."""
-        return {key: self._utool.add_unit(key, _evaluate(self._madx, lval))
-                for key, lval in self._lval.items()}
+        return get_values([self])[0]
 
     def set(self, values):
         """Store values to MAD-X."""
-        madx = self._madx
-        for key, val in values.items():
-            plain_value = self._utool.strip_unit(key, val)
-            lval = self._lval[key]
-            if isinstance(val, list):
-                for k, v in zip(lval, plain_value):
-                    if k:
-                        madx.set_value(k, v)
+        session = self._segment.session
+        changed = []
+        with session.commands():
+            for key, val in values.items():
+                plain_value = self._utool.strip_unit(key, val)
+                lval = self._lval[key]
+                if isinstance(val, list):
+                    for k, v in zip(lval, plain_value):
+                        if k:
+                            session.set_value(k, v)
+                            changed.append(k)
+                else:
+                    session.set_value(lval, plain_value)
+                    changed.append(lval)
+        # let the segment know which parts of the optics need updating:
+        self._segment.invalidate(*changed)
+
+    def _lval_items(self):
+        """Iterate over ``(key, [lvalue, ...])`` pairs."""
+        for key, lval in self._lval.items():
+            if isinstance(lval, list):
+                yield key, lval
             else:
-                madx.set_value(lval, plain_value)
+                yield key, [lval]
 
 
 class MonitorBackend(api.ElementBackend):
@@ -93,6 +134,7 @@ class MonitorBackend(api.ElementBackend):
     def __init__(self, segment, element):
         self._segment = segment
         self._element = element
+        segment.require_columns(self, ['betx', 'bety', 'posx', 'posy'])
 
     def get(self, values):
         twiss = self._segment.tw
@@ -15,6 +15,7 @@ from madgui.widget.listview import ListCtrl, ColumnInfo
 from madgui.widget import wizard
 
 from .dialogs import format_dvm_value
+from .mad_backend import get_values
 
 # TODO: use UI units
 
@@ -106,7 +107,8 @@ class OpticVariationMethod(object):
         steerer_elems = [self.control.get_element(v) for v in steerer_names]
 
         # backup  MAD-X values
-        steerer_values = [el.mad_backend.get() for el in steerer_elems]
+        steerer_backends = [el.mad_backend for el in steerer_elems]
+        steerer_values = get_values(steerer_backends)
 
         match_names = [list(el.mad_backend._lval.values())[0] for el in steerer_elems]
 
@@ -114,7 +116,6 @@ class OpticVariationMethod(object):
         init_twiss = {}
         init_twiss.update(self.segment.twiss_args)
         init_twiss.update(init_pos)
-        self.segment._twiss_args = init_twiss
 
         # match final conditions
         constraints = []
@@ -128,23 +129,27 @@ class OpticVariationMethod(object):
                 {'range': self.mon, 'y': ypos},
                 {'range': self.mon, 'py': 0},
             ])
-        # TODO: also set betx, bety unchanged?
-        self.segment.madx.match(
-            sequence=self.segment.sequence.name,
-            vary=match_names,
-            constraints=constraints,
-            twiss_init=self.utool.dict_strip_unit(init_twiss))
-        self.segment.hook.update()
-
-        # save kicker corrections
-        steerer_corrections = [
-            (el, el.mad_backend.get())
-            for el in steerer_elems
-        ]
 
-        # restore MAD-X values
-        for el, val in zip(steerer_elems, steerer_values):
-            el.mad_backend.set(val)
+        # recompute the TWISS only once after restoring the MAD-X values:
+        with self.segment.batch():
+            self.segment.twiss_args = init_twiss
+
+            # TODO: also set betx, bety unchanged?
+            with self.segment.session.lock:
+                self.segment.madx.match(
+                    sequence=self.segment.sequence.name,
+                    vary=match_names,
+                    constraints=constraints,
+                    twiss_init=self.utool.dict_strip_unit(init_twiss))
+
+            # save kicker corrections
+            steerer_corrections = list(zip(
+                steerer_elems, get_values(steerer_backends)))
+
+            # restore MAD-X values
+            with self.segment.session.commands():
+                for el, val in zip(steerer_elems, steerer_values):
+                    el.mad_backend.set(val)
 
         return steerer_corrections
 
@@ -213,11 +218,13 @@ class OpticVariationWizard(wizard.Wizard):
             self.summary.Update()
 
     def OnFinishButton(self, event):
-        for el, vals in self.summary.steerer_corrections:
-            el.mad_backend.set(vals)
-            el.dvm_backend.set(el.mad2dvm(vals))
-        self.ovm.control._plugin.execute()
-        self.ovm.segment.twiss()
+        segment = self.ovm.segment
+        with segment.batch(), segment.session.commands():
+            for el, vals in self.summary.steerer_corrections:
+                el.mad_backend.set(vals)
+                el.dvm_backend.set(el.mad2dvm(vals))
+            self.ovm.control._plugin.execute()
+            self.ovm.segment.twiss_async()
         self.EndModal(wx.ID_OK)
 
 
@@ -0,0 +1,135 @@
+# encoding: utf-8
+"""
+Offscreen rendering of TWISS plots into image files.
+
+The plots are composed by the same components as in the GUI (see
+:mod:`madgui.component.lineview`), but drawn by matplotlib's Agg backend.
+This module does not depend on wxPython.
+
+Usage::
+
+    renderer = get_renderer(size=(8, 6), dpi=100)
+    renderer.render(segment, 'env', conf['line_view'], 'env.png')
+
+The output format (``.png``, ``.svg``, ``.pdf``, ...) is determined by the
+file extension.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import os
+
+# 3rd party
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# internal
+from madgui.component.lineview import FigurePair, TwissView
+
+# exported symbols
+__all__ = [
+    'Renderer',
+    'get_renderer',
+]
+
+
+# Renderers of this process by (size, dpi):
+_renderers = {}
+
+
+class Renderer(object):
+
+    """
+    Draws :class:`TwissView` plots into files.
+
+    The figure is created only once and serves as template for all views
+    rendered by this object: every view clears and replots its axes, and
+    consecutive snapshots of the same view only update the curve data. The
+    figure is drawn only when saving.
+
+    :ivar FigurePair figure: the reused figure
+    """
+
+    def __init__(self, size=(8, 6), dpi=100):
+        self.figure = figure = FigurePair()
+        # there is no screen to update, every file is a full draw anyway:
+        figure.blit = False
+        figure.dispatch = lambda func, *args: None
+        figure.figure.set_size_inches(size)
+        figure.figure.set_dpi(dpi)
+        FigureCanvasAgg(figure.figure)
+
+    def render(self, segment, basename, line_view_config, filename,
+               snapshots=None):
+        """
+        Plot a view of the segment and save it to a file.
+
+        :param segment: a :class:`~madgui.component.session.Segment`
+        :param str basename: view name, e.g. ``env`` or ``pos``
+        :param dict line_view_config: the ``line_view`` config section
+        :param str filename: output file, may contain an ``{index}``
+                             placeholder if snapshots are given
+        :param list snapshots: knob dicts in MAD-X units, one file per item
+        :returns: list of written files
+
+        The knobs of the session are restored after rendering the snapshots.
+        """
+        view = TwissView(segment, basename, line_view_config,
+                         figure=self.figure)
+        restore = None
+        try:
+            view.plot()
+            if not snapshots:
+                return [self.save(filename)]
+            session = segment.session
+            names = sorted(set(name for knobs in snapshots for name in knobs))
+            restore = (names, dict(session.knobs),
+                       session.evaluate_many(names))
+            written = []
+            for index, knobs in enumerate(snapshots):
+                session.set_values(knobs)
+                segment.invalidate(*knobs)
+                segment.twiss()
+                written.append(self.save(filename.format(index=index)))
+            return written
+        finally:
+            self.figure.cancel_redraw()
+            view.destroy()
+            if restore is not None:
+                _restore_knobs(segment, *restore)
+
+    def save(self, filename):
+        """Save the current figure and return the file name."""
+        folder = os.path.dirname(filename)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.figure.cancel_redraw()
+        self.figure.autoscale()
+        self.figure.figure.savefig(filename)
+        return filename
+
+
+def _restore_knobs(segment, names, knobs, values):
+    """
+    Reset the lvalues ``names`` to the state before the snapshots were
+    rendered (``knobs`` are the previous knobs of the session, ``values``
+    the previous values of the lvalues in MAD-X) and update the TWISS.
+    """
+    session = segment.session
+    session.set_values([(name, knobs.get(name, value))
+                        for name, value in zip(names, values)])
+    session.knobs.clear()
+    session.knobs.update(knobs)
+    segment.invalidate(*names)
+    segment.twiss()
+
+
+def get_renderer(size=(8, 6), dpi=100):
+    """Get the renderer for the given size and resolution of this process."""
+    key = (tuple(size), dpi)
+    try:
+        return _renderers[key]
+    except KeyError:
+        renderer = _renderers[key] = Renderer(size, dpi)
+        return renderer
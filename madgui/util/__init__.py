@@ -1,9 +1,12 @@
 # encoding: utf-8
 """
-Package with various simple non-GUI utilities.
+Package with various non-GUI utilities.
 
-The modules and objects defined in this package have no dependencies on
-other parts of madgui and are neither subscribers nor submitters of any
-events. They should also have little to no dependencies on non-standard
-3rd party modules.
+The modules in this package do not depend on other parts of madgui (except
+for other modules in this package) and can be used without wxPython, e.g.
+by the batch utility. Besides simple helpers, this includes the event/hook
+system (:mod:`madgui.util.plugin`), its instrumentation
+(:mod:`madgui.util.instrument`) and the config loader
+(:mod:`madgui.util.config`). The modules should have little to no
+dependencies on non-standard 3rd party modules.
 """
@@ -0,0 +1,91 @@
+# encoding: utf-8
+"""
+Bounded least-recently-used cache.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+from collections import OrderedDict
+
+# exported symbols
+__all__ = [
+    'LRUCache',
+    'freeze',
+]
+
+
+def freeze(value):
+    """Convert nested dicts/lists into a hashable (and comparable) key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class LRUCache(object):
+
+    """
+    Mapping with limited size that discards the least recently used items.
+
+    :ivar int max_entries: maximum number of items (``None`` = unlimited)
+    :ivar int max_bytes: maximum total size of the items (``None`` =
+                         unlimited) as determined by the ``sizeof`` function
+    :ivar int hits: number of successful lookups
+    :ivar int misses: number of failed lookups
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """Get an item and mark it as recently used."""
+        try:
+            value, size = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items[key] = value, size
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Insert an item, discarding old items if necessary."""
+        self.discard(key)
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._items[key] = value, size
+        self.nbytes += size
+        while self._items and (
+                (self.max_entries is not None and
+                 len(self._items) > self.max_entries) or
+                (self.max_bytes is not None and
+                 self.nbytes > self.max_bytes)):
+            _, (_, size) = self._items.popitem(last=False)
+            self.nbytes -= size
+
+    def discard(self, key):
+        """Remove an item if present."""
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.nbytes -= item[1]
+
+    def clear(self):
+        """Remove all items (the statistics are kept)."""
+        self._items.clear()
+        self.nbytes = 0
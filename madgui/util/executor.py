@@ -0,0 +1,190 @@
+# encoding: utf-8
+"""
+Background execution of tasks in a single worker thread.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import logging
+import threading
+
+try:                    # python2
+    import Queue as queue
+except ImportError:     # python3
+    import queue
+
+# exported symbols
+__all__ = [
+    'Future',
+    'Executor',
+    'Synchronized',
+]
+
+
+class Future(object):
+
+    """Result of a task that is executed asynchronously."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the task and return its result (or raise its error)."""
+        if not self._event.wait(timeout):
+            raise RuntimeError("Timeout while waiting for the result.")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the task and return the exception it raised, if any."""
+        if not self._event.wait(timeout):
+            raise RuntimeError("Timeout while waiting for the result.")
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """Call ``callback(future)`` when the task has finished."""
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class _Task(object):
+
+    def __init__(self, func, args, key):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.future = Future()
+
+
+class Executor(object):
+
+    """
+    Executes tasks in a dedicated thread in the order of submission.
+
+    Tasks that are submitted with a ``key`` replace pending tasks with the
+    same key, i.e. redundant requests are coalesced and only the latest one
+    is executed. All futures of coalesced tasks receive its result.
+
+    :ivar dispatch: function that is used to invoke result callbacks, e.g.
+                    ``wx.CallAfter`` to invoke them in the GUI thread
+    :ivar lock: lock that is held while executing a task
+    """
+
+    def __init__(self, lock=None, dispatch=None):
+        self.lock = lock or threading.RLock()
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, func, args=(), key=None, callback=None, errback=None):
+        """
+        Schedule ``func(*args)`` for execution.
+
+        :param key: tasks with equal (not ``None``) key are coalesced
+        :param callback: called as ``callback(result)`` via :attr:`dispatch`
+                         when the task completes successfully
+        :param errback: called as ``errback(exception)`` via :attr:`dispatch`
+                        when the task fails
+        :rtype: Future
+        """
+        with self._pending_lock:
+            task = self._pending.get(key) if key is not None else None
+            if task is None:
+                task = _Task(func, args, key)
+                if key is not None:
+                    self._pending[key] = task
+                self._queue.put(task)
+            else:
+                task.func, task.args = func, args
+        future = task.future
+        if callback is not None or errback is not None:
+            future.add_done_callback(
+                lambda f: self._dispatch_result(f, callback, errback))
+        return future
+
+    def _dispatch_result(self, future, callback, errback):
+        exception = future.exception()
+        if exception is None:
+            if callback is not None:
+                self.dispatch(callback, future.result())
+        elif errback is not None:
+            self.dispatch(errback, exception)
+
+    def shutdown(self, wait=True):
+        """Stop the worker thread after finishing all pending tasks."""
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            with self._pending_lock:
+                if task.key is not None:
+                    self._pending.pop(task.key, None)
+                func, args = task.func, task.args
+            try:
+                with self.lock:
+                    result = func(*args)
+            except Exception as exc:
+                logging.getLogger(__name__).exception(
+                    "Error in background task.")
+                task.future.set_exception(exc)
+            else:
+                task.future.set_result(result)
+
+
+class Synchronized(object):
+
+    """
+    Proxy that serializes all method calls on the wrapped object using a
+    (reentrant) lock.
+    """
+
+    def __init__(self, obj, lock):
+        self._obj = obj
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+        lock = self._lock
+        def synchronized(*args, **kwargs):
+            with lock:
+                return attr(*args, **kwargs)
+        return synchronized
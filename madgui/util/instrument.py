@@ -0,0 +1,282 @@
+# encoding: utf-8
+"""
+Optional instrumentation of method calls (e.g. to MAD-X).
+
+Calls are counted per method and their latencies collected in histograms.
+Each call is attributed to the GUI action (menu item, tool click, hook)
+that is currently active in the calling thread, see :func:`action`. The
+event handlers and hooks are only marked as actions while the
+instrumentation is enabled, see :func:`set_enabled`.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+from bisect import bisect_right
+from contextlib import contextmanager
+import inspect
+import threading
+from timeit import default_timer
+
+# exported symbols
+__all__ = [
+    'set_enabled',
+    'is_enabled',
+    'action',
+    'current_action',
+    'traced',
+    'bind_action',
+    'Histogram',
+    'Statistics',
+    'Instrumented',
+    'CountingStream',
+]
+
+
+_local = threading.local()
+
+# whether GUI actions are traced, see set_enabled:
+_enabled = False
+
+
+def set_enabled(enabled=True):
+    """
+    Enable or disable the tracing of GUI actions. Event handlers wrapped by
+    :func:`traced` before enabling are not traced.
+    """
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    """Check whether GUI actions are traced."""
+    return _enabled
+
+
+def _action_stack():
+    try:
+        return _local.actions
+    except AttributeError:
+        stack = _local.actions = []
+        return stack
+
+
+@contextmanager
+def action(name):
+    """Context manager that marks the code as part of the named action."""
+    stack = _action_stack()
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def current_action():
+    """Return the outermost active action of this thread (or ``None``)."""
+    stack = _action_stack()
+    return stack[0] if stack else None
+
+
+def traced(func, name):
+    """
+    Wrap an event handler such that it runs within :func:`action`. Returns
+    the handler unchanged if the instrumentation is disabled.
+    """
+    if not _enabled:
+        return func
+    return _traced(func, name)
+
+
+def _traced(func, name):
+    def handler(*args, **kwargs):
+        with action(name):
+            return func(*args, **kwargs)
+    return handler
+
+
+def bind_action(func):
+    """
+    Bind ``func`` to the current action, so that calls from other threads
+    (e.g. background tasks) are attributed to it.
+    """
+    name = current_action()
+    if name is None:
+        return func
+    return _traced(func, name)
+
+
+class Histogram(object):
+
+    """Histogram with logarithmically spaced bins (decades / 4)."""
+
+    # bin edges in seconds: 10us ... 10s
+    edges = [10**(e / 4.0) for e in range(-20, 5)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_right(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bin edge below which a fraction ``q`` of values fall."""
+        limit = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= limit and count:
+                return self.edges[index] if index < len(self.edges) \
+                    else self.max
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'edges': list(self.edges),
+            'counts': list(self.counts),
+        }
+
+
+class Statistics(object):
+
+    """
+    Thread-safe collection of call statistics.
+
+    Statistics are kept by ``(method, action)``, where ``method`` is the
+    qualified method name (e.g. ``libmadx.get_table_column``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, method, seconds, nbytes=0, action=None):
+        """Record a single call."""
+        key = (method, action)
+        with self._lock:
+            try:
+                entry = self._entries[key]
+            except KeyError:
+                entry = self._entries[key] = [Histogram(), 0]
+            entry[0].add(seconds)
+            entry[1] += nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def as_dict(self):
+        """
+        Return the statistics as nested dict ``{method: {action: stats}}``
+        where ``stats`` contains the latency histogram and ``bytes``.
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        result = {}
+        for (method, action), (hist, nbytes) in entries:
+            stats = hist.as_dict()
+            stats['bytes'] = nbytes
+            result.setdefault(method, {})[action] = stats
+        return result
+
+    def format_summary(self):
+        """Return a human readable table (sorted by total time)."""
+        rows = []
+        for method, by_action in self.as_dict().items():
+            for action, stats in by_action.items():
+                rows.append((stats['total'], method, action or '-', stats))
+        rows.sort(reverse=True)
+        lines = ["{:<36} {:<28} {:>7} {:>9} {:>9} {:>9} {:>10}".format(
+            'method', 'action', 'calls', 'total[s]', 'p50[ms]', 'p95[ms]',
+            'bytes')]
+        for total, method, action, stats in rows:
+            lines.append(
+                "{:<36} {:<28} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>10}"
+                .format(method[:36], action[:28], stats['count'], total,
+                        stats['p50'] * 1e3, stats['p95'] * 1e3,
+                        stats['bytes']))
+        return '\n'.join(lines)
+
+
+class Instrumented(object):
+
+    """
+    Proxy that records all method calls on the wrapped object. Other
+    attributes (including callable objects) are passed through unchanged.
+
+    :param obj: wrapped object
+    :param Statistics stats: receives the records
+    :param str prefix: prefix for the method names
+    :param nbytes: optional function returning the total number of bytes
+                   transferred so far (used to compute the bytes per call)
+    """
+
+    def __init__(self, obj, stats, prefix, nbytes=None):
+        self._obj = obj
+        self._stats = stats
+        self._prefix = prefix
+        self._nbytes = nbytes
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not inspect.isroutine(attr):
+            return attr
+        method = self._prefix + '.' + name
+        stats = self._stats
+        nbytes = self._nbytes
+        def instrumented(*args, **kwargs):
+            bytes_before = nbytes() if nbytes else 0
+            start = default_timer()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                stats.record(
+                    method, default_timer() - start,
+                    nbytes() - bytes_before if nbytes else 0,
+                    current_action())
+        return instrumented
+
+
+class CountingStream(object):
+
+    """File proxy that counts the number of bytes read and written."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.nbytes = 0
+
+    def read(self, *args):
+        data = self._stream.read(*args)
+        self.nbytes += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._stream.readline(*args)
+        self.nbytes += len(data)
+        return data
+
+    def readinto(self, buf):
+        count = self._stream.readinto(buf)
+        self.nbytes += count or 0
+        return count
+
+    def write(self, data):
+        result = self._stream.write(data)
+        self.nbytes += len(data)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
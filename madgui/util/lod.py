@@ -0,0 +1,49 @@
+# encoding: utf-8
+"""
+Level of detail reduction for plotting curves with many points.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+import numpy as np
+
+# exported symbols
+__all__ = [
+    'decimate',
+]
+
+
+def decimate(x, y, xmin, xmax, num_bins):
+    """
+    Reduce a curve to what is visible when drawing the range ``[xmin, xmax]``
+    with a resolution of ``num_bins`` pixels.
+
+    The points in the range (and one neighbour on each side) are returned
+    unchanged if there are not more than two per pixel. Otherwise, each pixel
+    is represented by its minimum and maximum value (in the order of the
+    local trend), i.e. the drawn envelope is the same as for the full curve.
+
+    :param x: sorted abscissa
+    :param y: ordinate
+    :returns: ``(x, y, exact)`` where ``exact`` tells whether the points
+              are the original data
+    """
+    start = max(np.searchsorted(x, xmin, 'left') - 1, 0)
+    stop = min(np.searchsorted(x, xmax, 'right') + 1, len(x))
+    x = x[start:stop]
+    y = y[start:stop]
+    if len(x) <= 2 * num_bins or not xmax > xmin:
+        return x, y, True
+    # the neighbours outside the range get bins of their own:
+    bins = np.clip(np.floor((x - xmin) / (xmax - xmin) * num_bins),
+                   -1, num_bins)
+    starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+    ends = np.concatenate((starts[1:], [len(x)])) - 1
+    lo = np.minimum.reduceat(y, starts)
+    hi = np.maximum.reduceat(y, starts)
+    rising = y[starts] <= y[ends]
+    xs = np.column_stack((x[starts], x[ends])).ravel()
+    ys = np.column_stack((np.where(rising, lo, hi),
+                          np.where(rising, hi, lo))).ravel()
+    return xs, ys, False
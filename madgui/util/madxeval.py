@@ -0,0 +1,27 @@
+# encoding: utf-8
+"""
+Bulk evaluation of MAD-X expressions.
+
+The functions in this module are meant to be executed *inside* the MAD-X
+process (see :meth:`madgui.component.session.Session.evaluate_many`), so
+that many expressions can be evaluated in a single round trip.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# exported symbols
+__all__ = [
+    'evaluate',
+]
+
+
+def evaluate(expressions):
+    """
+    Evaluate a list of MAD-X expressions.
+
+    :param list expressions: expression strings
+    :returns: list of floats
+    """
+    from cpymad import libmadx
+    return [libmadx.evaluate(expr) for expr in expressions]
@@ -0,0 +1,46 @@
+# encoding: utf-8
+"""
+Partial access to MAD-X tables.
+
+The functions in this module are meant to be executed *inside* the MAD-X
+process (see :meth:`madgui.component.session.Session.get_table_rows`), so
+that only the requested rows have to be transferred over the pipe instead
+of complete columns.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+import numpy as np
+
+# exported symbols
+__all__ = [
+    'get_table_rows',
+]
+
+
+def get_table_rows(table_name, start=0, stop=None, columns=None,
+                   numeric_only=False):
+    """
+    Get a row slice ``[start:stop]`` of a MAD-X table.
+
+    :param str table_name: table name
+    :param int start: first row (negative values count from the end)
+    :param int stop: end of the slice (exclusive), ``None`` for all rows
+    :param list columns: column names, default: all columns of the table
+    :param bool numeric_only: skip non-numeric columns
+    :returns: dict of ``{column: array}`` (lower-case column names)
+    :raises ValueError: if the table or a column does not exist
+    """
+    from cpymad import libmadx
+    if columns is None:
+        columns = libmadx.get_table_column_names(table_name)
+    rows = {}
+    for name in columns:
+        name = name.lower()
+        data = libmadx.get_table_column(table_name, name)
+        if numeric_only and not np.issubdtype(data.dtype, np.number):
+            continue
+        # copy, since the numeric columns refer to MAD-X memory:
+        rows[name] = np.array(data[start:stop])
+    return rows
@@ -0,0 +1,418 @@
+# encoding: utf-8
+"""
+Linear optics computations in plain numpy.
+
+This module provides a fast (but approximate) alternative to computing
+TWISS parameters with MAD-X. All functions work on plain floats/arrays in
+MAD-X units and operate on whole beam lines at once.
+
+The transfer maps are represented as 7x7 matrices acting on the phase space
+vector ``(x, px, y, py, t, pt, 1)``, i.e. the 7th column accounts for KICKs
+(this is the same representation as used for the SECTORMAPs).
+
+Supported elements (see :data:`SUPPORTED_TYPES`):
+
+- drift-like elements (:data:`DRIFT_TYPES`, e.g. MARKER, MONITOR)
+- QUADRUPOLE, SBEND (including edge focusing via E1, E2)
+- HKICKER, VKICKER, KICKER
+- SOLENOID, but only with KS = 0
+- MULTIPOLE, but only with KNL[0] = KSL[0] = 0 (thin quadrupoles)
+
+The conditions on the parameters are listed in :data:`UNSUPPORTED_PARAMS`.
+Any other element (e.g. RBEND, RFCAVITY, a solenoid with field) is reported
+by :func:`unsupported_types` and rejected by :func:`element_maps`. In this
+case, :class:`~madgui.component.session.Segment` falls back to a full MAD-X
+TWISS for ``engine='fast'``, logs a warning and reports the types in
+``Segment.unsupported_types``.
+
+Known limitations:
+
+- the longitudinal plane is only treated to the extent required for the
+  dispersion (i.e. energy deviations are treated as constant)
+- coupling is not taken into account when propagating the TWISS
+  parameters, therefore solenoids with non-zero field are rejected
+- thin multipoles with dipole components (KNL[0], KSL[0]) are rejected,
+  since their effect on orbit and dispersion is not modelled like MAD-X
+- fringe fields, tilts and nonlinear terms are ignored
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+import numpy as np
+
+# exported symbols
+__all__ = [
+    'PARAMETERS',
+    'DRIFT_TYPES',
+    'SUPPORTED_TYPES',
+    'UNSUPPORTED_PARAMS',
+    'get_element_params',
+    'unsupported_types',
+    'describe_unsupported',
+    'element_maps',
+    'cumulative_product',
+    'differential_maps',
+    'propagate',
+    'propagate_batch',
+]
+
+
+# Element parameters that are used by the optics engine:
+PARAMETERS = [
+    'at', 'l', 'angle', 'k1', 'e1', 'e2', 'ks',
+    'kick', 'hkick', 'vkick',
+    'knl0', 'knl1', 'ksl0', 'ksl1',
+]
+
+# Element types that act like drift spaces in linear optics:
+DRIFT_TYPES = (
+    'drift', 'marker', 'placeholder',
+    'monitor', 'hmonitor', 'vmonitor', 'instrument',
+    'collimator', 'ecollimator', 'rcollimator',
+)
+
+# Element types that can be handled by :func:`element_maps`:
+SUPPORTED_TYPES = DRIFT_TYPES + (
+    'quadrupole', 'sbend', 'solenoid', 'multipole',
+    'hkicker', 'vkicker', 'kicker',
+)
+
+# Parameters for which supported element types are still rejected:
+UNSUPPORTED_PARAMS = {
+    'solenoid': 'KS != 0',
+    'multipole': 'KNL[0] != 0 or KSL[0] != 0',
+}
+
+
+def get_element_params(elem):
+    """
+    Extract the parameters used by the optics engine from an element dict.
+
+    :param dict elem: element attributes as plain floats (MAD-X units)
+    :returns: dict with all keys in :data:`PARAMETERS`
+    """
+    params = {key: float(elem.get(key, 0)) for key in PARAMETERS
+              if key[:3] not in ('knl', 'ksl')}
+    for key in ('knl', 'ksl'):
+        coefs = list(elem.get(key, [])) + [0, 0]
+        params[key + '0'] = float(coefs[0])
+        params[key + '1'] = float(coefs[1])
+    return params
+
+
+def unsupported_types(types, params=None):
+    """
+    Return the sorted list of element types that can not be modelled, i.e.
+    types not in :data:`SUPPORTED_TYPES` and, if the element parameters are
+    given, the types of supported elements with unsupported parameters
+    (solenoids with field, multipoles with dipole components).
+
+    :param types: element types (lower case)
+    :param dict params: arrays for the keys in :data:`PARAMETERS`
+    """
+    unknown = set(types) - set(SUPPORTED_TYPES)
+    if params is not None:
+        types = np.asarray(types)
+        p = {key: np.asarray(val, dtype=float) for key, val in params.items()}
+        if np.any((types == 'solenoid') & (p['ks'] != 0)):
+            unknown.add('solenoid')
+        if np.any((types == 'multipole') &
+                  ((p['knl0'] != 0) | (p['ksl0'] != 0))):
+            unknown.add('multipole')
+    return sorted(unknown)
+
+
+def describe_unsupported(unknown):
+    """
+    Return a readable description of the result of
+    :func:`unsupported_types`, e.g. ``"rbend, solenoid (KS != 0)"``.
+    """
+    return ', '.join(
+        '{} ({})'.format(t, UNSUPPORTED_PARAMS[t])
+        if t in UNSUPPORTED_PARAMS else t
+        for t in unknown)
+
+
+def _focusing(K, L):
+    """
+    Return the principal trajectories (C, S, D) for ``x'' + K x = 0`` where
+    D is the dispersion function ``(1 - C) / K``.
+    """
+    K = np.asarray(K, dtype=float)
+    L = np.asarray(L, dtype=float)
+    sqk = np.sqrt(np.abs(K))
+    phi = sqk * L
+    small = np.abs(K) * L**2 < 1e-8
+    # avoid divisions by zero (the results are discarded anyway):
+    safe_sqk = np.where(small, 1, sqk)
+    safe_K = np.where(small, 1, K)
+    C = np.where(K > 0, np.cos(phi), np.cosh(phi))
+    S = np.where(K > 0, np.sin(phi), np.sinh(phi)) / safe_sqk
+    D = (1 - C) / safe_K
+    # use taylor expansion for weak focusing:
+    C = np.where(small, 1 - K*L**2/2, C)
+    S = np.where(small, L - K*L**3/6, S)
+    D = np.where(small, L**2/2 - K*L**4/24, D)
+    return C, S, D
+
+
+def _identity(count):
+    """Return a stack of ``count`` 7x7 identity matrices."""
+    maps = np.zeros((count, 7, 7))
+    maps[:,range(7),range(7)] = 1
+    return maps
+
+
+def _complete_longitudinal(maps):
+    """Fill in the R51, R52 terms required for symplecticity."""
+    R = maps
+    R[:,4,0] = R[:,1,0]*R[:,0,5] - R[:,0,0]*R[:,1,5]
+    R[:,4,1] = R[:,1,1]*R[:,0,5] - R[:,0,1]*R[:,1,5]
+    return maps
+
+
+def _thick(L, Kx, Ky, h=0):
+    """Transfer maps for thick magnets with uncoupled linear focusing."""
+    Cx, Sx, Dx = _focusing(Kx, L)
+    Cy, Sy, Dy = _focusing(Ky, L)
+    maps = _identity(len(L))
+    maps[:,0,0] = Cx
+    maps[:,0,1] = Sx
+    maps[:,1,0] = -Kx * Sx
+    maps[:,1,1] = Cx
+    maps[:,0,5] = h * Dx
+    maps[:,1,5] = h * Sx
+    maps[:,2,2] = Cy
+    maps[:,2,3] = Sy
+    maps[:,3,2] = -Ky * Sy
+    maps[:,3,3] = Cy
+    return _complete_longitudinal(maps)
+
+
+def _edge(h, e):
+    """Transfer maps for the pole face rotation of a dipole."""
+    maps = _identity(len(h))
+    maps[:,1,0] = h * np.tan(e)
+    maps[:,3,2] = -h * np.tan(e)
+    return maps
+
+
+def _dot(a, b):
+    """Multiply two stacks of matrices."""
+    return np.einsum('nij,njk->nik', a, b)
+
+
+def drift(l):
+    """Transfer maps for drift spaces."""
+    l = np.asarray(l, dtype=float)
+    return _thick(l, 0*l, 0*l)
+
+
+def quadrupole(l, k1):
+    """Transfer maps for thick quadrupoles."""
+    k1 = np.asarray(k1, dtype=float)
+    return _thick(np.asarray(l, dtype=float), k1, -k1)
+
+
+def sbend(l, angle, k1=0, e1=0, e2=0):
+    """Transfer maps for sector bends (including pole face rotations)."""
+    l = np.asarray(l, dtype=float)
+    angle = np.asarray(angle, dtype=float)
+    k1 = np.asarray(k1, dtype=float) + 0*l
+    h = angle / np.where(l == 0, 1, l)
+    body = _thick(l, h**2 + k1, -k1, h)
+    return _dot(_edge(h, e2 + 0*l), _dot(body, _edge(h, e1 + 0*l)))
+
+
+def solenoid(l, ks):
+    """Transfer maps for solenoids."""
+    l = np.asarray(l, dtype=float)
+    K = np.asarray(ks, dtype=float) / 2
+    C = np.cos(K*l)
+    S = np.sin(K*l)
+    # S/K for vanishing field:
+    SK = np.where(K == 0, l, S / np.where(K == 0, 1, K))
+    maps = _identity(len(l))
+    maps[:,0,:4] = np.array([C*C, SK*C, S*C, SK*S]).T
+    maps[:,1,:4] = np.array([-K*S*C, C*C, -K*S*S, S*C]).T
+    maps[:,2,:4] = np.array([-S*C, -SK*S, C*C, SK*C]).T
+    maps[:,3,:4] = np.array([K*S*S, -S*C, -K*S*C, C*C]).T
+    return maps
+
+
+def multipole(knl0, knl1, ksl0=0, ksl1=0):
+    """
+    Transfer maps for thin multipoles (only up to quadrupole order).
+
+    The dipole components act as orbit kicks, the skew quadrupole
+    component is ignored.
+
+    NOTE: The normal dipole component ``knl0`` is treated as both an orbit
+    kick and a source of dispersion (like a thin bending magnet with angle
+    ``knl0``). This approximation is not verified against MAD-X, therefore
+    :func:`element_maps` rejects multipoles with dipole components.
+    """
+    knl0 = np.asarray(knl0, dtype=float)
+    knl1 = np.asarray(knl1, dtype=float)
+    maps = _identity(len(knl0))
+    maps[:,1,0] = -knl1
+    maps[:,3,2] = knl1
+    # approximation: knl0 as dispersion source (R26) and orbit kick (K2):
+    maps[:,1,5] = knl0
+    maps[:,1,6] = -knl0
+    maps[:,3,6] = ksl0
+    return _complete_longitudinal(maps)
+
+
+def kicker(l, hkick, vkick):
+    """Transfer maps for (possibly thick) orbit correctors."""
+    l = np.asarray(l, dtype=float)
+    kick = _identity(len(l))
+    kick[:,1,6] = hkick
+    kick[:,3,6] = vkick
+    half = drift(l/2)
+    return _dot(half, _dot(kick, half))
+
+
+def element_maps(types, params):
+    """
+    Compute the transfer maps for a list of elements.
+
+    Gaps between subsequent elements are treated as drift spaces and
+    included in the map of the following element.
+
+    :param types: element types (lower case)
+    :param dict params: arrays for all keys in :data:`PARAMETERS`
+    :returns: array of shape (N, 7, 7)
+    :raises ValueError: if there are elements that can not be modelled, see
+                        :func:`unsupported_types`
+    """
+    unknown = unsupported_types(types, params)
+    if unknown:
+        raise ValueError("Unsupported element types: {}"
+                         .format(', '.join(unknown)))
+    types = np.asarray(types)
+    p = {key: np.asarray(val, dtype=float) for key, val in params.items()}
+    count = len(types)
+    # default to drift spaces (see DRIFT_TYPES):
+    maps = drift(p['l'])
+    def assign(mask, builder, *names):
+        if np.any(mask):
+            maps[mask] = builder(*[p[n][mask] for n in names])
+    assign(types == 'quadrupole', quadrupole, 'l', 'k1')
+    assign(types == 'sbend', sbend, 'l', 'angle', 'k1', 'e1', 'e2')
+    assign(types == 'solenoid', solenoid, 'l', 'ks')
+    assign(types == 'multipole', multipole, 'knl0', 'knl1', 'ksl0', 'ksl1')
+    # HKICKER/VKICKER define the kick via the KICK attribute:
+    hkick = np.where(types == 'hkicker', p['kick'], p['hkick'])
+    vkick = np.where(types == 'vkicker', p['kick'], p['vkick'])
+    kickers = ((types == 'hkicker') | (types == 'vkicker') |
+               (types == 'kicker'))
+    if np.any(kickers):
+        maps[kickers] = kicker(p['l'][kickers],
+                               hkick[kickers],
+                               vkick[kickers])
+    # prepend drift spaces for the gaps between elements:
+    if count > 1:
+        gaps = p['at'][1:] - (p['at'][:-1] + p['l'][:-1])
+        has_gap = np.zeros(count, dtype=bool)
+        has_gap[1:] = gaps > 1e-12
+        if np.any(has_gap):
+            gaps = np.hstack((0, gaps))
+            maps[has_gap] = _dot(maps[has_gap], drift(gaps[has_gap]))
+    return maps
+
+
+def cumulative_product(maps):
+    """
+    Compute the cumulative products ``M[i] ... M[1] M[0]`` of a stack of
+    matrices.
+
+    This uses a parallel prefix scan, i.e. only log2(N) vectorized matrix
+    multiplications.
+    """
+    result = np.array(maps, dtype=float)
+    shift = 1
+    while shift < len(result):
+        result[shift:] = _dot(result[shift:], result[:-shift])
+        shift *= 2
+    return result
+
+
+def differential_maps(cumulative):
+    """
+    Compute the individual element maps from the cumulative maps, i.e. the
+    inverse of :func:`cumulative_product`.
+    """
+    cumulative = np.asarray(cumulative, dtype=float)
+    previous = np.empty_like(cumulative)
+    previous[0] = np.eye(7)
+    previous[1:] = cumulative[:-1]
+    return _dot(cumulative, np.linalg.inv(previous))
+
+
+def _propagate_plane(R, cum, beta0, alpha0, mu0, i):
+    """
+    Propagate TWISS parameters for one plane (i=0 for x, i=2 for y).
+
+    The initial values are column vectors of shape (N, 1), the results have
+    shape (N, len(R)).
+    """
+    gamma0 = (1 + alpha0**2) / beta0
+    m11, m12 = cum[:,i,i], cum[:,i,i+1]
+    m21, m22 = cum[:,i+1,i], cum[:,i+1,i+1]
+    beta = m11**2*beta0 - 2*m11*m12*alpha0 + m12**2*gamma0
+    alpha = (-m11*m21*beta0 + (m11*m22 + m12*m21)*alpha0 - m12*m22*gamma0)
+    # Compute the phase advance from the individual element maps, since the
+    # cumulative maps would only give the phase modulo 2 pi:
+    beta_prev = np.hstack((beta0, beta[:,:-1]))
+    alpha_prev = np.hstack((alpha0, alpha[:,:-1]))
+    r11, r12 = R[:,i,i], R[:,i,i+1]
+    dmu = np.arctan2(r12, r11*beta_prev - r12*alpha_prev) / (2*np.pi)
+    mu = mu0 + np.cumsum(dmu, axis=1)
+    return beta, alpha, mu
+
+
+def propagate(maps, twiss_init, cumulative=None):
+    """
+    Propagate TWISS parameters, orbit and dispersion through the elements.
+
+    :param maps: element transfer maps, array of shape (N, 7, 7)
+    :param dict twiss_init: initial conditions (MAD-X names and units)
+    :param cumulative: cumulative maps (computed from ``maps`` if missing)
+    :returns: dict of arrays with the values at the exit of each element
+    """
+    results = propagate_batch(maps, [twiss_init], cumulative)
+    return {key: val[0] for key, val in results.items()}
+
+
+def propagate_batch(maps, twiss_inits, cumulative=None):
+    """
+    Propagate many sets of initial conditions at once.
+
+    :param maps: element transfer maps, array of shape (N, 7, 7)
+    :param list twiss_inits: list of M dicts with initial conditions
+    :param cumulative: cumulative maps (computed from ``maps`` if missing)
+    :returns: dict of arrays with shape (M, N)
+    """
+    init = lambda name: np.array([[float(twiss_init.get(name, 0))]
+                                  for twiss_init in twiss_inits])
+    zero = np.zeros((len(twiss_inits), 1))
+    cum = cumulative_product(maps) if cumulative is None else cumulative
+    tw = {}
+    tw['betx'], tw['alfx'], tw['mux'] = _propagate_plane(
+        maps, cum, init('betx'), init('alfx'), init('mux'), 0)
+    tw['bety'], tw['alfy'], tw['muy'] = _propagate_plane(
+        maps, cum, init('bety'), init('alfy'), init('muy'), 2)
+    orbit0 = np.hstack([init('x'), init('px'), init('y'), init('py'),
+                        init('t'), init('pt'), zero + 1])
+    orbit = np.einsum('nij,mj->mni', cum, orbit0)
+    tw['x'], tw['px'], tw['y'], tw['py'] = np.rollaxis(orbit[:,:,:4], 2)
+    # the dispersion is the derivative w.r.t. the energy deviation, i.e.
+    # it is transported by the 6th column without the kicks:
+    disp0 = np.hstack([init('dx'), init('dpx'), init('dy'), init('dpy'),
+                       zero, zero + 1, zero])
+    disp = np.einsum('nij,mj->mni', cum, disp0)
+    tw['dx'], tw['dpx'], tw['dy'], tw['dpy'] = np.rollaxis(disp[:,:,:4], 2)
+    return tw
@@ -0,0 +1,360 @@
+# encoding: utf-8
+"""
+Core components for a very simple plugin system.
+
+Short class overview:
+
+- :func:`Hook` should be used for all named events (plugins).
+
+- :class:`HookCollection` gives attribute access to a set of hooks.
+
+- :class:`Multicast` is an abstract base class. It only contains mixins and
+  is missing the vital attribute ``slots``
+
+- :class:`List` represents a set of event handlers that are manageable from
+  within your application.
+
+- :class:`EntryPoint` multicasts events to setuptools entry points. The
+  entry points are loaded only once per group, see :class:`EntryPointRegistry`.
+
+- :class:`HookProfiler` records the time spent in the slots of named hooks.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import json
+import os
+import threading
+import weakref
+from timeit import default_timer
+from pkg_resources import iter_entry_points, working_set
+
+# internal
+from madgui.util.instrument import action, is_enabled
+
+# exported symbols
+__all__ = [
+    'Hook',
+    'HookCollection',
+    'Multicast',
+    'List',
+    'EntryPoint',
+    'EntryPointRegistry',
+    'HookProfiler',
+    'registry',
+]
+
+
+# active HookProfiler (if any):
+_profiler = None
+
+
+def Hook(name):
+    """
+    Return a plugin hook with the given name.
+
+    Currently, a plugin hook is basically a globally named signal, i.e. a
+    :class:`List` object with an :class:`EntryPoint` object as its first
+    client. In the future, a folder based detection mechanism may be added.
+
+    This is the conventional function to use in MadGUI for plugins.
+
+    Note, that the list of dynamically connected clients is not and mustn't
+    be a global state! There may be multiple instances being able to add or
+    remove clients independently.
+    """
+    if name:
+        return List([EntryPoint(name)])
+    else:
+        return List()
+
+
+class HookCollection(object):
+
+    """Manages a collection of Hooks."""
+
+    def __init__(self, **hooks):
+        """Initialize empty collection for the given event names."""
+        self._hooks = hooks
+        self._cache = {}
+
+    def __getattr__(self, name):
+        """Access the hook with the specified name."""
+        try:
+            return self._cache[name]
+        except KeyError:
+            hook = self._cache[name] = Hook(self._hooks[name])
+            hook.name = name
+            return hook
+
+
+class Multicast(object):
+
+    """
+    Signal base class.
+
+    Signals are responsible for multiplexing events to several clients.
+    Events can simply be understood as multicast function calls.
+
+    This is an abstract base class. Concretizations need to supply the
+    attribute :ivar:`slots`.
+
+    Calls of named signals (see :class:`HookCollection`) are marked as
+    action for :mod:`madgui.util.instrument` if it is enabled.
+    """
+
+    name = None
+
+    def __call__(*self__args, **kwargs):
+        """Call all slots and return reduced result."""
+        self = self__args[0]
+        args = self__args[1:]
+        # NOTE: `slots` is an immutable snapshot, so it is safe to iterate
+        # even if a slot connects/disconnects handlers:
+        slots = self.slots
+        if self.name is None:
+            for slot in slots:
+                slot(*args, **kwargs)
+        elif not is_enabled():
+            self._dispatch(slots, args, kwargs)
+        else:
+            with action('hook:' + self.name):
+                self._dispatch(slots, args, kwargs)
+
+    def _dispatch(self, slots, args, kwargs):
+        """Call the slots of a named signal (profiled if active)."""
+        profiler = _profiler
+        if profiler is None:
+            for slot in slots:
+                slot(*args, **kwargs)
+        else:
+            profiler.dispatch(self.name, slots, args, kwargs)
+
+
+class List(Multicast):
+
+    """
+    Signal connected to dynamic list of event handlers.
+
+    Use this class if the list of event handlers needs to be dynamically
+    managed from within the application.
+
+    :ivar tuple slots: the event handlers (replaced on every change)
+    """
+
+    def __init__(self, slots=None):
+        """Initialize with an externally created list of slots."""
+        self.slots = tuple(slots or ())
+
+    def connect(self, slot):
+        """Register an event handler."""
+        self.slots += (slot,)
+
+    def disconnect(self, slot):
+        """Remove an event handler."""
+        slots = list(self.slots)
+        slots.remove(slot)
+        self.slots = tuple(slots)
+
+
+class EntryPoint(Multicast):
+
+    """
+    Signal connected to setuptools entry points.
+
+    Instances of this class are used to dynamically discover and invoke
+    event handlers that are installed as setuptools entry points.
+    """
+
+    def __init__(self, group, name=None):
+        """Set the entry point group and, optionally, implementation name."""
+        self._group = group
+        self._name = name
+
+    def __repr__(self):
+        return 'EntryPoint({!r})'.format(self._group)
+
+    @property
+    def slots(self):
+        """Return a tuple of all relevant (loaded) entry points."""
+        return registry.get(self._group, self._name)
+
+
+class EntryPointRegistry(object):
+
+    """
+    Process-wide cache of loaded entry points.
+
+    Each entry point group is resolved and loaded only once. The cache is
+    invalidated by :meth:`refresh` or when a distribution is added to the
+    ``pkg_resources`` working set (i.e. a plugin was installed).
+    """
+
+    def __init__(self, working_set=working_set):
+        self._cache = {}
+        self._lock = threading.Lock()
+        # The working set has no way to unsubscribe, so it must not keep
+        # the registry alive:
+        ref = weakref.ref(self)
+        def on_distribution_added(dist):
+            registry = ref()
+            if registry is not None:
+                registry.refresh()
+        working_set.subscribe(on_distribution_added, existing=False)
+
+    def get(self, group, name=None):
+        """Return a tuple of the loaded entry points in ``group``."""
+        key = (group, name)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        slots = tuple(ep.load() for ep in iter_entry_points(group, name))
+        with self._lock:
+            return self._cache.setdefault(key, slots)
+
+    def refresh(self):
+        """Forget all loaded entry points."""
+        with self._lock:
+            self._cache.clear()
+
+
+# the global registry used by EntryPoint:
+registry = EntryPointRegistry()
+
+
+def _slot_name(slot):
+    """Return a descriptive name for an event handler."""
+    if isinstance(slot, Multicast):
+        return repr(slot)
+    func = getattr(slot, '__func__', slot)
+    name = getattr(func, '__name__', None) or type(slot).__name__
+    owner = getattr(slot, '__self__', None)
+    if owner is not None:
+        return type(owner).__name__ + '.' + name
+    module = getattr(func, '__module__', None)
+    return module + '.' + name if module else name
+
+
+class HookProfiler(object):
+
+    """
+    Records invocations of named hooks (see :class:`HookCollection`), the
+    time spent in each connected slot and the nesting depth.
+
+    Usage::
+
+        profiler = HookProfiler()
+        profiler.start()
+        ...
+        profiler.stop()
+        profiler.save('hooks.json')     # view in chrome://tracing
+
+    :ivar int max_events: maximum number of trace events that are kept
+    """
+
+    max_events = 1000000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = default_timer()
+        self._events = []
+        self._stats = {}
+
+    def start(self):
+        """Start profiling (replaces the currently active profiler)."""
+        global _profiler
+        _profiler = self
+
+    def stop(self):
+        """Stop profiling."""
+        global _profiler
+        if _profiler is self:
+            _profiler = None
+
+    @property
+    def active(self):
+        return _profiler is self
+
+    def clear(self):
+        with self._lock:
+            del self._events[:]
+            self._stats.clear()
+
+    def dispatch(self, name, slots, args, kwargs):
+        """Invoke and time all ``slots`` of the hook ``name``."""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = default_timer()
+        try:
+            for slot in slots:
+                slot_start = default_timer()
+                try:
+                    slot(*args, **kwargs)
+                finally:
+                    self._record(name, _slot_name(slot), depth + 1,
+                                 slot_start, default_timer())
+        finally:
+            self._local.depth = depth
+            self._record(name, None, depth, start, default_timer())
+
+    def _record(self, hook, slot, depth, start, stop):
+        duration = stop - start
+        with self._lock:
+            stats = self._stats.get(hook)
+            if stats is None:
+                stats = self._stats[hook] = {
+                    'calls': 0, 'total': 0.0, 'max_depth': 0, 'slots': {}}
+            if slot is None:
+                stats['calls'] += 1
+                stats['total'] += duration
+                stats['max_depth'] = max(stats['max_depth'], depth)
+            else:
+                slot_stats = stats['slots'].setdefault(
+                    slot, {'calls': 0, 'total': 0.0, 'max': 0.0})
+                slot_stats['calls'] += 1
+                slot_stats['total'] += duration
+                slot_stats['max'] = max(slot_stats['max'], duration)
+            if len(self._events) < self.max_events:
+                self._events.append((
+                    hook, slot, depth, start - self._origin, duration,
+                    threading.current_thread().ident))
+
+    def as_dict(self):
+        """
+        Return ``{hook: stats}`` where ``stats`` contains the number of
+        ``calls``, the ``total`` time, the ``max_depth`` and the per-slot
+        statistics ``slots``.
+        """
+        with self._lock:
+            return {hook: dict(stats, slots={
+                        slot: dict(slot_stats)
+                        for slot, slot_stats in stats['slots'].items()})
+                    for hook, stats in self._stats.items()}
+
+    def to_chrome_trace(self):
+        """Return the recorded events in the Chrome trace event format."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+        return {
+            'traceEvents': [{
+                'name': hook if slot is None else slot,
+                'cat': 'hook' if slot is None else 'slot',
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+                'args': {'hook': hook, 'depth': depth},
+            } for hook, slot, depth, start, duration, tid in events],
+            'displayTimeUnit': 'ms',
+        }
+
+    def save(self, filename):
+        """Write the Chrome trace JSON to a file."""
+        with open(filename, 'wt') as f:
+            json.dump(self.to_chrome_trace(), f)
@@ -0,0 +1,192 @@
+# encoding: utf-8
+"""
+Startup profiling: time spent importing each module and in the individual
+initialization steps of the application.
+
+Usage::
+
+    from madgui.util import startup
+    startup.start()
+    with startup.step('create main window'):
+        ...
+    startup.mark('main window shown')
+    print(startup.stop().format_report())
+
+All module level functions are no-ops unless profiling was started.
+"""
+
+# force new style imports
+from __future__ import absolute_import
+
+# standard library
+import sys
+import threading
+from timeit import default_timer
+
+try:                    # python3
+    import builtins
+except ImportError:     # python2
+    import __builtin__ as builtins
+
+# exported symbols
+__all__ = [
+    'StartupProfiler',
+    'start',
+    'stop',
+    'active',
+    'step',
+    'mark',
+]
+
+
+# active StartupProfiler (if any):
+_profiler = None
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class _Step(object):
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = default_timer()
+
+    def __exit__(self, *exc_info):
+        self._profiler._steps.append(
+            (self._name, self._start, default_timer() - self._start))
+
+
+class StartupProfiler(object):
+
+    """
+    Records the import time of every module (by hooking ``__import__``),
+    the duration of named initialization steps and time marks.
+
+    Import times are given as ``self`` (excluding nested imports) and
+    ``total`` (including nested imports) time.
+
+    :ivar float target: time until ``main window shown`` that is considered
+                        acceptable (seconds)
+    """
+
+    target = 1.0
+
+    def __init__(self):
+        self._origin = default_timer()
+        self._local = threading.local()
+        self._imports = []
+        self._steps = []
+        self._marks = []
+        self._import = None
+
+    def start(self):
+        """Install the import hook."""
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """Uninstall the import hook."""
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _timed_import(self, name, *args, **kwargs):
+        real_import = self._import or builtins.__import__
+        if name in sys.modules:
+            return real_import(name, *args, **kwargs)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        num_modules = len(sys.modules)
+        start = default_timer()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            total = default_timer() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            # skip (relative) imports of already loaded modules:
+            if len(sys.modules) > num_modules:
+                self._imports.append((name, total - nested, total))
+
+    def step(self, name):
+        """Context manager that times an initialization step."""
+        return _Step(self, name)
+
+    def mark(self, name):
+        """Record the time elapsed since the profiler was created."""
+        self._marks.append((name, default_timer() - self._origin))
+
+    def format_report(self, limit=25):
+        """Return a human readable report of the slowest imports/steps."""
+        imports = sorted(self._imports, key=lambda i: i[1], reverse=True)
+        total_imports = sum(self_time for _, self_time, _ in self._imports)
+        lines = ["Startup profile",
+                 "",
+                 "{:<48} {:>9} {:>9}".format(
+                     'module', 'self[ms]', 'total[ms]')]
+        for name, self_time, total in imports[:limit]:
+            lines.append("{:<48} {:>9.1f} {:>9.1f}".format(
+                name[:48], self_time * 1e3, total * 1e3))
+        lines.append("{} modules imported in {:.3f} s".format(
+            len(imports), total_imports))
+        lines.append("")
+        lines.append("{:<48} {:>9} {:>9}".format(
+            'step', 'start[s]', 'time[ms]'))
+        for name, start, duration in self._steps:
+            lines.append("{:<48} {:>9.3f} {:>9.1f}".format(
+                name[:48], start - self._origin, duration * 1e3))
+        lines.append("")
+        for name, elapsed in self._marks:
+            lines.append("{}: {:.3f} s".format(name, elapsed))
+            if name == 'main window shown' and elapsed > self.target:
+                lines.append("WARNING: exceeds target of {:.1f} s".format(
+                    self.target))
+        return '\n'.join(lines)
+
+
+def start(profiler=None):
+    """Start profiling (if not already active) and return the profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = profiler or StartupProfiler()
+        _profiler.start()
+    return _profiler
+
+
+def stop():
+    """Stop profiling and return the profiler (or ``None``)."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def active():
+    """Check whether startup profiling is active."""
+    return _profiler is not None
+
+
+def step(name):
+    """Context manager that times an initialization step (if profiling)."""
+    profiler = _profiler
+    return _NullContext() if profiler is None else profiler.step(name)
+
+
+def mark(name):
+    """Record a time mark (if profiling)."""
+    profiler = _profiler
+    if profiler is not None:
+        profiler.mark(name)
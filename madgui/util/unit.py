@@ -8,6 +8,7 @@ from __future__ import absolute_import
 
 # stdlib
 import sys
+import threading
 
 from pkg_resources import resource_filename
 
@@ -30,6 +31,7 @@ __all__ = [
     'from_config',
     'from_config_dict',
     'UnitConverter',
+    'preload',
 ]
 
 
@@ -41,23 +43,60 @@ except NameError:       # python3 (let's think about future...)
     unicode = str
 
 
-units = pint.UnitRegistry(resource_filename('madgui.data', 'default_en.txt'))
+def _create_registry():
+    """Load the unit registry (parsing the definitions takes a while)."""
+    units = pint.UnitRegistry(resource_filename('madgui.data',
+                                                'default_en.txt'))
 
+    # make `str(quantity)` slightly nicer.
+    if sys.version_info[0] == 3:
+        units.default_format = 'P~'
+    else:
+        # NOTE: 'P' outputs non-ascii unicode symbols and therefore breaks
+        # str(quantity) on python2 (UnicodeEncodeError).
+        units.default_format = '~'
+
+    # extent unit registry.
+    # NOTE: parsing %, ‰ doesn't work automatically yet in pint.
+    units.define(u'ratio = []')
+    units.define(u'percent = 0.01 ratio = %')
+    units.define(u'permille = 0.001 ratio = ‰')
+    return units
+
+
+class _LazyRegistry(object):
+
+    """Proxy for the unit registry that is created on first use."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._registry = None
 
-# make `str(quantity)` slightly nicer.
-if sys.version_info[0] == 3:
-    units.default_format = 'P~'
-else:
-    # NOTE: 'P' outputs non-ascii unicode symbols and therefore breaks
-    # str(quantity) on python2 (UnicodeEncodeError).
-    units.default_format = '~'
+    def _get(self):
+        registry = self._registry
+        if registry is None:
+            with self._lock:
+                if self._registry is None:
+                    self._registry = self._factory()
+                registry = self._registry
+        return registry
 
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
 
-# extent unit registry.
-# NOTE: parsing %, ‰ doesn't work automatically yet in pint.
-units.define(u'ratio = []')
-units.define(u'percent = 0.01 ratio = %')
-units.define(u'permille = 0.001 ratio = ‰')
+    def __call__(self, *args, **kwargs):
+        return self._get()(*args, **kwargs)
+
+
+units = _LazyRegistry(_create_registry)
+
+
+def preload():
+    """Create the unit registry in a background thread."""
+    thread = threading.Thread(target=units._get)
+    thread.daemon = True
+    thread.start()
 
 
 def strip_unit(quantity, unit=None):
@@ -153,6 +192,20 @@ class UnitConverter(object):
         """Store Madx instance for later use."""
         self._units = dicti(units)
 
+    @classmethod
+    def from_config_dict(cls, conf_dict):
+        """Create a converter that parses the config entries on first use."""
+        self = cls.__new__(cls)
+        self._conf = conf_dict
+        return self
+
+    def __getattr__(self, name):
+        # parse the deferred config (see from_config_dict):
+        if name == '_units' and '_conf' in self.__dict__:
+            self._units = dicti(from_config_dict(self._conf))
+            return self._units
+        raise AttributeError(name)
+
     def get_unit_label(self, name):
         """Get the name of the unit for the specified parameter name."""
         units = self._units
@@ -12,7 +12,7 @@ from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as Canvas
 from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg as Toolbar
 
 # internal
-from madgui.core.plugin import HookCollection
+from madgui.util.plugin import HookCollection
 
 # exported symbols
 __all__ = [
@@ -46,6 +46,8 @@ class FigurePanel(wx.Panel):
         # couple figure to canvas
         self.canvas = Canvas(self, -1, view.figure.figure)
         view.canvas = self.canvas
+        # coalesce redraw requests until the event loop is idle again:
+        view.figure.dispatch = wx.CallAfter
 
         # create a toolbar
         self.toolbar = Toolbar(self.canvas)
@@ -72,6 +74,7 @@ class FigurePanel(wx.Panel):
 
     def on_destroy(self, event):
         """Invoked when C++ window is destroyed."""
+        self.view.figure.cancel_redraw()
         self.view.destroy()
 
     def on_zoom_or_pan(self, event):
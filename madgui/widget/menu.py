@@ -8,6 +8,7 @@ from __future__ import absolute_import
 
 # GUI components
 from madgui.core import wx
+from madgui.util.instrument import traced
 
 # exported symbols
 __all__ = [
@@ -32,7 +33,8 @@ class Item(object):
 
     def append_to(self, menu, evt_handler):
         item = menu.Append(self.id, self.title, self.description, self.kind)
-        evt_handler.Bind(wx.EVT_MENU, self.action, item)
+        name = 'menu:' + self.title.replace('&', '').split('\t')[0]
+        evt_handler.Bind(wx.EVT_MENU, traced(self.action, name), item)
         if self.update_ui:
             evt_handler.Bind(wx.EVT_UPDATE_UI, self.update_ui, item)
 
@@ -74,7 +74,10 @@ def main():
         ],
         entry_points="""
             [gui_scripts]
-            madgui = madgui.core.app:App.main
+            madgui = madgui.__main__:main
+
+            [console_scripts]
+            madgui-batch = madgui.batch:main
         """,
         package_data={
             'madgui': [
@@ -0,0 +1,92 @@
+# encoding: utf-8
+"""
+Shared fixtures for the tests that need units or a MAD-X session.
+"""
+
+# standard library
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# Units of the MAD-X quantities used in the tests:
+MADX_UNITS = {
+    'l': 'm', 'at': 'm', 's': 'm',
+    'x': 'm', 'y': 'm',
+    'betx': 'm', 'bety': 'm',
+    'dx': 'm', 'dy': 'm',
+    'ex': 'm', 'ey': 'm',
+    'k1': 'm^-2', 'angle': 'rad',
+}
+
+# A small sequence with two knobs:
+SEQUENCE = """
+    K1_Q1 = 0.1;
+    K1_Q2 = -0.1;
+    seq: sequence, l=10, refer=entry;
+        q1: QUADRUPOLE, K1:=K1_Q1, at=3, l=1;
+        k1: HKICKER, KICK=0.01, at=5;
+        q2: QUADRUPOLE, K1:=K1_Q2, at=6, l=1;
+    endsequence;
+"""
+
+
+def make_utool():
+    """Create the unit converter for :data:`MADX_UNITS`."""
+    # NOTE: imported here to keep the modules importable without pint:
+    from madgui.util.unit import UnitConverter
+    return UnitConverter.from_config_dict(MADX_UNITS)
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    """Provides a temporary folder :attr:`tempdir` for every test."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, name, text):
+        """Write a file to the temporary folder and return its path."""
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'wt') as f:
+            f.write(text)
+        return path
+
+
+class SessionTestCase(TempDirTestCase):
+
+    """
+    Provides a :attr:`session` that has loaded :attr:`sequence` from the
+    file ``seq.madx`` and a :attr:`segment` for the whole sequence.
+    """
+
+    sequence = SEQUENCE
+    knobs = {'K1_Q1': 0.1, 'K1_Q2': -0.1}
+    twiss = {'betx': 2, 'bety': 3}
+
+    def setUp(self):
+        # NOTE: imported here to keep the modules importable without cpymad:
+        from madgui.component.session import Session
+        from madgui.resource.file import FileResource
+        super(SessionTestCase, self).setUp()
+        self.write('seq.madx', self.sequence)
+        self.utool = utool = make_utool()
+        self.session = session = Session(utool, FileResource(self.tempdir))
+        session.pool_size = 2
+        session.call('seq.madx')
+        session.set_values(self.knobs)
+        session.init_segment({
+            'sequence': 'seq',
+            'range': ('#s', '#e'),
+            'beam': {},
+            'twiss': utool.dict_add_unit(self.twiss),
+        })
+        self.segment = session.segment
+
+    def tearDown(self):
+        self.session.close()
+        super(SessionTestCase, self).tearDown()
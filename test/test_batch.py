@@ -0,0 +1,129 @@
+# encoding: utf-8
+"""
+Tests for the headless batch utility.
+"""
+
+# standard library
+import os
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+import yaml
+
+# test fixtures
+from _fixtures import MADX_UNITS, SEQUENCE, SessionTestCase, TempDirTestCase
+
+try:
+    import cpymad
+except ImportError:
+    cpymad = None
+else:
+    # tested module
+    from madgui import batch
+
+
+MODEL = {
+    'api_version': 1,
+    'init-files': ['seq.madx'],
+    'sequence': 'seq',
+    'range': ['#s', '#e'],
+    'beam': {},
+    'twiss': {'betx': 2.0, 'bety': 3.0},
+}
+
+JOBS = [
+    {'model': 'seq.cpymad.yml',
+     'knobs': {'K1_Q1': 0.2},
+     'twiss': {'columns': ['name', 's', 'betx']},
+     'output': 'out/twiss.tfs'},
+    {'model': 'seq.cpymad.yml',
+     'transfer_map': {'from': 'q1', 'to': 'q2'},
+     'output': 'out/map.npz'},
+]
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestBatch(TempDirTestCase):
+
+    def setUp(self):
+        super(TestBatch, self).setUp()
+        self.write('seq.madx', SEQUENCE)
+        self.write('seq.cpymad.yml', yaml.safe_dump(MODEL))
+        self.jobfile = self.write('jobs.yml', yaml.safe_dump(JOBS))
+
+    def test_no_gui_imports(self):
+        code = ("import sys, madgui.batch; "
+                "sys.exit('wx' in sys.modules or "
+                "'matplotlib' in sys.modules)")
+        self.assertEqual(subprocess.call([sys.executable, '-c', code]), 0)
+
+    def test_load_jobs(self):
+        jobs = batch.load_jobs(self.jobfile)
+        self.assertEqual([job['task'] for job in jobs],
+                         ['twiss', 'transfer_map'])
+        self.assertEqual(jobs[1]['output'],
+                         os.path.join(self.tempdir, 'out', 'map.npz'))
+        invalid = self.write('invalid.yml', yaml.safe_dump([
+            {'model': 'seq.cpymad.yml', 'output': 'x.npz'}]))
+        with self.assertRaises(ValueError):
+            batch.load_jobs(invalid)
+
+    def test_run_jobs(self):
+        jobs = batch.load_jobs(self.jobfile)
+        results = list(batch.run_jobs(jobs, MADX_UNITS, processes=2))
+        self.assertEqual([error for _, _, _, error in results], [None, None])
+        with open(jobs[0]['output']) as f:
+            lines = f.read().splitlines()
+        self.assertIn('BETX', [line for line in lines
+                               if line.startswith('*')][0].split())
+        tmap = np.load(jobs[1]['output'])
+        self.assertEqual(tmap['r1'].shape, (7,))
+        assert_allclose(tmap['r7'][6], 1.0)
+
+    def test_plot(self):
+        jobs = [{'model': 'seq.cpymad.yml',
+                 'plot': {'view': 'env',
+                          'snapshots': [{'K1_Q1': 0.2}, {'K1_Q1': 0.3}]},
+                 'output': 'plots/env-{index}.png'},
+                {'model': 'seq.cpymad.yml',
+                 'plot': {'view': 'pos', 'size': [4, 3]},
+                 'output': 'plots/pos.svg'}]
+        jobfile = self.write('plots.yml', yaml.safe_dump(jobs))
+        jobs = batch.load_jobs(jobfile)
+        results = list(batch.run_jobs(jobs, MADX_UNITS, processes=1))
+        self.assertEqual([error for _, _, _, error in results], [None, None])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tempdir, 'plots'))),
+            ['env-0.png', 'env-1.png', 'pos.svg'])
+        # other tests may have imported wx into this process already:
+        code = "import sys, madgui.render; sys.exit('wx' in sys.modules)"
+        self.assertEqual(subprocess.call([sys.executable, '-c', code]), 0)
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestRenderer(SessionTestCase):
+
+    def test_restore_knobs(self):
+        # NOTE: imported here to keep the other tests free of matplotlib:
+        from madgui.render import get_renderer
+        from madgui.util.config import load_config
+        segment = self.segment
+        session = self.session
+        knobs = dict(session.knobs)
+        initial = segment._raw_twiss
+        renderer = get_renderer((4, 3), 50)
+        filename = os.path.join(self.tempdir, 'env-{index}.png')
+        written = renderer.render(segment, 'env', load_config()['line_view'],
+                                  filename, [{'K1_Q1': 0.2}, {'K1_Q2': 0.3}])
+        self.assertEqual(len(written), 2)
+        self.assertEqual(dict(session.knobs), knobs)
+        self.assertEqual(session.evaluate_many(['K1_Q1', 'K1_Q2']),
+                         [knobs['K1_Q1'], knobs['K1_Q2']])
+        assert_allclose(segment._raw_twiss['betx'], initial['betx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
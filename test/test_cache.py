@@ -0,0 +1,45 @@
+# encoding: utf-8
+"""
+Tests for the LRU cache utility.
+"""
+
+# standard library
+import unittest
+
+# tested classes
+from madgui.util.cache import LRUCache, freeze
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(len(cache), 2)
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_bytes=10, sizeof=len)
+        cache.put('a', 'xxxx')
+        cache.put('b', 'xxxx')
+        cache.put('c', 'xxxx')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.nbytes, 8)
+        cache.put('d', 'x' * 11)
+        self.assertNotIn('d', cache)
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_freeze(self):
+        self.assertEqual(freeze({'b': [1, 2], 'a': {'x': 1}}),
+                         freeze({'a': {'x': 1}, 'b': (1, 2)}))
+        hash(freeze({'b': [1, 2], 'a': {'x': 1}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
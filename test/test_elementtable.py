@@ -0,0 +1,98 @@
+# encoding: utf-8
+"""
+Tests for the element table.
+"""
+
+# standard library
+import unittest
+
+# tested classes
+from madgui.component.elementtable import ElementTable
+
+# test fixtures
+from _fixtures import make_utool
+
+try:
+    import pint
+except ImportError:
+    pint = None
+
+
+ELEMENTS = [
+    {'name': 'start', 'type': 'marker', 'at': 0.0, 'l': 0.0},
+    {'name': 'q1', 'type': 'QUADRUPOLE', 'at': 1.0, 'l': 0.5, 'k1': 0.3},
+    {'name': 'b1', 'type': 'sbend', 'at': 2.0, 'l': 2.0, 'angle': 0.1},
+    {'name': 'mp', 'type': 'multipole', 'at': 4.0, 'l': 0.0,
+     'knl': [0.01, 0.2, 0.5]},
+    {'name': 'q2', 'type': 'quadrupole', 'at': 5.0, 'l': 0.5, 'k1': -0.3},
+]
+
+
+class CountingSource(object):
+
+    """Records the accesses to the raw element dicts."""
+
+    def __init__(self):
+        self.fetched = []
+
+    def __len__(self):
+        return len(ELEMENTS)
+
+    def __getitem__(self, index):
+        self.fetched.append(index)
+        return ELEMENTS[index]
+
+
+@unittest.skipIf(pint is None, "pint is not available")
+class TestElementTable(unittest.TestCase):
+
+    def setUp(self):
+        self.utool = make_utool()
+        self.table = ElementTable(ELEMENTS, self.utool)
+
+    def test_columns(self):
+        table = self.table
+        self.assertEqual(len(table), 5)
+        self.assertEqual(list(table.data['at']), [0, 1, 2, 4, 5])
+        self.assertEqual(list(table.types), [
+            'marker', 'quadrupole', 'sbend', 'multipole', 'quadrupole'])
+        self.assertEqual(table.data['knl1'][3], 0.2)
+        self.assertEqual(table.names[2], 'b1')
+
+    def test_views(self):
+        table = self.table
+        q1 = table[1]
+        self.assertEqual(q1['name'], 'q1')
+        self.assertEqual(self.utool.strip_unit('k1', q1['k1']), 0.3)
+        self.assertEqual([el['name'] for el in table[3:]], ['mp', 'q2'])
+        self.assertEqual(len(list(table)), 5)
+
+    def test_refresh(self):
+        table = self.table
+        table.refresh(1, dict(ELEMENTS[1], k1=0.4))
+        self.assertEqual(table.data['k1'][1], 0.4)
+        self.assertEqual(self.utool.strip_unit('k1', table[1]['k1']), 0.4)
+
+    def test_fetch_on_demand(self):
+        source = CountingSource()
+        table = ElementTable(source, self.utool, cache_size=2)
+        self.assertEqual(len(source.fetched), len(ELEMENTS))
+        self.assertEqual(len(table._cache), 0)
+        del source.fetched[:]
+        self.assertEqual(table.get(2, 'at'), table[2]['at'])
+        self.assertEqual(source.fetched, [2])
+        table.raw(2)
+        table.raw(-1)
+        table.raw(0)
+        table.raw(4)
+        self.assertEqual(source.fetched, [2, 4, 0])
+        # full passes do not evict the cached dicts:
+        del source.fetched[:]
+        self.assertEqual(len(list(table.iter_raw())), len(ELEMENTS))
+        self.assertEqual(source.fetched, [1, 2, 3])
+        table.raw(4)
+        self.assertEqual(source.fetched, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""
+Tests for the background executor utility.
+"""
+
+# standard library
+import threading
+import unittest
+
+# tested classes
+from madgui.util.executor import Executor, Synchronized
+
+
+class TestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = Executor()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_submit(self):
+        results = []
+        future = self.executor.submit(pow, (2, 10), callback=results.append)
+        self.assertEqual(future.result(1), 1024)
+        self.assertEqual(results, [1024])
+
+    def test_exception(self):
+        future = self.executor.submit(int, ('foo',))
+        self.assertIsInstance(future.exception(1), ValueError)
+        with self.assertRaises(ValueError):
+            future.result(1)
+
+    def test_errback(self):
+        called = threading.Event()
+        results = []
+        errors = []
+        def errback(exc):
+            errors.append(exc)
+            called.set()
+        future = self.executor.submit(int, ('foo',), callback=results.append,
+                                      errback=errback)
+        self.assertTrue(called.wait(1))
+        self.assertIs(errors[0], future.exception())
+        self.assertEqual(results, [])
+
+    def test_coalesce(self):
+        started = threading.Event()
+        proceed = threading.Event()
+        calls = []
+        def block():
+            started.set()
+            proceed.wait()
+        self.executor.submit(block)
+        started.wait(1)
+        first = self.executor.submit(calls.append, (1,), key='a')
+        second = self.executor.submit(calls.append, (2,), key='a')
+        other = self.executor.submit(calls.append, (3,), key='b')
+        self.assertIs(first, second)
+        proceed.set()
+        other.result(1)
+        self.assertEqual(calls, [2, 3])
+
+    def test_synchronized(self):
+        lock = threading.RLock()
+        proxy = Synchronized([], lock)
+        proxy.append(1)
+        self.assertEqual(proxy.count(1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# encoding: utf-8
+"""
+Tests for the call instrumentation utilities.
+"""
+
+# standard library
+import io
+import threading
+import unittest
+
+# tested module
+from madgui.util import instrument
+
+
+class Target(object):
+
+    value = 42
+
+    def double(self, x):
+        return 2 * x
+
+
+class TestInstrument(unittest.TestCase):
+
+    def test_instrumented_calls(self):
+        stats = instrument.Statistics()
+        proxy = instrument.Instrumented(Target(), stats, 'target')
+        self.assertEqual(proxy.value, 42)
+        with instrument.action('menu:Open'):
+            with instrument.action('hook:update'):
+                self.assertEqual(proxy.double(3), 6)
+        proxy.double(1)
+        data = stats.as_dict()
+        self.assertEqual(list(data), ['target.double'])
+        self.assertEqual(data['target.double']['menu:Open']['count'], 1)
+        self.assertEqual(data['target.double'][None]['count'], 1)
+        self.assertIn('target.double', stats.format_summary())
+
+    def test_bind_action(self):
+        results = []
+        func = lambda: results.append(instrument.current_action())
+        with instrument.action('tool:match'):
+            bound = instrument.bind_action(func)
+        thread = threading.Thread(target=bound)
+        thread.start()
+        thread.join()
+        self.assertEqual(results, ['tool:match'])
+        self.assertIsNone(instrument.current_action())
+
+    def test_traced(self):
+        func = lambda: instrument.current_action()
+        self.assertIs(instrument.traced(func, 'menu:Open'), func)
+        instrument.set_enabled(True)
+        try:
+            traced = instrument.traced(func, 'menu:Open')
+        finally:
+            instrument.set_enabled(False)
+        self.assertEqual(traced(), 'menu:Open')
+
+    def test_histogram(self):
+        hist = instrument.Histogram()
+        for value in [1e-4] * 9 + [1.0]:
+            hist.add(value)
+        self.assertEqual(hist.count, 10)
+        self.assertEqual(sum(hist.counts), 10)
+        self.assertLess(hist.percentile(0.5), 1e-3)
+        self.assertGreaterEqual(hist.percentile(1.0), 1.0)
+
+    def test_counting_stream(self):
+        stream = instrument.CountingStream(io.BytesIO(b'abc\ndef'))
+        self.assertEqual(stream.readline(), b'abc\n')
+        self.assertEqual(stream.read(), b'def')
+        stream.write(b'xy')
+        self.assertEqual(stream.nbytes, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# encoding: utf-8
+"""
+Tests for the level of detail reduction.
+"""
+
+# standard library
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+# tested module
+from madgui.util.lod import decimate
+
+
+class TestDecimate(unittest.TestCase):
+
+    def test_exact(self):
+        x = np.arange(10.0)
+        y = x ** 2
+        xs, ys, exact = decimate(x, y, 2.5, 5.5, 100)
+        self.assertTrue(exact)
+        assert_allclose(xs, [2, 3, 4, 5, 6])
+        assert_allclose(ys, [4, 9, 16, 25, 36])
+
+    def test_envelope(self):
+        x = np.linspace(0, 100, 100001)
+        y = np.sin(x)
+        xs, ys, exact = decimate(x, y, 10, 60, 200)
+        self.assertFalse(exact)
+        self.assertLessEqual(len(xs), 2 * 202)
+        self.assertTrue(np.all(np.diff(xs) >= 0))
+        visible = (x >= 10) & (x <= 60)
+        self.assertAlmostEqual(ys.max(), y[visible].max(), places=6)
+        self.assertAlmostEqual(ys.min(), y[visible].min(), places=6)
+        self.assertLess(xs[0], 10)
+        self.assertGreater(xs[-1], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
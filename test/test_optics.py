@@ -0,0 +1,224 @@
+# encoding: utf-8
+"""
+Tests for the numpy linear optics engine.
+"""
+
+# standard library
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+# tested module
+from madgui.util import optics
+
+# test fixtures
+from _fixtures import SessionTestCase
+
+try:
+    import cpymad
+except ImportError:
+    cpymad = None
+
+
+def symplectic_form():
+    J = np.zeros((6, 6))
+    for i in range(0, 6, 2):
+        J[i, i+1] = 1
+        J[i+1, i] = -1
+    return J
+
+
+class TestOptics(unittest.TestCase):
+
+    def test_symplectic(self):
+        J = symplectic_form()
+        maps = [
+            optics.drift([2.0]),
+            optics.quadrupole([0.5], [1.3]),
+            optics.quadrupole([0.5], [-1.3]),
+            optics.sbend([1.0], [0.3], [0.1], [0.05], [0.1]),
+            optics.solenoid([1.0], [0.8]),
+            optics.multipole([0.01], [0.2]),
+        ]
+        for M in maps:
+            R = M[0,:6,:6]
+            assert_allclose(R.T.dot(J).dot(R), J, atol=1e-12)
+
+    def test_element_params(self):
+        params = optics.get_element_params({'k1': 0.3, 'knl': [0.1, 0.2]})
+        self.assertEqual(sorted(params), sorted(optics.PARAMETERS))
+        self.assertEqual(params['k1'], 0.3)
+        self.assertEqual((params['knl0'], params['knl1']), (0.1, 0.2))
+        self.assertEqual(params['ksl0'], 0)
+
+    def test_drift(self):
+        maps = optics.drift([1.0, 2.0])
+        tw = optics.propagate(maps, {'betx': 2, 'bety': 1, 'alfx': 1})
+        s = np.array([1.0, 3.0])
+        assert_allclose(tw['betx'], 2 - 2*s + 1*s**2)
+        assert_allclose(tw['bety'], 1 + s**2)
+        assert_allclose(tw['alfx'], 1 - s)
+        assert_allclose(tw['muy'], np.arctan(s) / (2*np.pi))
+
+    def test_unsupported_types(self):
+        types = ['marker', 'rbend', 'quadrupole', 'rfcavity', 'rbend']
+        self.assertEqual(optics.unsupported_types(types),
+                         ['rbend', 'rfcavity'])
+        params = optics.get_element_params({})
+        params = {key: [val] * len(types) for key, val in params.items()}
+        with self.assertRaises(ValueError):
+            optics.element_maps(types, params)
+
+    def test_unsupported_params(self):
+        types = ['solenoid', 'multipole', 'multipole']
+        params = optics.get_element_params({})
+        params = {key: [val] * len(types) for key, val in params.items()}
+        params['knl1'] = [0, 0.1, 0.2]
+        self.assertEqual(optics.unsupported_types(types, params), [])
+        params['ks'] = [0.3, 0, 0]
+        params['ksl0'] = [0, 0, 0.001]
+        self.assertEqual(optics.unsupported_types(types, params),
+                         ['multipole', 'solenoid'])
+        self.assertEqual(
+            optics.describe_unsupported(['rbend', 'solenoid']),
+            'rbend, solenoid (KS != 0)')
+        with self.assertRaises(ValueError):
+            optics.element_maps(types, params)
+
+    def test_cumulative_product(self):
+        maps = np.random.RandomState(0).uniform(-1, 1, (13, 7, 7))
+        cum = optics.cumulative_product(maps)
+        expected = maps[0]
+        for i in range(1, len(maps)):
+            expected = maps[i].dot(expected)
+            assert_allclose(cum[i], expected)
+        assert_allclose(optics.differential_maps(cum), maps, atol=1e-8)
+
+    def test_propagate_batch(self):
+        maps = np.vstack([
+            optics.quadrupole([1.0], [0.3]),
+            optics.sbend([2.0], [0.1], [0.05]),
+            optics.kicker([0.0], [0.001], [0.002]),
+            optics.drift([3.0]),
+        ])
+        inits = [
+            {'betx': 2, 'bety': 3, 'alfx': 0.5, 'x': 0.001, 'dx': 0.1},
+            {'betx': 5, 'bety': 1, 'alfy': -1, 'py': 0.002, 'mux': 0.3},
+        ]
+        batch = optics.propagate_batch(maps, inits)
+        for i, init in enumerate(inits):
+            single = optics.propagate(maps, init)
+            for col, val in single.items():
+                self.assertEqual(batch[col].shape, (2, 4))
+                assert_allclose(batch[col][i], val)
+
+
+SEQUENCE = """
+    seq: sequence, l=10, refer=entry;
+        q1: QUADRUPOLE, K1:=K1_Q1, at=0, l=1;
+        m1: MONITOR, at=1, l=1;
+        b1: SBEND, ANGLE=0.1, K1=0.05, E1=0.02, E2=0.03, at=2, l=2;
+        q2: QUADRUPOLE, K1:=K1_Q2, at=4, l=1;
+        k1: HKICKER, KICK=0.001, at=5;
+        k2: VKICKER, KICK=-0.002, at=5;
+        mp: MULTIPOLE, KNL={0, 0.1}, at=5;
+        m2: MONITOR, at=5, l=2;
+        q3: QUADRUPOLE, K1=-0.4, at=7, l=1;
+        m3: MONITOR, at=8, l=2;
+    endsequence;
+"""
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestEngines(SessionTestCase):
+
+    sequence = SEQUENCE
+    knobs = {'K1_Q1': 0.3, 'K1_Q2': -0.2}
+    twiss = {
+        'betx': 2, 'alfx': 0.5, 'bety': 3, 'alfy': -0.2,
+        'x': 0.001, 'py': 0.0005, 'dx': 0.1,
+    }
+
+    def assert_engines_agree(self):
+        segment = self.segment
+        segment.engine = 'exact'
+        exact = segment._raw_twiss
+        segment.engine = 'fast'
+        fast = segment._raw_twiss
+        for col in segment._restart_columns + ['s']:
+            assert_allclose(fast[col], exact[col], rtol=1e-3, atol=1e-6,
+                            err_msg=col)
+
+    def test_engines_agree(self):
+        self.assert_engines_agree()
+
+    def test_engines_agree_after_change(self):
+        segment = self.segment
+        segment.engine = 'fast'
+        self.session.set_value('K1_Q2', 0.25)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        self.assert_engines_agree()
+
+    def test_twiss_batch(self):
+        segment = self.segment
+        utool = self.session.utool
+        inits = [utool.dict_add_unit({'betx': betx, 'x': x})
+                 for betx, x in [(1, 0), (2, 0.001), (4, -0.002)]]
+        for engine in segment.engines:
+            segment.engine = engine
+            batch = utool.dict_strip_unit(segment.twiss_batch(inits))
+            for i, init in enumerate(inits):
+                segment.twiss_args = dict(segment.twiss_args, **init)
+                for col in ('betx', 'mux', 'x', 'px', 'dx'):
+                    assert_allclose(batch[col][i], segment._raw_twiss[col],
+                                    rtol=1e-6, atol=1e-9, err_msg=col)
+
+    def test_twiss_batch_after_change(self):
+        segment = self.segment
+        session = self.session
+        segment.engine = 'fast'
+        init = session.utool.dict_add_unit({'betx': 2})
+        session.set_value('K1_Q2', 0.25)
+        segment.invalidate('K1_Q2')
+        batch = session.utool.dict_strip_unit(segment.twiss_batch([init]))
+        # the element table is only updated by the next TWISS:
+        self.assertIn(segment.get_element_index('q2'),
+                      segment._stale_elements)
+        segment.twiss_args = dict(segment.twiss_args, **init)
+        assert_allclose(batch['betx'][0], segment._raw_twiss['betx'],
+                        rtol=1e-6)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.segment.engine = 'foo'
+
+
+# Elements that the fast engine does not model like MAD-X:
+COUPLED_SEQUENCE = """
+    seq: sequence, l=10, refer=entry;
+        q1: QUADRUPOLE, K1:=K1_Q1, at=0, l=1;
+        s1: SOLENOID, KS=0.3, at=1, l=1;
+        mp: MULTIPOLE, KNL={0.001, 0.1}, KSL={0.0005}, at=2;
+        q2: QUADRUPOLE, K1:=K1_Q2, at=4, l=1;
+        m1: MONITOR, at=5, l=2;
+    endsequence;
+"""
+
+
+class TestEnginesFallback(TestEngines):
+
+    """The fast engine must fall back to MAD-X for these elements."""
+
+    sequence = COUPLED_SEQUENCE
+
+    def test_unsupported_reported(self):
+        segment = self.segment
+        segment.engine = 'fast'
+        self.assertEqual(segment.unsupported_types,
+                         ['multipole', 'solenoid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# encoding: utf-8
+"""
+Tests for the plugin system.
+"""
+
+# standard library
+import gc
+import unittest
+import weakref
+
+# tested module
+from madgui.util import instrument
+from madgui.util.plugin import (HookCollection, HookProfiler, List,
+                                 EntryPointRegistry)
+
+
+class FakeWorkingSet(object):
+
+    def subscribe(self, callback, existing=True):
+        self.callback = callback
+        self.existing = existing
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_cache(self):
+        working_set = FakeWorkingSet()
+        registry = EntryPointRegistry(working_set)
+        key = ('madgui.test.nonexistent', None)
+        self.assertEqual(registry.get(key[0]), ())
+        self.assertIn(key, registry._cache)
+        working_set.callback(None)
+        self.assertNotIn(key, registry._cache)
+
+    def test_subscription(self):
+        working_set = FakeWorkingSet()
+        registry = EntryPointRegistry(working_set)
+        self.assertFalse(working_set.existing)
+        ref = weakref.ref(registry)
+        del registry
+        gc.collect()
+        self.assertIsNone(ref())
+        working_set.callback(None)
+
+    def test_list_snapshot(self):
+        hook = List()
+        calls = []
+        def first():
+            calls.append(1)
+            hook.disconnect(first)
+            hook.connect(lambda: calls.append(3))
+        hook.connect(first)
+        hook.connect(lambda: calls.append(2))
+        hook()
+        self.assertEqual(calls, [1, 2])
+        self.assertIsInstance(hook.slots, tuple)
+
+
+class TestHookActions(unittest.TestCase):
+
+    def tearDown(self):
+        instrument.set_enabled(False)
+
+    def test_actions(self):
+        hook = HookCollection(update=None)
+        actions = []
+        hook.update.connect(lambda: actions.append(
+            instrument.current_action()))
+        hook.update()
+        instrument.set_enabled(True)
+        hook.update()
+        self.assertEqual(actions, [None, 'hook:update'])
+
+
+class TestHookProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.hook = HookCollection(update=None, redraw=None)
+        self.profiler = HookProfiler()
+        self.profiler.start()
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_records_slots(self):
+        hook = self.hook
+        calls = []
+
+        def redraw_slot():
+            calls.append('redraw')
+
+        hook.redraw.connect(redraw_slot)
+        hook.update.connect(lambda: calls.append('update'))
+        hook.update.connect(hook.redraw)
+        hook.update()
+        hook.update()
+        self.assertEqual(calls, ['update', 'redraw'] * 2)
+
+        stats = self.profiler.as_dict()
+        self.assertEqual(stats['update']['calls'], 2)
+        self.assertEqual(stats['update']['max_depth'], 0)
+        self.assertEqual(stats['redraw']['max_depth'], 1)
+        slots = stats['redraw']['slots']
+        self.assertEqual(list(slots), [__name__ + '.redraw_slot'])
+        self.assertEqual(slots[__name__ + '.redraw_slot']['calls'], 2)
+
+        trace = self.profiler.to_chrome_trace()['traceEvents']
+        self.assertEqual(len([e for e in trace if e['cat'] == 'hook']), 4)
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0
+                            for e in trace))
+
+    def test_stop(self):
+        self.profiler.stop()
+        self.assertFalse(self.profiler.active)
+        self.hook.update()
+        self.assertEqual(self.profiler.as_dict(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# encoding: utf-8
+"""
+Tests for the MAD-X worker pool.
+"""
+
+# standard library
+import threading
+import time
+import unittest
+
+# tested classes
+from madgui.component.pool import MadxPool, Worker
+
+
+class FakeMadx(object):
+
+    """Stands in for a ``Madx`` instance with a dict of global variables."""
+
+    def __init__(self):
+        self._service = self
+        self._libmadx = self
+        self.closed = False
+        self.globals = {'k1_q1': 1.0, 'k1_q2': 2.0, 'k1_q3': 3.0}
+
+    def close(self):
+        self.closed = True
+
+    def input(self, text):
+        for line in text.splitlines():
+            name, value = line.rstrip(';').split(' = ')
+            self.globals[name] = float(value)
+
+    def evaluate(self, expr):
+        return self.globals[expr]
+
+
+class TestMadxPool(unittest.TestCase):
+
+    def test_spawn_concurrently(self):
+        def spawn():
+            time.sleep(0.2)
+            return FakeMadx()
+        start = time.time()
+        pool = MadxPool(spawn, 4)
+        self.assertLess(time.time() - start, 0.6)
+        pool.close()
+
+    def test_spawn_error(self):
+        spawned = []
+        lock = threading.Lock()
+        def spawn():
+            with lock:
+                if len(spawned) == 1:
+                    spawned.append(None)
+                    raise RuntimeError("spawn failed")
+                madx = FakeMadx()
+                spawned.append(madx)
+                return madx
+        with self.assertRaises(RuntimeError):
+            MadxPool(spawn, 3)
+        self.assertTrue(all(madx.closed for madx in spawned if madx))
+
+    def test_cancel_on_close(self):
+        pool = MadxPool(FakeMadx, 1)
+        calls = []
+        def task(worker, i):
+            calls.append(i)
+            time.sleep(0.01)
+            return i
+        results = pool.imap_unordered(task, [(i,) for i in range(10)])
+        self.assertEqual(next(results), (0, 0))
+        results.close()
+        self.assertEqual(list(pool.imap_unordered(task, [(10,)])),
+                         [(0, 10)])
+        self.assertLessEqual(len(calls), 3)
+        pool.close()
+
+    def test_cancel_on_error(self):
+        pool = MadxPool(FakeMadx, 1)
+        calls = []
+        def task(worker, i):
+            calls.append(i)
+            if i == 0:
+                raise ValueError(i)
+            time.sleep(0.01)
+            return i
+        with self.assertRaises(ValueError):
+            list(pool.imap_unordered(task, [(i,) for i in range(10)]))
+        self.assertEqual(list(pool.imap_unordered(task, [(10,)])),
+                         [(0, 10)])
+        self.assertLessEqual(len(calls), 3)
+        pool.close()
+
+
+class TestWorker(unittest.TestCase):
+
+    def test_restore_knobs(self):
+        madx = FakeMadx()
+        worker = Worker(madx)
+        worker.set_knobs({'k1_q1': 10.0, 'k1_q3': 30.0})
+        worker.set_knobs({'k1_q1': 11.0, 'k1_q2': 20.0})
+        self.assertEqual(madx.globals,
+                         {'k1_q1': 11.0, 'k1_q2': 20.0, 'k1_q3': 3.0})
+        worker.set_knobs({})
+        self.assertEqual(madx.globals,
+                         {'k1_q1': 1.0, 'k1_q2': 2.0, 'k1_q3': 3.0})
+
+    def test_scans_with_different_knobs(self):
+        pool = MadxPool(FakeMadx, 1)
+        def task(worker, knobs):
+            worker.set_knobs(knobs)
+            return dict(worker.madx.globals)
+        first = [{'k1_q3': 30.0}, {'k1_q3': 31.0}]
+        second = [{'k1_q2': 20.0}]
+        list(pool.imap_unordered(task, [(p,) for p in first]))
+        results = list(pool.imap_unordered(task, [(p,) for p in second]))
+        self.assertEqual(results, [
+            (0, {'k1_q1': 1.0, 'k1_q2': 20.0, 'k1_q3': 3.0})])
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
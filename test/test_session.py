@@ -0,0 +1,424 @@
+# encoding: utf-8
+"""
+Tests for the session component.
+"""
+
+# standard library
+import threading
+import unittest
+
+from numpy.testing import assert_allclose
+
+# test fixtures
+from _fixtures import SessionTestCase, TempDirTestCase, make_utool
+
+try:
+    import cpymad
+except ImportError:
+    cpymad = None
+else:
+    # tested classes
+    from madgui.component.session import CommandBatch, MadxProcess, Session
+    from madgui.resource.file import FileResource
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestSegment(SessionTestCase):
+
+    def assert_twiss_equal(self, actual, desired):
+        for col in self.segment._restart_columns + ['s']:
+            assert_allclose(actual[col], desired[col], atol=1e-12)
+
+    def test_incremental_twiss(self):
+        segment = self.segment
+        self.session.set_value('K1_Q2', 0.3)
+        segment.invalidate('K1_Q2')
+        self.assertEqual(segment._invalid_from,
+                         segment.get_element_index('q2'))
+        segment.twiss()
+        self.assertIsNone(segment._invalid_from)
+        self.assert_twiss_equal(segment._raw_twiss, segment.raw_twiss())
+
+    def test_invalidate_element_attribute(self):
+        segment = self.segment
+        segment.invalidate('q1->k1')
+        self.assertEqual(segment._invalid_from,
+                         segment.get_element_index('q1'))
+
+    def test_get_element_index(self):
+        segment = self.segment
+        elements = self.session.madx.sequences['seq'].elements
+        for name in ('q1', 'Q2', 'k1[1]', '#s', '#e', 'seq$end'):
+            self.assertEqual(segment.get_element_index(name),
+                             elements.index(name))
+        with self.assertRaises(ValueError):
+            segment.get_element_index('foo')
+
+    def test_element_by_position(self):
+        segment = self.segment
+        add_unit = self.session.utool.add_unit
+        find = lambda s: segment.element_by_position(add_unit('s', s))
+        self.assertEqual(find(3.5)['name'], 'q1')
+        self.assertEqual(find(6.5)['name'], 'q2')
+        self.assertIsNone(find(11))
+        self.assertEqual(segment.element_index_at(3.5),
+                         segment.get_element_index('q1'))
+        self.assertIsNone(segment.element_index_at(11))
+
+    def test_required_columns(self):
+        segment = self.segment
+        self.assertNotIn('k1l', segment._raw_twiss)
+        self.assertNotIn('k1l', segment.tw)
+        expected = segment.raw_twiss(columns=['k1l'])['k1l']
+        assert_allclose(segment.tw.get_float('k1l'), expected)
+        # the column is fetched into the table, the (cached) results are
+        # not modified:
+        self.assertIn('k1l', segment.tw)
+        self.assertNotIn('k1l', segment._raw_twiss)
+        segment.require_columns(self, ['envx', 'k1l'])
+        self.assertIn('k1l', segment._get_columns())
+        self.assertIn('betx', segment._get_columns())
+        segment.release_columns(self)
+        self.assertNotIn('k1l', segment._get_columns())
+
+    def test_madx_table(self):
+        segment = self.segment
+        table = segment.madx_table
+        self.assertIsNotNone(table)
+        assert_allclose(table['betx'], segment.tw.get_float('betx'))
+        segment.invalidate('K1_Q2')
+        self.assertIsNone(segment.madx_table)
+        # a full TWISS is needed if the dependencies are unknown:
+        self.session.set_value('K1_Q1', 0.2)
+        segment.invalidate('K1_Q1', 'unknown')
+        segment.twiss()
+        self.assertIsNotNone(segment.madx_table)
+        segment.raw_twiss()
+        self.assertIsNone(segment.madx_table)
+
+    def test_transfer_map(self):
+        segment = self.segment
+        madx = self.session.madx
+        twiss_args = segment._get_twiss_args()
+        for beg, end in [('#s', 'q2'), ('q1', 'k1'), ('q1', '#e')]:
+            expected = madx.get_transfer_map_7d(
+                sequence='seq', range_=(beg, end),
+                tw_range=twiss_args['range'],
+                twiss_init=twiss_args['twiss_init'])
+            assert_allclose(segment.get_transfer_map(beg, end), expected,
+                            atol=1e-10)
+
+    def test_transfer_map_cache(self):
+        segment = self.segment
+        sectormap = segment.sectormap
+        self.assertIs(segment.sectormap, sectormap)
+        segment.invalidate('K1_Q1')
+        self.assertIsNot(segment.sectormap, sectormap)
+        # plain refreshes keep the transfer maps:
+        segment.twiss()
+        sectormap = segment.sectormap
+        segment.twiss()
+        self.assertIs(segment.sectormap, sectormap)
+        # untracked changes void them:
+        self.session.madx.input('K1_Q1 = 0.2;')
+        segment.twiss()
+        self.assertIsNot(segment.sectormap, sectormap)
+        # ...even without a TWISS in between:
+        sectormap = segment.sectormap
+        self.session.madx.input('K1_Q1 = 0.3;')
+        self.assertIsNot(segment.sectormap, sectormap)
+        # and the TWISS is recomputed as well:
+        twiss = segment._raw_twiss
+        segment.twiss()
+        self.assertIsNot(segment._raw_twiss, twiss)
+
+    def test_transfer_map_outside_range(self):
+        session = self.session
+        session.init_segment({
+            'sequence': 'seq',
+            'range': ('q1', '#e'),
+            'beam': {},
+            'twiss': self.utool.dict_add_unit(self.twiss),
+        })
+        segment = session.segment
+        segment.get_transfer_map('q1', 'q2')
+        with self.assertRaises(ValueError):
+            segment.get_transfer_map('#s', 'q2')
+
+    def test_twiss_cache(self):
+        segment = self.segment
+        session = self.session
+        cache = segment.twiss_cache
+        initial = segment._raw_twiss
+        session.set_value('K1_Q2', 0.3)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        self.assertIsNot(segment._raw_twiss, initial)
+        misses = cache.misses
+        session.set_value('K1_Q2', -0.1)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        self.assertIs(segment._raw_twiss, initial)
+        self.assertEqual(cache.misses, misses)
+        # plain refreshes keep the cache:
+        segment.twiss()
+        self.assertIs(segment._raw_twiss, initial)
+        self.assertEqual(len(cache), 2)
+        # untracked changes void it:
+        self.session.madx.input('K1_Q2 = 0.3;')
+        segment.twiss()
+        self.assertIsNot(segment._raw_twiss, initial)
+        self.assertEqual(len(cache), 1)
+
+    def test_twiss_cache_invalidated_lvalue(self):
+        segment = self.segment
+        session = self.session
+        initial = segment._raw_twiss
+        session.set_value('K1_Q2', 0.3)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        tracked = segment._raw_twiss
+        session.set_value('K1_Q2', -0.1)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        self.assertIs(segment._raw_twiss, initial)
+        # changes that do not show up in the knobs change the cache key:
+        session.madx.input('k1_q2 = 0.2;')
+        segment.invalidate('k1_q2')
+        segment.twiss()
+        self.assertIsNot(segment._raw_twiss, initial)
+        self.assert_twiss_equal(segment._raw_twiss, segment.raw_twiss())
+        changed = segment._raw_twiss
+        session.set_value('K1_Q2', 0.3)
+        segment.invalidate('K1_Q2')
+        segment.twiss()
+        self.assertIs(segment._raw_twiss, tracked)
+        session.madx.input('k1_q2 = 0.2;')
+        segment.invalidate('k1_q2')
+        segment.twiss()
+        self.assertIsNot(segment._raw_twiss, tracked)
+        self.assert_twiss_equal(segment._raw_twiss, changed)
+
+    def test_superseded_twiss_async(self):
+        segment = self.segment
+        session = self.session
+        with session.lock:
+            # the background thread has to wait for the lock:
+            future = segment.twiss_async()
+            session.set_value('K1_Q2', 0.3)
+            segment.invalidate('K1_Q2')
+            segment.twiss()
+            current = segment._raw_twiss
+        future.result()
+        self.assertIs(segment._raw_twiss, current)
+        self.assertIsNone(segment._pending_twiss)
+        self.assert_twiss_equal(current, segment.raw_twiss())
+
+    def test_failed_twiss_async(self):
+        segment = self.segment
+        session = self.session
+        done = threading.Event()
+        def dispatch(func, *args):
+            func(*args)
+            done.set()
+        session.executor.dispatch = dispatch
+        def fail(request):
+            raise RuntimeError("TWISS failed")
+        segment._compute_twiss = fail
+        session.set_value('K1_Q2', 0.3)
+        segment.invalidate('K1_Q2')
+        future = segment.twiss_async()
+        self.assertTrue(done.wait(5))
+        self.assertIsInstance(future.exception(), RuntimeError)
+        self.assertIsNone(segment._pending_twiss)
+        # the change is still applied by the next computation:
+        del segment._compute_twiss
+        segment.twiss()
+        self.assert_twiss_equal(segment._raw_twiss, segment.raw_twiss())
+
+    def test_batch(self):
+        segment = self.segment
+        updates = []
+        segment.hook.update.connect(lambda: updates.append(1))
+        with segment.batch():
+            twiss_args = segment.twiss_args
+            segment.twiss_args = dict(twiss_args, betx=twiss_args['bety'])
+            segment.beam = segment.beam
+            with segment.batch():
+                segment.twiss()
+            self.assertEqual(updates, [])
+        self.assertEqual(updates, [1])
+
+    def test_scan(self):
+        session = self.session
+        grid = {'K1_Q1': [0.1, 0.2], 'K1_Q2': [-0.1, 0.0, 0.1]}
+        results = list(session.scan(grid, ['s', 'betx', 'x']))
+        self.assertEqual(len(results), 6)
+        for point, twiss in results:
+            for name, value in point.items():
+                session.set_value(name, value)
+            expected = self.segment.raw_twiss(columns=['s', 'betx', 'x'])
+            for col in ('betx', 'x'):
+                assert_allclose(session.utool.strip_unit(col, twiss[col]),
+                                expected[col], atol=1e-12)
+
+    def test_scan_after_call(self):
+        session = self.session
+        list(session.scan([{}], ['betx']))
+        self.write('late.madx', 'K1_Q2 = 0.2;')
+        session.call('late.madx')
+        (point, twiss), = session.scan([{'K1_Q1': 0.2}], ['betx'])
+        session.set_value('K1_Q1', 0.2)
+        expected = self.segment.raw_twiss(columns=['betx'])
+        assert_allclose(session.utool.strip_unit('betx', twiss['betx']),
+                        expected['betx'], atol=1e-12)
+
+    def test_get_table_rows(self):
+        session = self.session
+        table = self.segment.raw_twiss(columns=['name', 'betx', 'x'])
+        rows = session.get_table_rows('twiss', 1, 3, ['betx', 'name'])
+        self.assertEqual(sorted(rows), ['betx', 'name'])
+        assert_allclose(rows['betx'], table['betx'][1:3])
+        self.assertEqual(list(rows['name']), list(table['name'][1:3]))
+        row = session.get_table_row('twiss', -1, numeric_only=True)
+        self.assertNotIn('name', row)
+        self.assertAlmostEqual(row['x'], table['x'][-1])
+
+    def test_guess_twiss(self):
+        session = self.session
+        table = self.segment.raw_twiss(columns=['name', 'betx'])
+        (first, last), twiss = session._get_twiss(session.madx.sequence.seq)
+        self.assertEqual((first, last), (table['name'][0], table['name'][-1]))
+        self.assertAlmostEqual(twiss['betx'], table['betx'][0])
+
+    def test_commands(self):
+        session = self.session
+        madx = session.madx
+        with session.commands() as batch:
+            session.set_values({'K1_Q1': 0.5, 'K1_Q2': -0.5})
+            self.assertAlmostEqual(madx.evaluate('K1_Q1'), 0.1)
+            before = batch.evaluate('K1_Q1')
+            session.set_value('K1_Q1', 0.7)
+            after = batch.evaluate('K1_Q1 + K1_Q2')
+            self.assertFalse(after.done())
+        self.assertAlmostEqual(before.result(), 0.5)
+        self.assertAlmostEqual(after.result(), 0.2)
+        self.assertEqual(session.knobs['K1_Q1'], 0.7)
+        self.assertEqual(session.evaluate_many(['K1_Q2', '2*K1_Q1']),
+                         [-0.5, 1.4])
+
+    def test_seq_model_cache(self):
+        session = self.session
+        model = session._get_seq_model('seq')
+        self.assertIn('seq', session._seq_models)
+        self.assertEqual(session._get_seq_model('seq'), model)
+        self.write('knobs.madx', 'K1_Q1 = 0.2;')
+        session.call('knobs.madx')
+        self.assertNotIn('seq', session._seq_models)
+
+
+class FakeSession(object):
+
+    """Records the calls of a :class:`CommandBatch`."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.values = []
+
+    def _input_values(self, items):
+        self.values.extend(items)
+
+    def _evaluate_remote(self, exprs):
+        if 'error' in exprs:
+            raise ValueError(exprs)
+        return [len(expr) for expr in exprs]
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestCommandBatch(unittest.TestCase):
+
+    def test_flush_after_error(self):
+        session = FakeSession()
+        batch = CommandBatch(session)
+        batch.set_value('a', 1)
+        failed = batch.evaluate('error')
+        batch.set_value('b', 2)
+        later = batch.evaluate('abc')
+        with self.assertRaises(ValueError):
+            batch.flush()
+        self.assertIsInstance(failed.exception(), ValueError)
+        self.assertEqual(later.result(), 3)
+        self.assertEqual(session.values, [('a', 1), ('b', 2)])
+
+
+REPEATED = """
+    qf: QUADRUPOLE, K1:=K1_Q1, l=1;
+    seq: sequence, l=10, refer=entry;
+        qf, at=1;
+        qf, at=4;
+        qf, at=7;
+    endsequence;
+"""
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestRepeatedElements(SessionTestCase):
+
+    sequence = REPEATED
+    knobs = {'K1_Q1': 0.1}
+
+    def test_get_element_index(self):
+        segment = self.segment
+        elements = self.session.madx.sequences['seq'].elements
+        for name in ('qf', 'qf[1]', 'QF[2]', 'qf[3]'):
+            self.assertEqual(segment.get_element_index(name),
+                             elements.index(name))
+        first = segment.get_element_index('qf')
+        self.assertEqual(segment.get_element_index('qf[3]'), first + 2)
+        self.assertEqual(segment.get_element_index('qf:2'), first + 1)
+        with self.assertRaises(ValueError):
+            segment.get_element_index('qf[4]')
+
+
+class FakeProcess(object):
+
+    """Stands in for a :class:`MadxProcess` that is never used."""
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@unittest.skipIf(cpymad is None, "cpymad is not available")
+class TestSession(TempDirTestCase):
+
+    def test_deferred_process(self):
+        process = MadxProcess()
+        session = Session(make_utool(), process=process)
+        self.assertFalse(session.ready)
+        try:
+            self.assertTrue(session.madx)
+            self.assertTrue(session.ready)
+            self.assertIs(session.rpc_client, process.result()[0])
+        finally:
+            session.close()
+        self.assertIsNone(session.madx)
+
+    def test_close_unused(self):
+        session = Session(make_utool())
+        session.close()
+        self.assertTrue(session.ready)
+        self.assertIsNone(session.madx)
+
+    def test_load_error(self):
+        self.write('model.cpymad.yml', 'api_version: 0\n')
+        process = FakeProcess()
+        with self.assertRaises(ValueError):
+            Session.load(make_utool(), FileResource(self.tempdir),
+                         'model.cpymad.yml', process=process)
+        self.assertTrue(process.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# encoding: utf-8
+"""
+Tests for the startup profiler.
+"""
+
+# standard library
+import sys
+import unittest
+
+# tested module
+from madgui.util import startup
+
+
+class TestStartupProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        startup.stop()
+
+    def test_imports(self):
+        sys.modules.pop('colorsys', None)
+        profiler = startup.start()
+        self.assertTrue(startup.active())
+        with startup.step('import colorsys'):
+            import colorsys
+        startup.mark('main window shown')
+        self.assertIs(startup.stop(), profiler)
+        self.assertFalse(startup.active())
+        self.assertIn('colorsys', [name for name, _, _ in profiler._imports])
+        report = profiler.format_report()
+        self.assertIn('colorsys', report)
+        self.assertIn('import colorsys', report)
+        self.assertIn('main window shown', report)
+
+    def test_inactive(self):
+        with startup.step('nothing'):
+            pass
+        startup.mark('nothing')
+        self.assertIsNone(startup.stop())
+
+
+if __name__ == '__main__':
+    unittest.main()
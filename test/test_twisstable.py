@@ -0,0 +1,71 @@
+# encoding: utf-8
+"""
+Tests for the TWISS column store.
+"""
+
+# standard library
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+# test fixtures
+from _fixtures import make_utool
+
+try:
+    import pint
+except ImportError:
+    pint = None
+else:
+    # tested classes
+    from madgui.component.twisstable import TwissTable
+    from madgui.util.unit import units
+
+
+@unittest.skipIf(pint is None, "pint is not available")
+class TestTwissTable(unittest.TestCase):
+
+    def setUp(self):
+        self.utool = make_utool()
+        columns = {
+            'name': np.array(['a', 'b']),
+            's': np.array([1.0, 2.0]),
+            'x': np.array([0.001, 0.002]),
+            'betx': np.array([4.0, 9.0]),
+        }
+        summary = {'ex': 1e-6, 'ey': 1e-6}
+        self.table = TwissTable(columns, summary, self.utool, s_offset=10)
+
+    def test_float_columns(self):
+        table = self.table
+        assert_allclose(table.get_float('s'), [11, 12])
+        assert_allclose(table.get_float('envx'), [0.002, 0.003])
+        assert_allclose(table.get_float('posx', units.mm), [1, 2])
+        self.assertIs(table.get_float('envx'), table.get_float('envx'))
+
+    def test_unit_views(self):
+        table = self.table
+        self.assertIs(table['betx'], table['betx'])
+        assert_allclose(table['envx'].to(units.mm).magnitude, [2, 3])
+        self.assertIn('posx', table)
+        self.assertEqual(list(table['name']), ['a', 'b'])
+        self.assertEqual(self.utool.strip_unit('ex', table.summary['ex']),
+                         1e-6)
+
+    def test_fetch(self):
+        columns = {'s': np.array([1.0, 2.0])}
+        fetched = []
+        def fetch(name):
+            fetched.append(name)
+            return np.array([3.0, 4.0])
+        for _ in range(2):
+            table = TwissTable(columns, {}, self.utool, fetch=fetch)
+            assert_allclose(table.get_float('betx'), [3, 4])
+            self.assertIn('betx', table)
+        # the (possibly shared) input columns are not modified:
+        self.assertEqual(list(columns), ['s'])
+        self.assertEqual(fetched, ['betx', 'betx'])
+
+
+if __name__ == '__main__':
+    unittest.main()